@@ -0,0 +1,172 @@
+"""
+Async routes, used when DATABASE_URL names an async driver (sqlite+aiosqlite, postgresql+asyncpg).
+
+They mirror the CRUD and dashboard stats routes of main.py on an AsyncSession, so a request
+waiting on the database holds no threadpool thread. main.py includes this router before its
+own routes; routes not mirrored here keep running sync on the derived sync engine.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List, Optional
+
+from database import get_async_db, get_async_read_db
+from schemas import (
+    Material, MaterialCreate, MaterialUpdate,
+    Product, ProductCreate, ProductUpdate,
+    Order, OrderCreate, OrderUpdate,
+    OrderQueue, OrderQueueCreate, OrderQueueUpdate,
+    Integration, IntegrationCreate, IntegrationUpdate
+)
+from services import async_services, materials_service, products_service, integrations_service
+from services.response_cache import response_cache
+from services.pagination import set_next_cursor
+
+router = APIRouter()
+
+# Materials endpoints
+@router.get("/api/materials/", response_model=List[Material])
+async def get_materials(request: Request, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: AsyncSession = Depends(get_async_read_db)):
+    return await async_services.cached_list(request, db, response_cache.MATERIALS, Material, materials_service.get_materials,
+                                            skip=skip, limit=limit, cursor=cursor)
+
+@router.get("/api/materials/{material_id}", response_model=Material)
+async def get_material(material_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    material = await async_services.get_material(db, material_id)
+    if material is None:
+        raise HTTPException(status_code=404, detail="Material not found")
+    return material
+
+@router.post("/api/materials/", response_model=Material)
+async def create_material(material: MaterialCreate, db: AsyncSession = Depends(get_async_db)):
+    return await async_services.create_material(db, material)
+
+@router.put("/api/materials/{material_id}", response_model=Material)
+async def update_material(material_id: int, material_update: MaterialUpdate, db: AsyncSession = Depends(get_async_db)):
+    material = await async_services.update_material(db, material_id, material_update)
+    if material is None:
+        raise HTTPException(status_code=404, detail="Material not found")
+    return material
+
+@router.delete("/api/materials/{material_id}")
+async def delete_material(material_id: int, db: AsyncSession = Depends(get_async_db)):
+    success = await async_services.delete_material(db, material_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Material not found")
+    return {"message": "Material deleted successfully"}
+
+# Order Queue endpoints
+@router.get("/api/order-queue/", response_model=List[OrderQueue])
+async def get_order_queue(request: Request, response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: AsyncSession = Depends(get_async_read_db)):
+    return set_next_cursor(request, response, await async_services.get_order_queue(db, skip=skip, limit=limit, cursor=cursor))
+
+@router.post("/api/order-queue/", response_model=OrderQueue)
+async def create_order_queue_item(order: OrderQueueCreate, db: AsyncSession = Depends(get_async_db)):
+    return await async_services.create_order_queue_item(db, order)
+
+@router.put("/api/order-queue/{order_id}", response_model=OrderQueue)
+async def update_order_queue_status(order_id: str, order_update: OrderQueueUpdate, db: AsyncSession = Depends(get_async_db)):
+    order = await async_services.update_order_queue_status(db, order_id, order_update)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return order
+
+# Products endpoints
+@router.get("/api/products/")
+async def get_products(request: Request, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: AsyncSession = Depends(get_async_read_db)):
+    return await async_services.cached_list(request, db, response_cache.PRODUCTS, Dict[str, Any], products_service.get_products_with_bom,
+                                            skip=skip, limit=limit, cursor=cursor)
+
+@router.get("/api/products/{product_id}", response_model=Product)
+async def get_product(product_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    product = await async_services.get_product(db, product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return product
+
+@router.post("/api/products/", response_model=Product)
+async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_async_db)):
+    return await async_services.create_product(db, product)
+
+@router.put("/api/products/{product_id}", response_model=Product)
+async def update_product(product_id: int, product_update: ProductUpdate, db: AsyncSession = Depends(get_async_db)):
+    product = await async_services.update_product(db, product_id, product_update)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return product
+
+@router.delete("/api/products/{product_id}")
+async def delete_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    success = await async_services.delete_product(db, product_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return {"message": "Product deleted successfully"}
+
+# Orders endpoints
+@router.get("/api/orders/", response_model=List[Order])
+async def get_orders(request: Request, response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: AsyncSession = Depends(get_async_read_db)):
+    return set_next_cursor(request, response, await async_services.get_orders(db, skip=skip, limit=limit, cursor=cursor))
+
+@router.get("/api/orders/{order_id}", response_model=Order)
+async def get_order(order_id: str, db: AsyncSession = Depends(get_async_read_db)):
+    order = await async_services.get_order(db, order_id)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return order
+
+@router.post("/api/orders/", response_model=Order)
+async def create_order(order: OrderCreate, db: AsyncSession = Depends(get_async_db)):
+    return await async_services.create_order(db, order)
+
+@router.put("/api/orders/{order_id}", response_model=Order)
+async def update_order(order_id: str, order_update: OrderUpdate, db: AsyncSession = Depends(get_async_db)):
+    order = await async_services.update_order(db, order_id, order_update)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return order
+
+@router.delete("/api/orders/{order_id}")
+async def delete_order(order_id: str, db: AsyncSession = Depends(get_async_db)):
+    success = await async_services.delete_order(db, order_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return {"message": "Order deleted successfully"}
+
+# Integrations endpoints
+@router.get("/api/integrations/", response_model=List[Integration])
+async def get_integrations(request: Request, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: AsyncSession = Depends(get_async_read_db)):
+    return await async_services.cached_list(request, db, response_cache.INTEGRATIONS, Integration, integrations_service.get_integrations,
+                                            skip=skip, limit=limit, cursor=cursor)
+
+@router.get("/api/integrations/{integration_id}", response_model=Integration)
+async def get_integration(integration_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    integration = await async_services.get_integration(db, integration_id)
+    if integration is None:
+        raise HTTPException(status_code=404, detail="Integration not found")
+    return integration
+
+@router.post("/api/integrations/", response_model=Integration)
+async def create_integration(integration: IntegrationCreate, db: AsyncSession = Depends(get_async_db)):
+    return await async_services.create_integration(db, integration)
+
+@router.put("/api/integrations/{integration_id}", response_model=Integration)
+async def update_integration(integration_id: int, integration_update: IntegrationUpdate, db: AsyncSession = Depends(get_async_db)):
+    integration = await async_services.update_integration(db, integration_id, integration_update)
+    if integration is None:
+        raise HTTPException(status_code=404, detail="Integration not found")
+    return integration
+
+@router.delete("/api/integrations/{integration_id}")
+async def delete_integration(integration_id: int, db: AsyncSession = Depends(get_async_db)):
+    success = await async_services.delete_integration(db, integration_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Integration not found")
+    return {"message": "Integration deleted successfully"}
+
+# Dashboard endpoints
+@router.get("/api/dashboard/stats")
+async def get_dashboard_stats(db: AsyncSession = Depends(get_async_read_db)):
+    """Get comprehensive dashboard statistics"""
+    try:
+        return await async_services.get_dashboard_stats(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching dashboard stats: {str(e)}")
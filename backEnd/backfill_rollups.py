@@ -0,0 +1,33 @@
+"""
+Backfill the order rollups (order_status_rollups, product_sales_rollups) from existing orders
+and order items, or check them against a raw aggregation with --check
+"""
+import argparse
+import sys
+from database import SessionLocal, engine
+from models import Base
+from services import order_rollups
+
+# Create the rollup tables on databases created before they existed
+Base.metadata.create_all(bind=engine)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--check", action="store_true", help="compare the rollups with the raw data instead of rebuilding")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.check:
+            report = order_rollups.check_rollups(db)
+            for mismatch in report["mismatches"]:
+                print(f"  {mismatch}")
+            print(f"{'✅ Rollups consistent' if report['consistent'] else '❌ ' + str(report['mismatch_count']) + ' mismatched rollup rows'}")
+            sys.exit(0 if report["consistent"] else 1)
+        counts = order_rollups.rebuild_rollups(db)
+        print(f"✅ Rebuilt {counts['order_status_rollups']} order status rows and {counts['product_sales_rollups']} product sales rows")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
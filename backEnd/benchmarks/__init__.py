@@ -0,0 +1,2 @@
+# Benchmarks package - run modules from the backEnd directory, e.g.
+#   python -m benchmarks.bench_dashboard_stats
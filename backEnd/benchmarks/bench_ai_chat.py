@@ -0,0 +1,101 @@
+"""
+Benchmark /api/ai/chat against the local stub LLM (benchmarks/stub_llm.py) on a large catalog.
+Compares the size of the old prompt, which holds every material, with the digest prompt. Times a
+first question (digest build and an LLM call), the same question again and reworded only in case
+and spacing (both answered from the cache without calling the LLM), and the question after a
+material update (the inventory version changes, so the LLM is called again). Exits 1 if the
+cache answers a stale version, calls the LLM on a hit, or the digest prompt is not smaller.
+
+    python -m benchmarks.bench_ai_chat --materials 5000 --latency 0.5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import httpx
+from benchmarks.load_test import free_port, start_server
+from benchmarks.stub_llm import start_stub
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate
+from models import Material
+from services import order_rollups
+
+QUESTION = "Which red materials should I reorder this week?"
+
+def legacy_prompt_chars(session_factory) -> int:
+    """Size of the inventory JSON the chat prompt used to embed: every material, indented"""
+    with session_factory() as db:
+        materials = [
+            {"name": m.name, "quantity": m.quantity, "unit": m.unit, "required": m.required, "color": m.color}
+            for m in db.query(Material)
+        ]
+    return len(json.dumps({"materials": materials}, indent=2))
+
+def ask(client, question):
+    start = time.perf_counter()
+    response = client.post("/api/ai/chat", json={"message": question})
+    response.raise_for_status()
+    return response.json()["response"], round((time.perf_counter() - start) * 1000, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--materials", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--latency", type=float, default=0.5, help="stub LLM seconds per answer")
+    args = parser.parse_args()
+
+    engine, path = make_engine()
+    print(f"Populating {path} with {args.materials} materials and {args.orders} orders...")
+    populate(engine, materials=args.materials, products=1000, orders=args.orders, days=90, queue=500)
+    session_factory = make_session_factory(engine)
+    with session_factory() as db:
+        order_rollups.rebuild_rollups(db)
+    legacy_chars = legacy_prompt_chars(session_factory)
+    engine.dispose()
+
+    stub_port, port = free_port(), free_port()
+    stub = start_stub(stub_port, args.latency)
+    os.environ.update({"OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1", "OPENAI_API_KEY": "stub"})
+    server = start_server(f"sqlite:///{path}", port)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60) as client, \
+                httpx.Client(base_url=f"http://127.0.0.1:{stub_port}") as stub_client:
+            first, first_ms = ask(client, QUESTION)
+            calls_after_first = stub_client.get("/stats").json()
+            repeat, repeat_ms = ask(client, QUESTION)
+            reworded, reworded_ms = ask(client, "  which RED materials should i reorder this WEEK?")
+            calls_after_hits = stub_client.get("/stats").json()["calls"]
+            client.put("/api/materials/1", json={"quantity": 0}).raise_for_status()
+            _, after_write_ms = ask(client, QUESTION)
+            calls_after_write = stub_client.get("/stats").json()["calls"]
+            health = client.get("/health/ai").json()
+    finally:
+        server.terminate()
+        server.wait()
+        stub.terminate()
+        stub.wait()
+        os.remove(path)
+
+    result = {
+        "materials": args.materials,
+        "prompt_chars": {"legacy": legacy_chars, "digest": calls_after_first["last_prompt_chars"]},
+        "latency_ms": {"first": first_ms, "cached": repeat_ms, "cached_reworded": reworded_ms, "after_write": after_write_ms},
+        "llm_calls": {"first": calls_after_first["calls"], "after_hits": calls_after_hits, "after_write": calls_after_write},
+        "health": health,
+    }
+    print(json.dumps(result, indent=2))
+
+    failures = []
+    if repeat != first or reworded != first or calls_after_hits != calls_after_first["calls"]:
+        failures.append("repeated questions were not answered from the cache")
+    if calls_after_write != calls_after_hits + 1:
+        failures.append("the answer cache survived a material update")
+    if calls_after_first["last_prompt_chars"] >= legacy_chars:
+        failures.append("the digest prompt is not smaller than the full material dump")
+    if failures:
+        print(f"FAIL: {'; '.join(failures)}")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
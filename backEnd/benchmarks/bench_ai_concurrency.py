@@ -0,0 +1,160 @@
+"""
+Benchmark streamed /api/ai/chat under load against the local stub LLM (benchmarks/stub_llm.py).
+Measures CRUD read latency (materials, products, dashboard stats) on its own, then again while
+200 chats with distinct questions (so none is answered from the cache) stream at once. The stub
+fails every Nth call with a 503, so some chats also go through a retry. Exits 1 if a chat does
+not finish, arrives as a single chunk, more completions than LLM_MAX_CONCURRENCY reach the stub
+at once, or the CRUD p95 under load exceeds the budget.
+
+    python -m benchmarks.bench_ai_concurrency --chats 200 --latency 2 --fail-every 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import httpx
+from benchmarks.load_test import free_port, start_server
+from benchmarks.stub_llm import start_stub
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate, percentile
+from services import order_rollups
+
+CRUD_PATHS = ["/api/materials/", "/api/products/", "/api/dashboard/stats"]
+
+def timings(samples):
+    return {"count": len(samples), "p50_ms": round(percentile(samples, 50), 1),
+            "p95_ms": round(percentile(samples, 95), 1), "max_ms": round(max(samples), 1)}
+
+async def probe_crud(client, stop: asyncio.Event, samples, errors):
+    """CRUD reads one after another until stopped"""
+    index = 0
+    while not stop.is_set():
+        path = CRUD_PATHS[index % len(CRUD_PATHS)]
+        index += 1
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            response.raise_for_status()
+            samples.append((time.perf_counter() - start) * 1000)
+        except httpx.HTTPError as e:
+            errors.append(f"{path}: {e!r}")
+        await asyncio.sleep(0.02)
+
+async def crud_latency(client, seconds: float, probers: int):
+    stop, samples, errors = asyncio.Event(), [], []
+    tasks = [asyncio.create_task(probe_crud(client, stop, samples, errors)) for _ in range(probers)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return samples, errors
+
+async def chat(client, question: str):
+    """One streamed chat: time to the first token, total time, tokens, and whether it finished"""
+    start = time.perf_counter()
+    first_token, tokens, event_type, outcome = None, 0, None, "incomplete"
+    async with client.stream("POST", "/api/ai/chat", json={"message": question, "stream": True}) as response:
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event_type = line[len("event: "):]
+            elif line.startswith("data: ") and event_type == "token":
+                tokens += 1
+                if first_token is None:
+                    first_token = (time.perf_counter() - start) * 1000
+            elif line.startswith("data: ") and event_type in ("done", "error"):
+                outcome = event_type if event_type == "done" else json.loads(line[len("data: "):])["detail"]
+    return {"first_token_ms": first_token, "total_ms": (time.perf_counter() - start) * 1000,
+            "tokens": tokens, "outcome": outcome}
+
+async def run(port: int, args):
+    limits = httpx.Limits(max_connections=args.chats + 50)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+        # Build the inventory digest before measuring
+        await chat(client, "Warm up: what is running low?")
+        baseline, baseline_errors = await crud_latency(client, args.seconds, args.probers)
+
+        stop, samples, errors = asyncio.Event(), [], []
+        probers = [asyncio.create_task(probe_crud(client, stop, samples, errors)) for _ in range(args.probers)]
+        start = time.perf_counter()
+        chats = await asyncio.gather(*(
+            chat(client, f"Question {number}: which materials should I reorder for order batch {number}?")
+            for number in range(args.chats)
+        ))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await asyncio.gather(*probers)
+        health = (await client.get("/health/ai")).json()
+    return baseline, baseline_errors, samples, errors, chats, elapsed, health
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=2.0, help="stub LLM seconds per answer")
+    parser.add_argument("--fail-every", type=int, default=10, help="stub answers every Nth call with a 503")
+    parser.add_argument("--concurrency", type=int, default=32, help="LLM_MAX_CONCURRENCY for the server")
+    parser.add_argument("--probers", type=int, default=4, help="concurrent CRUD clients")
+    parser.add_argument("--seconds", type=float, default=5, help="length of the baseline CRUD measurement")
+    parser.add_argument("--crud-budget-ms", type=float, default=500, help="CRUD p95 allowed while chats stream")
+    args = parser.parse_args()
+
+    engine, path = make_engine()
+    print(f"Populating {path}...")
+    populate(engine, materials=500, products=200, orders=5000, days=90, queue=200)
+    with make_session_factory(engine)() as db:
+        order_rollups.rebuild_rollups(db)
+    engine.dispose()
+
+    stub_port, port = free_port(), free_port()
+    stub = start_stub(stub_port, args.latency, args.fail_every)
+    os.environ.update({
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1", "OPENAI_API_KEY": "stub",
+        "LLM_MAX_CONCURRENCY": str(args.concurrency), "LLM_QUEUE_TIMEOUT_SECONDS": "120",
+        "LLM_BACKOFF_BASE_SECONDS": "0.1", "LLM_BACKOFF_MAX_SECONDS": "1",
+    })
+    server = start_server(f"sqlite:///{path}", port)
+    try:
+        print(f"Streaming {args.chats} concurrent chats (stub latency {args.latency}s, LLM concurrency {args.concurrency})...")
+        baseline, baseline_errors, loaded, errors, chats, elapsed, health = asyncio.run(run(port, args))
+        stub_stats = httpx.get(f"http://127.0.0.1:{stub_port}/stats").json()
+    finally:
+        server.terminate()
+        server.wait()
+        stub.terminate()
+        stub.wait()
+        os.remove(path)
+
+    finished = [result for result in chats if result["outcome"] == "done"]
+    result = {
+        "chats": args.chats,
+        "chats_finished": len(finished),
+        "chat_errors": sorted({result["outcome"] for result in chats if result["outcome"] != "done"}),
+        "chat_seconds": round(elapsed, 1),
+        "first_token": timings([result["first_token_ms"] for result in finished]),
+        "chat_total": timings([result["total_ms"] for result in finished]),
+        "min_tokens_per_chat": min((result["tokens"] for result in finished), default=0),
+        "crud_baseline": timings(baseline),
+        "crud_during_chats": timings(loaded),
+        "crud_errors": baseline_errors + errors,
+        "stub": stub_stats,
+        "llm": health["llm"],
+    }
+    print(json.dumps(result, indent=2))
+
+    failures = []
+    if len(finished) != args.chats:
+        failures.append(f"{args.chats - len(finished)} chats did not finish: {result['chat_errors']}")
+    if result["min_tokens_per_chat"] < 2:
+        failures.append("an answer arrived as a single chunk instead of streaming")
+    if stub_stats["max_in_flight"] > args.concurrency:
+        failures.append(f"{stub_stats['max_in_flight']} completions reached the LLM at once (limit {args.concurrency})")
+    if result["crud_errors"]:
+        failures.append(f"{len(result['crud_errors'])} CRUD requests failed")
+    if result["crud_during_chats"]["p95_ms"] > args.crud_budget_ms:
+        failures.append(f"CRUD p95 was {result['crud_during_chats']['p95_ms']} ms while chats streamed (budget {args.crud_budget_ms} ms)")
+    if failures:
+        print(f"FAIL: {'; '.join(failures)}")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark /api/ai/alerts served from the background-refreshed snapshot against computing the
+alerts per request, as the endpoint did before, at several dataset sizes. For each size it times
+AIInventoryAssistant.get_smart_alerts() in-process (the old per-request cost) and counts its SQL
+statements, which must not grow with the dataset, then starts a uvicorn worker and times GET
+/api/ai/alerts, a revalidation with If-None-Match (expects 304) and how long the background
+refresh takes.
+
+    python -m benchmarks.bench_alerts --orders 1000 10000 50000
+"""
+import argparse
+import json
+import os
+import time
+import httpx
+from benchmarks.load_test import free_port, start_server
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate, percentile, QueryCounter
+from services import order_rollups
+from services.ai_service import AIInventoryAssistant
+
+def timings(samples):
+    return {"p50_ms": round(percentile(samples, 50), 2), "p95_ms": round(percentile(samples, 95), 2)}
+
+def per_request(engine, iterations):
+    samples = []
+    session_factory = make_session_factory(engine)
+    for _ in range(iterations):
+        with session_factory() as db, QueryCounter(engine) as counter:
+            start = time.perf_counter()
+            AIInventoryAssistant(db).get_smart_alerts()
+            samples.append((time.perf_counter() - start) * 1000)
+    return {**timings(samples), "statements": counter.count}
+
+def snapshot(path, requests):
+    port = free_port()
+    server = start_server(f"sqlite:///{path}", port)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+            first = client.get("/api/ai/alerts")
+            first.raise_for_status()
+            etag = first.headers["ETag"]
+            samples, revalidations, not_modified = [], [], 0
+            for _ in range(requests):
+                start = time.perf_counter()
+                client.get("/api/ai/alerts").raise_for_status()
+                samples.append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                not_modified += client.get("/api/ai/alerts", headers={"If-None-Match": etag}).status_code == 304
+                revalidations.append((time.perf_counter() - start) * 1000)
+            status = client.get("/health/alerts").json()
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "get": timings(samples),
+        "revalidate": timings(revalidations),
+        "not_modified": not_modified,
+        "alerts": status["alerts"],
+        "refresh_ms": status["last_duration_ms"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--materials", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=3, help="per-request computations timed at each size")
+    parser.add_argument("--requests", type=int, default=200, help="snapshot requests timed at each size")
+    args = parser.parse_args()
+
+    results, failures = [], []
+    for orders in args.orders:
+        engine, path = make_engine()
+        print(f"Populating {path} with {orders} orders...")
+        populate(engine, materials=args.materials, products=200, orders=orders, days=60, queue=orders // 10)
+        with make_session_factory(engine)() as db:
+            # The demand forecast reads the order rollups
+            order_rollups.rebuild_rollups(db)
+        try:
+            result = {"orders": orders, "per_request": per_request(engine, args.iterations)}
+            engine.dispose()
+            result["snapshot"] = snapshot(path, args.requests)
+        finally:
+            os.remove(path)
+        if result["snapshot"]["not_modified"] != args.requests:
+            failures.append(f"{orders} orders: revalidation did not return 304")
+        if results and result["per_request"]["statements"] != results[0]["per_request"]["statements"]:
+            failures.append(f"{orders} orders: the analysis ran {result['per_request']['statements']} statements")
+        results.append(result)
+        print(json.dumps(result))
+
+    print(json.dumps(results, indent=2))
+    if failures:
+        raise SystemExit(f"FAIL: {'; '.join(failures)}")
+    print("OK")
+
+if __name__ == "__main__":
+    main()
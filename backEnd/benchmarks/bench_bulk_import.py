@@ -0,0 +1,81 @@
+"""
+Benchmark bulk imports: NDJSON rows through bulk_service (chunked executemany transactions)
+versus the per-row create_material/create_order service calls behind POST /api/materials/
+and POST /api/orders/ (timed on a sample and extrapolated).
+
+    python -m benchmarks.bench_bulk_import --rows 100000
+"""
+import argparse
+import json
+import time
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate
+from schemas import BulkImportResult, MaterialCreate, BulkOrderCreate
+from services import bulk_service, materials_service, orders_service
+
+def material_row(i):
+    return {"name": f"Imported {i}", "color": "red", "quantity": i % 300, "unit": "PCS", "required": 50}
+
+def order_row(i, products):
+    return {
+        "id": f"IMP-{i:08d}", "customer": f"Customer {i}", "email": f"c{i}@example.com",
+        "shipping_address": "1 Import St", "total": 51.98,
+        "items": [{"product_id": (i + n) % products + 1, "product_name": "Product", "quantity": 1, "price": 25.99}
+                  for n in range(2)],
+    }
+
+def bulk_import(session_factory, kind, lines):
+    result = BulkImportResult()
+    start = time.perf_counter()
+    with session_factory() as db:
+        for offset in range(0, len(lines), bulk_service.CHUNK_SIZE):
+            chunk = list(enumerate(lines[offset:offset + bulk_service.CHUNK_SIZE], start=offset))
+            bulk_service.import_chunk(db, kind, chunk, result)
+    assert result.failed == 0, result.errors[:5]
+    return time.perf_counter() - start
+
+def per_row(session_factory, create, rows):
+    start = time.perf_counter()
+    with session_factory() as db:
+        for row in rows:
+            create(db, row)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--legacy-sample", type=int, default=2000, help="rows timed with per-row creates")
+    parser.add_argument("--products", type=int, default=200)
+    args = parser.parse_args()
+
+    engine, path = make_engine()
+    print(f"Importing into {path}...")
+    populate(engine, materials=50, products=args.products, orders=0, queue=0, shortages=0)
+    session_factory = make_session_factory(engine)
+
+    # Rows arrive as NDJSON lines; validation from raw JSON is part of the measured work
+    material_lines = [json.dumps(material_row(i)).encode() for i in range(args.rows)]
+    order_lines = [json.dumps(order_row(i, args.products)).encode() for i in range(args.rows)]
+    sample = min(args.legacy_sample, args.rows)
+    scale = args.rows / sample
+
+    results = {"rows": args.rows}
+    for kind, lines, create, schema in (
+        ("materials", material_lines, materials_service.create_material, MaterialCreate),
+        ("orders", order_lines, orders_service.create_order, BulkOrderCreate),
+    ):
+        bulk_seconds = bulk_import(session_factory, kind, lines)
+        # BulkOrderCreate carries the order id, which POST /api/orders/ has no way to set
+        legacy_rows = [schema.model_validate_json(line.replace(b'"IMP-', b'"LEG-')) for line in lines[:sample]]
+        legacy_seconds = per_row(session_factory, create, legacy_rows)
+        results[kind] = {
+            "bulk_seconds": round(bulk_seconds, 2),
+            "bulk_rows_per_second": round(args.rows / bulk_seconds),
+            "per_row_sample": sample,
+            "per_row_seconds": round(legacy_seconds, 2),
+            "per_row_extrapolated_seconds": round(legacy_seconds * scale, 1),
+        }
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
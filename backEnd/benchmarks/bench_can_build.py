@@ -0,0 +1,87 @@
+"""
+Benchmark can_build refresh for the whole catalog: the original per-product loop (one
+association query per material and one commit per product) versus the grouped
+recalculate_all_can_build path.
+
+    python -m benchmarks.bench_can_build --products 10000 --bom 50
+"""
+import argparse
+import json
+import time
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate, QueryCounter
+from models import Product, product_materials
+from services import products_service
+
+def legacy_calculate_can_build(db, product_id):
+    """The original implementation, kept verbatim for comparison"""
+    product = db.query(Product).filter(Product.id == product_id).first()
+    if not product or not product.materials:
+        return 0
+    min_quantity = float('inf')
+    for material in product.materials:
+        association = db.query(product_materials).filter(
+            product_materials.c.product_id == product_id,
+            product_materials.c.material_id == material.id
+        ).first()
+        if association:
+            min_quantity = min(min_quantity, material.quantity // association.quantity)
+    return int(min_quantity) if min_quantity != float('inf') else 0
+
+def legacy_refresh(db, product_ids):
+    for product_id in product_ids:
+        db_product = db.query(Product).filter(Product.id == product_id).first()
+        db_product.can_build = legacy_calculate_can_build(db, product_id)
+        db.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--materials", type=int, default=500)
+    parser.add_argument("--bom", type=int, default=50, help="materials per product")
+    parser.add_argument("--legacy-sample", type=int, default=200, help="products timed with the legacy loop")
+    parser.add_argument("--db", help="SQLite file to (re)create; defaults to a temp file")
+    args = parser.parse_args()
+
+    engine, path = make_engine(args.db)
+    print(f"Populating {path} with {args.products} products x {args.bom} materials...")
+    populate(engine, materials=args.materials, products=args.products, bom_per_product=args.bom,
+             orders=0, queue=0, shortages=0)
+    session_factory = make_session_factory(engine)
+
+    db = session_factory()
+    try:
+        sample = list(range(1, min(args.legacy_sample, args.products) + 1))
+        with QueryCounter(engine) as counter:
+            start = time.perf_counter()
+            legacy_refresh(db, sample)
+            legacy_seconds = time.perf_counter() - start
+        legacy_queries = counter.count
+        expected = {row.id: row.can_build for row in db.query(Product.id, Product.can_build).filter(Product.id.in_(sample))}
+
+        with QueryCounter(engine) as counter:
+            start = time.perf_counter()
+            updated = products_service.recalculate_all_can_build(db)
+            bulk_seconds = time.perf_counter() - start
+        bulk_queries = counter.count
+
+        actual = {row.id: row.can_build for row in db.query(Product.id, Product.can_build).filter(Product.id.in_(sample))}
+        assert actual == expected, "bulk and legacy can_build disagree"
+    finally:
+        db.close()
+
+    scale = args.products / len(sample)
+    print(json.dumps({
+        "products": args.products,
+        "bom_rows": args.products * args.bom,
+        "legacy": {
+            "sampled_products": len(sample),
+            "seconds": round(legacy_seconds, 3),
+            "statements": legacy_queries,
+            "extrapolated_seconds": round(legacy_seconds * scale, 1),
+            "extrapolated_statements": int(legacy_queries * scale),
+        },
+        "bulk": {"seconds": round(bulk_seconds, 3), "statements": bulk_queries, "products_updated": updated},
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
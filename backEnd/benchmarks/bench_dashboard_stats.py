@@ -0,0 +1,104 @@
+"""
+Benchmark /api/dashboard/stats: the original one-COUNT-per-figure implementation versus
+the conditional-aggregate engine in services/dashboard_service.py
+
+    python -m benchmarks.bench_dashboard_stats --orders 1000000
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate, QueryCounter, percentile
+from models import Material, Product, Order, OrderQueue, Integration, Shortage
+from services import dashboard_service
+
+def legacy_dashboard_stats(db):
+    """The pre-engine implementation, kept verbatim for comparison"""
+    now = datetime.now()
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_ago = now - timedelta(days=7)
+    month_ago = now - timedelta(days=30)
+
+    total_materials = db.query(Material).count()
+    low_stock_materials = db.query(Material).filter(Material.quantity < Material.required).count()
+    out_of_stock_materials = db.query(Material).filter(Material.quantity == 0).count()
+    total_products = db.query(Product).count()
+    products_can_build = db.query(Product).filter(Product.can_build > 0).count()
+    products_cannot_build = db.query(Product).filter(Product.can_build == 0).count()
+    total_orders = db.query(Order).count()
+    orders_today = db.query(Order).filter(Order.created_at >= today_start).count()
+    orders_this_week = db.query(Order).filter(Order.created_at >= week_ago).count()
+    orders_this_month = db.query(Order).filter(Order.created_at >= month_ago).count()
+    queued_orders = db.query(OrderQueue).filter(OrderQueue.status == "Queued").count()
+    processing_orders = db.query(OrderQueue).filter(OrderQueue.status == "Processing").count()
+    completed_orders = db.query(OrderQueue).filter(OrderQueue.status == "Completed").count()
+    blocked_orders = db.query(OrderQueue).filter(OrderQueue.can_fulfill == False).count()
+    total_revenue = db.query(func.sum(Order.total)).scalar() or 0
+    revenue_today = db.query(func.sum(Order.total)).filter(Order.created_at >= today_start).scalar() or 0
+    revenue_this_week = db.query(func.sum(Order.total)).filter(Order.created_at >= week_ago).scalar() or 0
+    revenue_this_month = db.query(func.sum(Order.total)).filter(Order.created_at >= month_ago).scalar() or 0
+    total_integrations = db.query(Integration).count()
+    active_integrations = db.query(Integration).filter(Integration.enabled == True).count()
+    total_shortages = db.query(Shortage).count()
+    critical_shortages = db.query(Shortage).filter(Shortage.short > 0).count()
+
+    return {
+        "materials": [total_materials, low_stock_materials, out_of_stock_materials],
+        "products": [total_products, products_can_build, products_cannot_build],
+        "orders": [total_orders, orders_today, orders_this_week, orders_this_month],
+        "order_queue": [queued_orders, processing_orders, completed_orders, blocked_orders],
+        "revenue": [round(total_revenue, 2), round(revenue_today, 2), round(revenue_this_week, 2), round(revenue_this_month, 2)],
+        "integrations": [total_integrations, active_integrations],
+        "shortages": [total_shortages, critical_shortages],
+    }
+
+def run(fn, session_factory, engine, iterations):
+    timings = []
+    queries = 0
+    for _ in range(iterations):
+        db = session_factory()
+        try:
+            with QueryCounter(engine) as counter:
+                start = time.perf_counter()
+                fn(db)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries = counter.count
+        finally:
+            db.close()
+    return {
+        "queries": queries,
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--db", help="SQLite file to (re)create; defaults to a temp file")
+    args = parser.parse_args()
+
+    engine, path = make_engine(args.db)
+    print(f"Populating {path} with {args.orders} orders...")
+    populate(engine, orders=args.orders, items_per_order=1, queue=min(args.orders, 10000))
+    session_factory = make_session_factory(engine)
+
+    db = session_factory()
+    try:
+        legacy = legacy_dashboard_stats(db)
+        current = dashboard_service.get_dashboard_stats(db)
+        assert legacy["orders"] == [current["orders"][k] for k in ("total", "today", "this_week", "this_month")]
+        assert legacy["revenue"] == [current["revenue"][k] for k in ("total", "today", "this_week", "this_month")]
+    finally:
+        db.close()
+
+    results = {
+        "orders": args.orders,
+        "legacy": run(legacy_dashboard_stats, session_factory, engine, args.iterations),
+        "aggregated": run(dashboard_service.get_dashboard_stats, session_factory, engine, args.iterations),
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
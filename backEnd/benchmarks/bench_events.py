@@ -0,0 +1,265 @@
+"""
+Benchmark /api/events: one uvicorn worker, N concurrent SSE subscribers, and a writer updating
+material quantities through PUT /api/materials/{id}. Reports how many of the published events
+every subscriber received, the delivery latency (commit to client, same host), the write
+latency with the subscribers attached and the server's memory. A few subscribers never read
+their stream, as stalled browser tabs would.
+
+A second, in-process phase checks the backpressure policy on the broker itself: with fast
+subscribers and subscribers that never drain, it publishes a burst much longer than the queue
+and verifies that every fast subscriber got every event while each stalled backlog stayed
+within EVENTS_QUEUE_SIZE and ended with a resync. Exits 1 if either phase loses events.
+
+    python -m benchmarks.bench_events --subscribers 1000 --rate 20 --duration 10
+
+The subscribers are minimal raw-socket SSE clients, spread over a few client processes, so that
+parsing 1,000 streams does not dominate the measurement; on a small machine they still share
+the CPU with the server, so compare runs with the same settings on the same machine. The AI
+alert snapshot refresh is held off after its first run, so only the writer's events are counted.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import time
+import httpx
+from benchmarks.load_test import free_port, start_server
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate, percentile
+from services import dashboard_counters, order_rollups
+from services.events import EventBroker, RESYNC
+
+class Subscription(asyncio.Protocol):
+    """A minimal SSE client on a raw connection (httpx costs too much CPU per line at this fan-out)"""
+
+    def __init__(self):
+        self.connected = asyncio.Event()
+        self.events = 0
+        self.resyncs = 0
+        self.latencies = []
+        self.buffer = b""
+        self.event_type = None
+
+    def connection_made(self, transport):
+        transport.write(b"GET /api/events HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n")
+
+    def data_received(self, data: bytes):
+        received = time.time()
+        lines = (self.buffer + data).split(b"\n")
+        self.buffer = lines.pop()
+        # Chunked transfer-encoding size lines are ignored like any other line
+        for line in lines:
+            if line.startswith(b": connected"):
+                self.connected.set()
+            elif line.startswith(b"event: "):
+                self.event_type = line[7:]
+            elif line.startswith(b"data: "):
+                if self.event_type == b"resync":
+                    self.resyncs += 1
+                else:
+                    self.events += 1
+                    self.latencies.append((received - json.loads(line[6:])["ts"]) * 1000)
+
+async def stalled_subscriber(port: int) -> socket.socket:
+    """Open a stream and never read it; a small receive buffer makes the server side back up"""
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, ("127.0.0.1", port))
+    sock.send(b"GET /api/events HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n")
+    return sock
+
+def server_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return 0.0
+
+async def subscribe_all(port: int, count: int, connected, stop):
+    """Client process body: ``count`` subscriptions until ``stop`` is set; returns their counts and latencies"""
+    loop = asyncio.get_running_loop()
+    subscriptions, transports = [], []
+    for _ in range(count):
+        transport, subscription = await loop.create_connection(Subscription, "127.0.0.1", port)
+        subscriptions.append(subscription)
+        transports.append(transport)
+    await asyncio.wait_for(asyncio.gather(*(s.connected.wait() for s in subscriptions)), 120)
+    connected.set()
+    while not stop.is_set():
+        await asyncio.sleep(0.1)
+    for transport in transports:
+        transport.close()
+    return [(s.events, s.resyncs, s.latencies) for s in subscriptions]
+
+def client_process(port: int, count: int, connected, stop, results):
+    results.put(asyncio.run(subscribe_all(port, count, connected, stop)))
+
+async def write_load(port: int, pid: int, args):
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as writer:
+        stalled = [await stalled_subscriber(port) for _ in range(args.stalled)]
+        await asyncio.sleep(0.5)
+        rss_idle = server_rss_mb(pid)
+        before = (await writer.get("/health/events")).json()
+
+        write_latencies = []
+        deadline = time.perf_counter() + args.duration
+        i = 0
+        while time.perf_counter() < deadline:
+            sent = time.perf_counter()
+            material_id = 1 + i % args.materials
+            response = await writer.put(f"/api/materials/{material_id}", json={"quantity": 100 + i % 50})
+            response.raise_for_status()
+            write_latencies.append((time.perf_counter() - sent) * 1000)
+            i += 1
+            await asyncio.sleep(max(0.0, 1 / args.rate - (time.perf_counter() - sent)))
+
+        # Let the fan-out drain
+        await asyncio.sleep(2)
+        after = (await writer.get("/health/events")).json()
+        rss_loaded = server_rss_mb(pid)
+        for sock in stalled:
+            sock.close()
+    return write_latencies, before, after, rss_idle, rss_loaded
+
+def wait_for_alert_snapshot(port: int):
+    """The initial snapshot publishes alerts.updated; let it go out before anyone subscribes"""
+    for _ in range(600):
+        if httpx.get(f"http://127.0.0.1:{port}/health/alerts").json()["version"] is not None:
+            return
+        time.sleep(0.1)
+
+def run(port: int, pid: int, args):
+    wait_for_alert_snapshot(port)
+    context = multiprocessing.get_context("spawn")
+    stop, results = context.Event(), context.Queue()
+    shares = [args.subscribers // args.client_processes + (1 if i < args.subscribers % args.client_processes else 0)
+              for i in range(args.client_processes)]
+    clients = []
+    start = time.perf_counter()
+    for share in shares:
+        connected = context.Event()
+        process = context.Process(target=client_process, args=(port, share, connected, stop, results))
+        process.start()
+        clients.append((process, connected))
+    for _, connected in clients:
+        connected.wait(180)
+    connect_seconds = time.perf_counter() - start
+
+    write_latencies, before, after, rss_idle, rss_loaded = asyncio.run(write_load(port, pid, args))
+    stop.set()
+    subscriptions = [subscription for _ in clients for subscription in results.get()]
+    for process, _ in clients:
+        process.join()
+
+    published = after["published"] - before["published"]
+    latencies = [latency for _, _, subscription_latencies in subscriptions for latency in subscription_latencies]
+    return {
+        "subscribers": args.subscribers,
+        "client_processes": args.client_processes,
+        "stalled_subscribers": args.stalled,
+        "connect_all_seconds": round(connect_seconds, 2),
+        "writes": len(write_latencies),
+        "events_published": published,
+        "subscribers_with_every_event": sum(1 for events, _, _ in subscriptions if events == published),
+        "resyncs_to_readers": sum(resyncs for _, resyncs, _ in subscriptions),
+        "resyncs_total": after["resyncs"] - before["resyncs"],
+        "queued_frames_at_end": after["queued_frames"],
+        "delivery_ms": {
+            "p50": round(percentile(latencies, 50), 1) if latencies else None,
+            "p95": round(percentile(latencies, 95), 1) if latencies else None,
+            "p99": round(percentile(latencies, 99), 1) if latencies else None,
+        },
+        "write_ms": {
+            "p50": round(percentile(write_latencies, 50), 1),
+            "p95": round(percentile(write_latencies, 95), 1),
+        },
+        "server_rss_mb": {"subscribed_idle": rss_idle, "after_writes": rss_loaded},
+    }
+
+async def broker_burst(subscribers: int, stalled: int, events: int, queue_size: int):
+    """Fan a burst out through an EventBroker to draining and stalled subscribers"""
+    broker = EventBroker(queue_size=queue_size, max_subscribers=subscribers + stalled)
+    received = [0] * subscribers
+
+    async def drain(index, subscriber):
+        async for frames in broker.stream(subscriber):
+            received[index] += frames.count(b"\nevent: ")
+
+    tasks = [asyncio.create_task(drain(i, broker.subscribe())) for i in range(subscribers)]
+    stalled_subscribers = [broker.subscribe() for _ in range(stalled)]
+    await asyncio.sleep(0.1)
+    start = time.perf_counter()
+    for i in range(events):
+        broker.publish([("material.changed", {"id": i, "quantity": i})])
+        if i % 50 == 0:
+            await asyncio.sleep(0)
+    while sum(received) < subscribers * events and time.perf_counter() - start < 60:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    backlogs = [len(subscriber.frames) for subscriber in stalled_subscribers]
+    return {
+        "subscribers": subscribers,
+        "stalled_subscribers": stalled,
+        "events": events,
+        "deliveries_per_second": round(sum(received) / elapsed),
+        "subscribers_with_every_event": sum(1 for count in received if count == events),
+        "stalled_max_backlog": max(backlogs, default=0),
+        "stalled_end_with_resync": sum(
+            1 for subscriber in stalled_subscribers if subscriber.frames and RESYNC.encode() in subscriber.frames[0]
+        ),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--client-processes", type=int, default=2, help="processes the subscribers are spread over")
+    parser.add_argument("--stalled", type=int, default=5, help="subscribers that never read their stream")
+    parser.add_argument("--rate", type=float, default=20, help="material updates per second")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--materials", type=int, default=200)
+    parser.add_argument("--queue-size", type=int, default=256, help="EVENTS_QUEUE_SIZE")
+    parser.add_argument("--burst", type=int, default=2000, help="events published in the broker backpressure phase")
+    args = parser.parse_args()
+
+    engine, path = make_engine()
+    print(f"Populating {path}...")
+    populate(engine, materials=args.materials, products=500, bom_per_product=5, orders=5000, queue=500)
+    with make_session_factory(engine)() as db:
+        dashboard_counters.rebuild_counters(db)
+        order_rollups.rebuild_rollups(db)
+    engine.dispose()
+
+    os.environ["EVENTS_QUEUE_SIZE"] = str(args.queue_size)
+    os.environ["EVENTS_MAX_SUBSCRIBERS"] = str(args.subscribers + args.stalled + 10)
+    os.environ["ALERTS_REFRESH_SECONDS"] = os.environ["ALERTS_REFRESH_DEBOUNCE_SECONDS"] = "3600"
+    port = free_port()
+    server = start_server(f"sqlite:///{path}", port)
+    try:
+        print(f"Streaming to {args.subscribers} subscribers ({args.stalled} stalled) at {args.rate} writes/s for {args.duration}s...")
+        result = run(port, server.pid, args)
+    finally:
+        server.terminate()
+        server.wait()
+        os.remove(path)
+    print(f"Publishing a burst of {args.burst} events through the broker...")
+    burst = asyncio.run(broker_burst(args.subscribers, args.stalled, args.burst, args.queue_size))
+    print(json.dumps({"http": result, "broker_burst": burst}, indent=2))
+
+    failures = []
+    if result["subscribers_with_every_event"] != args.subscribers:
+        failures.append("HTTP subscribers missed events")
+    if burst["subscribers_with_every_event"] != args.subscribers:
+        failures.append("draining subscribers missed burst events")
+    if burst["stalled_max_backlog"] > args.queue_size or (args.burst > args.queue_size and burst["stalled_end_with_resync"] != args.stalled):
+        failures.append("stalled backlogs were not bounded by a resync")
+    if failures:
+        raise SystemExit(f"FAIL: {'; '.join(failures)}")
+    print("OK")
+
+if __name__ == "__main__":
+    main()
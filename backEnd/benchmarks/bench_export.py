@@ -0,0 +1,61 @@
+"""
+Benchmark full-table order exports: the list-endpoint path (ORM objects, lazily loaded items,
+Pydantic validation, one JSON array) versus the streaming NDJSON export. Reports the peak
+Python heap (tracemalloc) of each at several table sizes; the streaming peak should stay flat.
+
+    python -m benchmarks.bench_export --orders 20000 100000 400000 --legacy-max 100000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import List
+from pydantic import TypeAdapter
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate
+from schemas import Order as OrderSchema
+from services import export_service, orders_service
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": round(seconds, 2), "peak_mb": round(peak / 2 ** 20, 1), "bytes_out": size}
+
+def legacy_export(db, orders):
+    # What the route does: load ORM rows, validate through the response model, render one array
+    adapter = TypeAdapter(List[OrderSchema])
+    return len(adapter.dump_json(adapter.validate_python(orders_service.get_orders(db, limit=orders))))
+
+def streaming_export(db):
+    return sum(len(chunk) for chunk in export_service.export_orders(db, "ndjson"))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, nargs="+", default=[20000, 100000, 400000])
+    parser.add_argument("--items", type=int, default=3, help="items per order")
+    parser.add_argument("--legacy-max", type=int, default=100000, help="skip the legacy path above this size")
+    args = parser.parse_args()
+
+    results = []
+    for orders in args.orders:
+        engine, path = make_engine()
+        print(f"Populating {path} with {orders} orders...")
+        populate(engine, orders=orders, items_per_order=args.items, queue=0, shortages=0)
+        session_factory = make_session_factory(engine)
+
+        result = {"orders": orders}
+        with session_factory() as db:
+            result["streaming"] = measure(lambda: streaming_export(db))
+        if orders <= args.legacy_max:
+            with session_factory() as db:
+                result["legacy"] = measure(lambda: legacy_export(db, orders))
+        results.append(result)
+        engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
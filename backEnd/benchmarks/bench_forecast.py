@@ -0,0 +1,125 @@
+"""
+Benchmark the demand forecasting engine. The first phase forecasts a synthetic consumption matrix
+(10,000 materials x 365 days by default, with a mix of flat, trending and intermittent demand)
+and fails if the median exceeds the budget. The second phase populates a database, builds the
+matrix from the daily product sales rollups, checks it against the same usage aggregated from
+order items and the BOM, and times the full forecast_materials() path.
+
+    python -m benchmarks.bench_forecast --materials 10000 --days 365 --budget-ms 1000
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import timedelta
+import numpy as np
+from sqlalchemy import func
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate, percentile
+from models import Material, Order, OrderItem, ProductMaterial
+from services import forecasting, order_rollups
+
+def timings(samples):
+    return {"p50_ms": round(percentile(samples, 50), 2), "p95_ms": round(percentile(samples, 95), 2)}
+
+def synthetic_matrix(materials, days, seed=42):
+    rng = np.random.default_rng(seed)
+    rates = rng.uniform(0.5, 20, size=(materials, 1))
+    slopes = np.where(rng.random((materials, 1)) < 0.3, rng.uniform(-0.02, 0.05, size=(materials, 1)), 0)
+    expected = np.maximum(rates * (1 + slopes * np.arange(days)), 0)
+    matrix = rng.poisson(expected).astype(float)
+    # A tenth of the materials are only used now and then
+    intermittent = rng.random(materials) < 0.1
+    matrix[intermittent] *= rng.random((int(intermittent.sum()), days)) < 0.1
+    return matrix
+
+def matrix_phase(args):
+    matrix = synthetic_matrix(args.materials, args.days)
+    quantities = np.random.default_rng(7).uniform(0, 500, args.materials)
+    required = np.full(args.materials, 50.0)
+    samples = []
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        result = forecasting.forecast(matrix, quantities, required)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "shape": list(matrix.shape),
+        "forecast": timings(samples),
+        "below_reorder_point": int((quantities <= result["reorder_point"]).sum()),
+        "mean_daily_demand": round(float(result["daily_demand"].mean()), 2),
+    }
+
+def raw_usage(db, first, days):
+    """Units of each material used in the window, from order items and the BOM"""
+    return {
+        material_id: int(used)
+        for material_id, used in db.query(ProductMaterial.material_id, func.sum(OrderItem.quantity * ProductMaterial.quantity))
+        .join(ProductMaterial, ProductMaterial.product_id == OrderItem.product_id)
+        .join(Order, Order.id == OrderItem.order_id)
+        .filter(Order.created_at >= first, Order.created_at < first + timedelta(days=days))
+        .group_by(ProductMaterial.material_id)
+    }
+
+def database_phase(args):
+    engine, path = make_engine()
+    print(f"Populating {path} with {args.db_materials} materials and {args.orders} orders over {args.days} days...")
+    populate(engine, materials=args.db_materials, products=args.products, orders=args.orders, days=args.days + 1,
+             queue=0, shortages=0)
+    session_factory = make_session_factory(engine)
+    with session_factory() as db:
+        order_rollups.rebuild_rollups(db)
+
+    build, full = [], []
+    for _ in range(args.iterations):
+        with session_factory() as db:
+            materials = db.query(Material).all()
+            ids = [material.id for material in materials]
+            start = time.perf_counter()
+            matrix = forecasting.consumption_matrix(db, ids, args.days)
+            build.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            forecasts = forecasting.forecast_materials(db, materials, args.days)
+            full.append((time.perf_counter() - start) * 1000)
+        with session_factory() as db:
+            expected = raw_usage(db, forecasting.history_window(args.days), args.days)
+    engine.dispose()
+
+    totals = {material_id: int(total) for material_id, total in zip(ids, matrix.sum(axis=1)) if total}
+    return {
+        "materials": args.db_materials,
+        "orders": args.orders,
+        "build_matrix": timings(build),
+        "forecast_materials": timings(full),
+        "matrix_matches_order_items": totals == expected,
+        "at_or_below_reorder_point": sum(
+            1 for material in materials if (material.quantity or 0) <= forecasts[material.id]["reorder_point"]
+        ),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--materials", type=int, default=10000, help="rows of the synthetic matrix")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--budget-ms", type=float, default=1000, help="median forecast time allowed for the matrix")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--db-materials", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"Forecasting a {args.materials} x {args.days} consumption matrix...")
+    matrix = matrix_phase(args)
+    database = database_phase(args)
+    print(json.dumps({"matrix": matrix, "database": database}, indent=2))
+
+    failures = []
+    if matrix["forecast"]["p50_ms"] > args.budget_ms:
+        failures.append(f"forecast took {matrix['forecast']['p50_ms']} ms (budget {args.budget_ms} ms)")
+    if not database["matrix_matches_order_items"]:
+        failures.append("the consumption matrix disagrees with order items x BOM")
+    if failures:
+        print(f"FAIL: {'; '.join(failures)}")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark deep pages of GET /api/orders/: OFFSET pagination versus keyset cursors. Fetches
+one page at several depths each way; OFFSET time grows with the depth while the cursor page
+is an index seek on (created_at, id) and stays flat.
+
+    python -m benchmarks.bench_pagination --orders 600000 --depths 0 10000 100000 500000
+"""
+import argparse
+import json
+import time
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate, percentile
+from models import Order
+from services import orders_service
+from services.pagination import paginate
+
+def time_page(fetch, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        rows = fetch()
+        samples.append((time.perf_counter() - start) * 1000)
+    return rows, samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=600000)
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 10000, 100000, 500000])
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--db", help="SQLite file to (re)create; defaults to a temp file")
+    args = parser.parse_args()
+
+    engine, path = make_engine(args.db)
+    print(f"Populating {path} with {args.orders} orders...")
+    populate(engine, materials=50, products=100, bom_per_product=5, orders=args.orders,
+             items_per_order=1, queue=0, shortages=0)
+    session_factory = make_session_factory(engine)
+
+    results = []
+    db = session_factory()
+    try:
+        for depth in [depth for depth in args.depths if depth < args.orders]:
+            # Cursor pointing just before row `depth`, as a client walking the pages would hold
+            cursor = None
+            if depth:
+                cursor = paginate(db.query(Order), [Order.created_at, Order.id], skip=depth - 1, limit=1).next_cursor
+
+            offset_rows, offset_ms = time_page(
+                lambda: orders_service.get_orders(db, skip=depth, limit=args.limit), args.runs)
+            cursor_rows, cursor_ms = time_page(
+                lambda: orders_service.get_orders(db, cursor=cursor, limit=args.limit), args.runs)
+            assert [order.id for order in offset_rows] == [order.id for order in cursor_rows], \
+                f"offset and cursor pages differ at depth {depth}"
+            db.expunge_all()
+
+            results.append({
+                "depth": depth,
+                "offset_p50_ms": round(percentile(offset_ms, 50), 2),
+                "offset_p95_ms": round(percentile(offset_ms, 95), 2),
+                "cursor_p50_ms": round(percentile(cursor_ms, 50), 2),
+                "cursor_p95_ms": round(percentile(cursor_ms, 95), 2),
+            })
+    finally:
+        db.close()
+
+    print(json.dumps({"orders": args.orders, "page_size": args.limit, "runs": args.runs, "pages": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+"""
+Benchmark harness for every route of the API. Generates a synthetic database (or copies one made
+by benchmarks.synthetic_data), adds disposable rows for the routes that delete or reserve, then
+sends each route --requests requests from --concurrency clients, one route after another, either
+in-process through an ASGI client (--mode asgi) or to a uvicorn server (--mode uvicorn). The chat
+route answers from the stub LLM. Reports per route: throughput, p50/p95/p99 latency, status codes,
+and SQL statements and DB time per request (from the query profiler's /metrics histograms), as
+JSON that can be compared between commits.
+
+    python -m benchmarks.bench_routes --mode asgi --concurrency 8 --requests 100 --out before.json
+    python -m benchmarks.bench_routes --mode uvicorn --database bench.db --baseline before.json
+    python -m benchmarks.bench_routes --compare before.json after.json --tolerance 0.25
+
+With --baseline or --compare, exits 1 if a route runs more SQL statements per request, returns
+more errors, or its p95 grows by more than the tolerance (and 2 ms). Latency is only comparable
+between runs on the same machine with the same settings.
+"""
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+# The app's engine and LLM client read these when first imported, which the imports below do
+_handle, DB_PATH = tempfile.mkstemp(prefix="tally-bench-", suffix=".db")
+os.close(_handle)
+
+@atexit.register
+def _remove_database():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(DB_PATH + suffix):
+            os.remove(DB_PATH + suffix)
+
+with socket.socket() as _sock:
+    _sock.bind(("127.0.0.1", 0))
+    STUB_PORT = _sock.getsockname()[1]
+os.environ.update({"DATABASE_URL": f"sqlite:///{DB_PATH}", "OPENAI_BASE_URL": f"http://127.0.0.1:{STUB_PORT}/v1",
+                   "OPENAI_API_KEY": "stub", "QUERY_PROFILER_ENABLED": "true"})
+
+import httpx
+from sqlalchemy import create_engine, func, update
+from benchmarks.load_test import free_port, start_server
+from benchmarks.stub_llm import start_stub
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate, prepare, percentile, row_counts
+from models import Integration, Material, Order, OrderItem, OrderQueue, Product, product_materials
+
+# Routes that cannot be driven request by request, with the reason
+SKIPPED = {
+    "GET /api/events": "long-lived SSE stream; see benchmarks.bench_events",
+}
+
+# Most requests sent to routes that work on the whole dataset
+REQUEST_LIMITS = {
+    "POST /api/analytics/rebuild": 3,
+    "POST /api/products/recalculate-can-build": 10,
+    "GET /api/export/orders": 10,
+    "GET /api/export/materials": 20,
+    "GET /api/dashboard/consistency": 20,
+    "POST /api/dashboard/consistency/repair": 10,
+    "POST /api/order-queue/shortages": 20,
+}
+
+class Dataset:
+    """Ids the request factories draw from: the generated rows and the disposable fixtures"""
+
+    def __init__(self, db, fixtures: int):
+        self.run = int(time.time())
+        self.fixtures = fixtures
+        self.materials = db.query(func.max(Material.id)).scalar() or 0
+        self.products = db.query(func.max(Product.id)).scalar() or 0
+        self.integrations = db.query(func.max(Integration.id)).scalar() or 0
+        self.order_ids = [row[0] for row in db.query(Order.id).order_by(Order.id).limit(1000)]
+        self.queue_ids = [row[0] for row in db.query(OrderQueue.id).order_by(OrderQueue.id).limit(1000)]
+
+    def material(self, i):
+        return i % self.materials + 1
+
+    def product(self, i):
+        return i % self.products + 1
+
+    def order(self, i):
+        return self.order_ids[i % len(self.order_ids)]
+
+    def queued(self, i):
+        return self.queue_ids[i % len(self.queue_ids)]
+
+    # Disposable rows, one per request (see add_fixtures)
+    def spare_material(self, i):
+        return self.materials + 1 + i
+
+    def spare_product(self, i):
+        return self.products + 1 + i
+
+    def bomless_product(self, i):
+        return self.products + self.fixtures + 1 + i
+
+    def spare_integration(self, i):
+        return self.integrations + 1 + i
+
+def add_fixtures(engine, count: int) -> Dataset:
+    """Disposable rows for the routes that delete, reserve or add BOM lines, one per request"""
+    with make_session_factory(engine)() as db:
+        data = Dataset(db, count)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(Material.__table__.insert(), [
+            {"id": data.spare_material(i), "name": f"Spare material {i}", "color": "grey", "quantity": 0,
+             "unit": "yards", "required": 0, "created_at": now}
+            for i in range(count)
+        ])
+        conn.execute(Product.__table__.insert(), [
+            {"id": data.products + 1 + i, "name": f"Spare product {i}", "sku": f"SPARE-{i:07d}", "color": "grey",
+             "price": 10, "can_build": 0, "created_at": now}
+            for i in range(2 * count)
+        ])
+        conn.execute(Integration.__table__.insert(), [
+            {"id": data.spare_integration(i), "name": f"spare-{i}", "display_name": f"Spare {i}", "enabled": False,
+             "created_at": now}
+            for i in range(count)
+        ])
+        # Orders to delete, and queued orders of one unit of product 1 to reserve and release
+        conn.execute(Order.__table__.insert(), [
+            {"id": f"{prefix}-{i:07d}", "customer": "Bench", "email": "bench@example.com", "status": "Queued",
+             "order_date": now, "total": 25.99, "shipping_address": "1 Bench St", "created_at": now}
+            for prefix in ("DEL", "RSV") for i in range(count)
+        ])
+        conn.execute(OrderItem.__table__.insert(), [
+            {"order_id": f"RSV-{i:07d}", "product_id": 1, "product_name": "Product 1", "quantity": 1, "price": 25.99}
+            for i in range(count)
+        ])
+        conn.execute(OrderQueue.__table__.insert(), [
+            {"id": f"RSV-{i:07d}", "customer": "Bench", "email": "bench@example.com", "status": "Queued",
+             "order_date": now, "total": 25.99, "can_fulfill": True, "created_at": now}
+            for i in range(count)
+        ])
+        product_one = [row[0] for row in conn.execute(
+            product_materials.select().with_only_columns(product_materials.c.material_id)
+            .where(product_materials.c.product_id == 1)
+        )]
+        conn.execute(update(Material.__table__).where(Material.__table__.c.id.in_(product_one)).values(quantity=10 ** 9))
+    return data
+
+def request_factories(data: Dataset):
+    """(url, json body) of request i, per route with path parameters or a body"""
+    material = lambda i: {"name": f"Bench material {data.run}-{i}", "color": "red", "quantity": 100, "unit": "yards",
+                          "required": 10}
+    items = lambda i: [{"product_id": data.product(i + k), "product_name": "Product", "quantity": 1, "price": 25.99}
+                       for k in range(3)]
+    return {
+        "GET /api/materials/{material_id}": lambda i: (f"/api/materials/{data.material(i)}", None),
+        "POST /api/materials/": lambda i: ("/api/materials/", material(i)),
+        "PUT /api/materials/{material_id}": lambda i: (f"/api/materials/{data.material(i)}", {"required": 10 + i % 50}),
+        "DELETE /api/materials/{material_id}": lambda i: (f"/api/materials/{data.spare_material(i)}", None),
+        "POST /api/order-queue/": lambda i: ("/api/order-queue/", {"customer": "Bench", "email": "bench@example.com",
+                                                                    "total": 25.99}),
+        "PUT /api/order-queue/{order_id}": lambda i: (f"/api/order-queue/{data.queued(i)}", {"can_fulfill": i % 2 == 0}),
+        "POST /api/order-queue/{order_id}/reservation": lambda i: (f"/api/order-queue/RSV-{i:07d}/reservation", None),
+        "DELETE /api/order-queue/{order_id}/reservation": lambda i: (f"/api/order-queue/RSV-{i:07d}/reservation", None),
+        "POST /api/order-queue/shortages": lambda i: ("/api/order-queue/shortages",
+                                                      {"order_ids": [data.queued(i * 20 + k) for k in range(20)]}),
+        "POST /api/products/recalculate-can-build": lambda i: ("/api/products/recalculate-can-build", None),
+        "GET /api/products/{product_id}": lambda i: (f"/api/products/{data.product(i)}", None),
+        "POST /api/products/": lambda i: ("/api/products/", {"name": f"Bench tee {i}", "sku": f"BENCH-{data.run}-{i}",
+                                                             "color": "red", "price": 20}),
+        "PUT /api/products/{product_id}": lambda i: (f"/api/products/{data.product(i)}", {"price": 20 + i % 10}),
+        "DELETE /api/products/{product_id}": lambda i: (f"/api/products/{data.spare_product(i)}", None),
+        "GET /api/orders/{order_id}": lambda i: (f"/api/orders/{data.order(i)}", None),
+        "POST /api/orders/": lambda i: ("/api/orders/", {"customer": "Bench", "email": "bench@example.com",
+                                                         "shipping_address": "1 Bench St", "items": items(i)}),
+        "PUT /api/orders/{order_id}": lambda i: (f"/api/orders/{data.order(i)}", {"tracking_number": f"TRK-{i}"}),
+        "DELETE /api/orders/{order_id}": lambda i: (f"/api/orders/DEL-{i:07d}", None),
+        "GET /api/integrations/{integration_id}": lambda i: (f"/api/integrations/{i % data.integrations + 1}", None),
+        "POST /api/integrations/": lambda i: ("/api/integrations/", {"name": f"bench-{data.run}-{i}",
+                                                                     "display_name": f"Bench {i}"}),
+        "PUT /api/integrations/{integration_id}": lambda i: (f"/api/integrations/{i % data.integrations + 1}",
+                                                             {"enabled": i % 2 == 0}),
+        "DELETE /api/integrations/{integration_id}": lambda i: (f"/api/integrations/{data.spare_integration(i)}", None),
+        "POST /api/bulk/materials": lambda i: ("/api/bulk/materials", [
+            {**material(k), "name": f"Bench bulk material {data.run}-{i}-{k}"} for k in range(100)
+        ]),
+        "POST /api/bulk/products": lambda i: ("/api/bulk/products", [
+            {"name": f"Bulk tee {k}", "sku": f"BULK-{data.run}-{i}-{k}", "color": "red", "price": 20,
+             "bom": [{"material_id": data.material(k + line), "quantity": 1} for line in range(3)]}
+            for k in range(100)
+        ]),
+        "POST /api/bulk/bom": lambda i: ("/api/bulk/bom", [
+            {"product_id": data.bomless_product(i), "material_id": data.material(i + line), "quantity": 1}
+            for line in range(3)
+        ]),
+        "POST /api/bulk/orders": lambda i: ("/api/bulk/orders", [
+            {"id": f"BULK-{data.run}-{i}-{k}", "customer": "Bench", "email": "bench@example.com",
+             "shipping_address": "1 Bench St", "items": items(i + k)}
+            for k in range(10)
+        ]),
+        "POST /api/ai/chat": lambda i: ("/api/ai/chat", {"message": f"Which materials should I reorder this week? ({i % 20})"}),
+        "GET /api/analytics/products/{product_id}": lambda i: (f"/api/analytics/products/{data.product(i)}", None),
+        "POST /api/analytics/rebuild": lambda i: ("/api/analytics/rebuild", None),
+        "POST /api/dashboard/consistency/repair": lambda i: ("/api/dashboard/consistency/repair", None),
+    }
+
+def plan_routes(app, data: Dataset, args):
+    """(key, method, factory, requests) for every route to drive, and {key: reason} for the rest"""
+    from fastapi.routing import APIRoute
+    factories = request_factories(data)
+    planned, skipped = [], {}
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        for method in sorted(route.methods):
+            key = f"{method} {route.path}"
+            if args.routes and not re.search(args.routes, key):
+                continue
+            if key in SKIPPED:
+                skipped[key] = SKIPPED[key]
+                continue
+            factory = factories.get(key)
+            if factory is None and ("{" in route.path or method != "GET"):
+                skipped[key] = "no request factory in benchmarks/bench_routes.py"
+                continue
+            factory = factory or (lambda i, path=route.path: (path, None))
+            planned.append((key, method, factory, min(args.requests, REQUEST_LIMITS.get(key, args.requests))))
+    return planned, skipped
+
+_PROFILE_METRIC = re.compile(
+    r'^tally_db_(statements_per_request|time_per_request_seconds)_(sum|count)\{method="([^"]+)",route="([^"]+)"\} (\S+)$'
+)
+
+async def scrape(new_client) -> dict:
+    """{(method, route): {"statements_sum", "statements_count", "time_sum"}} from /metrics"""
+    async with new_client() as client:
+        exposition = (await client.get("/metrics")).text
+    totals = {}
+    for line in exposition.splitlines():
+        match = _PROFILE_METRIC.match(line)
+        if match:
+            metric, part, method, route, value = match.groups()
+            if metric.startswith("time") and part == "count":
+                continue
+            name = "time_sum" if metric.startswith("time") else f"statements_{part}"
+            totals.setdefault((method, route), {})[name] = float(value)
+    return totals
+
+async def drive(client, method: str, factory, requests: int, concurrency: int):
+    latencies, statuses = [], Counter()
+    indexes = iter(range(requests))
+
+    async def worker():
+        for i in indexes:
+            url, body = factory(i)
+            sent = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append((time.perf_counter() - sent) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+    return latencies, statuses, time.perf_counter() - start
+
+def summarize(latencies, statuses, elapsed, before, after):
+    sql = None
+    if after and after.get("statements_count", 0) > (before or {}).get("statements_count", 0):
+        requests = after["statements_count"] - (before or {}).get("statements_count", 0)
+        sql = {
+            "statements_per_request": round((after["statements_sum"] - (before or {}).get("statements_sum", 0)) / requests, 1),
+            "db_ms_per_request": round((after["time_sum"] - (before or {}).get("time_sum", 0)) * 1000 / requests, 2),
+        }
+    return {
+        "requests": len(latencies),
+        "errors": sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 400),
+        "statuses": dict(sorted(statuses.items())),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "sql_statements": sql["statements_per_request"] if sql else None,
+        "db_ms": sql["db_ms_per_request"] if sql else None,
+    }
+
+async def run_routes(new_client, planned, concurrency: int):
+    """Drive the routes one after another; each route and each /metrics scrape gets its own client,
+    so a connection the server dropped after a 500 does not fail the next route's requests"""
+    results = {}
+    for key, method, factory, requests in planned:
+        route = key.split(" ", 1)[1]
+        before = (await scrape(new_client)).get((method, route))
+        async with new_client() as client:
+            latencies, statuses, elapsed = await drive(client, method, factory, requests, concurrency)
+        after = (await scrape(new_client)).get((method, route))
+        results[key] = summarize(latencies, statuses, elapsed, before, after)
+        print(f"{key:<52} {results[key]['throughput_rps']:>8} req/s  p95 {results[key]['p95_ms']:>8} ms  "
+              f"sql {results[key]['sql_statements']}  errors {results[key]['errors']}")
+    return results
+
+async def run_asgi(app_module, planned, concurrency: int):
+    transport = httpx.ASGITransport(app=app_module.app, raise_app_exceptions=False)
+    async with app_module.lifespan(app_module.app):
+        return await run_routes(lambda: httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300),
+                                planned, concurrency)
+
+async def run_uvicorn(port: int, planned, concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency)
+    return await run_routes(lambda: httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300, limits=limits),
+                            planned, concurrency)
+
+def git_commit():
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=cwd, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=cwd,
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+def compare(baseline: dict, current: dict, tolerance: float):
+    """Print per-route changes; returns the regressions"""
+    regressions = []
+    for setting in ("mode", "concurrency", "requests_per_route", "dataset"):
+        if baseline["meta"].get(setting) != current["meta"].get(setting):
+            print(f"warning: {setting} differs ({baseline['meta'].get(setting)} vs {current['meta'].get(setting)}),"
+                  " latency is not comparable")
+    print(f"{'route':<52} {'p95 ms':>21} {'req/s':>19} {'sql/request':>15}")
+    for key in sorted(set(baseline["routes"]) | set(current["routes"])):
+        before, after = baseline["routes"].get(key), current["routes"].get(key)
+        if before is None or after is None:
+            print(f"{key:<52} {'only in ' + ('current' if before is None else 'baseline')}")
+            continue
+        print(f"{key:<52} {before['p95_ms']:>9} -> {after['p95_ms']:<8} {before['throughput_rps']:>8} -> "
+              f"{after['throughput_rps']:<8} {str(before['sql_statements']):>6} -> {after['sql_statements']}")
+        if after["p95_ms"] > before["p95_ms"] * (1 + tolerance) and after["p95_ms"] - before["p95_ms"] > 2:
+            regressions.append(f"{key}: p95 {before['p95_ms']} -> {after['p95_ms']} ms")
+        if before["sql_statements"] is not None and after["sql_statements"] is not None \
+                and after["sql_statements"] > before["sql_statements"] + 0.5:
+            regressions.append(f"{key}: {before['sql_statements']} -> {after['sql_statements']} SQL statements per request")
+        if after["errors"] > before["errors"]:
+            regressions.append(f"{key}: errors {before['errors']} -> {after['errors']}")
+    return regressions
+
+def prepare_database(args):
+    """A database to benchmark against: generated, or a copy of --database (the run writes to it)"""
+    if args.database:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.database + suffix):
+                shutil.copyfile(args.database + suffix, DB_PATH + suffix)
+        engine = create_engine(f"sqlite:///{DB_PATH}")
+    else:
+        engine, _ = make_engine(DB_PATH)
+        print(f"Populating {DB_PATH}...")
+        populate(engine, materials=args.materials, products=args.products, bom_per_product=args.bom_per_product,
+                 orders=args.orders, items_per_order=args.items_per_order, days=args.days, queue=args.queue,
+                 seed=args.seed)
+    data = add_fixtures(engine, args.requests)
+    prepare(engine)
+    rows = row_counts(engine)
+    engine.dispose()
+    return data, rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="requests per route (fewer for whole-dataset routes)")
+    parser.add_argument("--routes", help="only routes whose 'METHOD /path' matches this regex")
+    parser.add_argument("--database", help="SQLite file from benchmarks.synthetic_data (copied, not modified)")
+    parser.add_argument("--materials", type=int, default=500)
+    parser.add_argument("--products", type=int, default=300)
+    parser.add_argument("--bom-per-product", type=int, default=8)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--items-per-order", type=int, default=3)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--queue", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="stub LLM seconds per answer")
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report to compare this run with")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="compare two reports and exit")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="p95 growth allowed before a regression")
+    parser.add_argument("--strict", action="store_true", help="exit 1 if a route has no request factory")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as baseline_file, open(args.compare[1]) as current_file:
+            regressions = compare(json.load(baseline_file), json.load(current_file), args.tolerance)
+        if regressions:
+            print("REGRESSIONS:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("OK")
+        return
+
+    data, rows = prepare_database(args)
+    stub = start_stub(STUB_PORT, args.llm_latency)
+    # Imported once the database is ready, so the app's engine opens the finished file
+    import main as app_module
+    planned, skipped = plan_routes(app_module.app, data, args)
+    print(f"Driving {len(planned)} routes ({args.mode}, concurrency {args.concurrency}), skipping {len(skipped)}...")
+    server = None
+    try:
+        if args.mode == "asgi":
+            results = asyncio.run(run_asgi(app_module, planned, args.concurrency))
+        else:
+            port = free_port()
+            server = start_server(os.environ["DATABASE_URL"], port)
+            results = asyncio.run(run_uvicorn(port, planned, args.concurrency))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        stub.terminate()
+        stub.wait()
+        app_module.engine.dispose()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "mode": args.mode,
+            "concurrency": args.concurrency,
+            "requests_per_route": args.requests,
+            "dataset": {"source": args.database or "generated", "seed": args.seed, "rows": rows},
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "routes": results,
+        "skipped": skipped,
+    }
+    if args.out:
+        with open(args.out, "w") as out:
+            json.dump(report, out, indent=2)
+        print(f"Wrote {args.out}")
+    else:
+        print(json.dumps(report, indent=2))
+
+    failures = []
+    if args.strict and any(reason.startswith("no request factory") for reason in skipped.values()):
+        failures.append(f"routes without a request factory: {sorted(skipped)}")
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            failures += compare(json.load(baseline_file), report, args.tolerance)
+    if failures:
+        print("REGRESSIONS:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Concurrent read/write benchmark on SQLite: the previous engine setup (rollback journal, default
+pool) versus database.make_engine (WAL, synchronous=NORMAL, cache/mmap, busy_timeout and the
+configured pool). Reader threads page through orders and materials while writer threads update
+material stock through materials_service (which also refreshes can_build and the counters).
+
+    python -m benchmarks.bench_sqlite_concurrency --readers 16 --writers 4 --duration 15
+"""
+import argparse
+import json
+import random
+import shutil
+import threading
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from benchmarks.synthetic_data import make_engine as make_bench_engine, make_session_factory, populate, percentile
+from database import make_engine, pool_status
+from schemas import MaterialUpdate
+from services import dashboard_counters, order_rollups, materials_service, orders_service
+
+def legacy_engine(path):
+    """database.py before pooling/pragmas were configurable, on a rollback-journal file"""
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=DELETE")
+    return engine
+
+def run(engine, readers, writers, duration, materials, seed):
+    session_factory = make_session_factory(engine)
+    stop_at = time.perf_counter() + duration
+    lock = threading.Lock()
+    stats = {"read": [], "write": [], "read_errors": 0, "write_errors": 0}
+
+    def reader():
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                with session_factory() as db:
+                    orders_service.get_orders(db, limit=50)
+                    materials_service.get_materials(db, limit=100)
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    stats["read"].append(elapsed)
+            except (OperationalError, PoolTimeoutError):
+                with lock:
+                    stats["read_errors"] += 1
+
+    def writer(rng):
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                with session_factory() as db:
+                    materials_service.update_material(db, rng.randint(1, materials), MaterialUpdate(quantity=rng.randint(0, 500)))
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    stats["write"].append(elapsed)
+            except (OperationalError, PoolTimeoutError):
+                with lock:
+                    stats["write_errors"] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(random.Random(seed + i),)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    summary = {}
+    for kind in ("read", "write"):
+        samples = stats[kind]
+        summary[kind] = {
+            "ops_per_second": round(len(samples) / duration, 1),
+            "errors": stats[f"{kind}_errors"],
+            "p50_ms": round(percentile(samples, 50), 1) if samples else None,
+            "p95_ms": round(percentile(samples, 95), 1) if samples else None,
+            "p99_ms": round(percentile(samples, 99), 1) if samples else None,
+        }
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--materials", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    engine, path = make_bench_engine()
+    print(f"Populating {path} with {args.orders} orders...")
+    populate(engine, materials=args.materials, products=500, bom_per_product=5, orders=args.orders)
+    with make_session_factory(engine)() as db:
+        dashboard_counters.rebuild_counters(db)
+        order_rollups.rebuild_rollups(db)
+    engine.dispose()
+    tuned_path = path.replace(".db", "-tuned.db")
+    shutil.copyfile(path, tuned_path)
+
+    results = {}
+    for name, engine in (("legacy", legacy_engine(path)), ("tuned", make_engine(make_url(f"sqlite:///{tuned_path}")))):
+        print(f"Running {name} with {args.readers} readers and {args.writers} writers for {args.duration}s...")
+        results[name] = run(engine, args.readers, args.writers, args.duration, args.materials, args.seed)
+        with engine.connect() as conn:
+            results[name]["journal_mode"] = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+        results[name]["pool"] = pool_status(engine)
+        engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark the order series of /api/dashboard/trends: the original implementation (every order
+of the last 30 days loaded as an ORM object and grouped in Python), a GROUP BY over the orders
+table, and order_rollups.get_order_series (GROUP BY over the order rollups). Also checks that
+all three agree, per day, and that the week and hour series add up to the same totals.
+
+    python -m benchmarks.bench_trends --orders 1000000
+"""
+import argparse
+import json
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate, percentile
+from models import Order
+from services import order_rollups, dashboard_service
+
+def legacy_daily_orders(db, now):
+    """The original trends loop, kept for comparison (window aligned to whole days)"""
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=29)
+    orders = db.query(Order).filter(Order.created_at >= start).all()
+    daily = defaultdict(lambda: {"orders": 0, "revenue": 0.0})
+    for order in orders:
+        day = daily[order.created_at.date().isoformat()]
+        day["orders"] += 1
+        day["revenue"] += order.total or 0
+    return {date: (data["orders"], round(data["revenue"], 2)) for date, data in daily.items()}
+
+def orders_group_by(db, now):
+    """GROUP BY date(created_at) straight over the orders table"""
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=29)
+    bucket = dashboard_service.bucket_expression(db, Order.created_at, "day")
+    rows = db.query(bucket, func.count(Order.id), func.sum(Order.total)) \
+        .filter(Order.created_at >= start).group_by(bucket).all()
+    return {dashboard_service.parse_bucket(day).date().isoformat(): (count, round(revenue, 2)) for day, count, revenue in rows}
+
+def rollup_series(db, now):
+    series = order_rollups.get_order_series(db, days=30, granularity="day", now=now)
+    return {row["date"]: (row["orders"], row["revenue"]) for row in series if row["orders"]}
+
+def run(fn, session_factory, now, iterations):
+    timings = []
+    for _ in range(iterations):
+        with session_factory() as db:
+            start = time.perf_counter()
+            result = fn(db, now)
+            timings.append((time.perf_counter() - start) * 1000)
+    return result, {"p50_ms": round(percentile(timings, 50), 2), "p95_ms": round(percentile(timings, 95), 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--days", type=int, default=90, help="spread of the synthetic orders")
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    engine, path = make_engine()
+    print(f"Populating {path} with {args.orders} orders over {args.days} days...")
+    populate(engine, materials=50, products=100, orders=args.orders, days=args.days, queue=0, shortages=0)
+    session_factory = make_session_factory(engine)
+    with session_factory() as db:
+        order_rollups.rebuild_rollups(db)
+    now = datetime.now()
+
+    results, timings = {}, {}
+    for name, fn, iterations in (
+        ("legacy_orm_loop", legacy_daily_orders, max(1, args.iterations // 5)),
+        ("orders_group_by", orders_group_by, args.iterations),
+        ("order_rollups", rollup_series, args.iterations),
+    ):
+        print(f"Running {name}...")
+        results[name], timings[name] = run(fn, session_factory, now, iterations)
+
+    mismatches = [name for name, result in results.items() if result != results["legacy_orm_loop"]]
+    with session_factory() as db:
+        totals = {
+            granularity: sum(row["orders"] for row in order_rollups.get_order_series(db, days=28, granularity=granularity, now=now))
+            for granularity in ("hour", "day")
+        }
+        # Whole weeks: compare against the orders since that week's Monday
+        weeks = order_rollups.get_order_series(db, days=28, granularity="week", now=now)
+        week_start = datetime.fromisoformat(weeks[0]["date"])
+        totals["week"] = sum(row["orders"] for row in weeks)
+        expected_weeks = db.query(func.count(Order.id)).filter(Order.created_at >= week_start).scalar()
+
+    print(json.dumps({
+        "orders": args.orders,
+        "timings": timings,
+        "series_match_legacy": not mismatches,
+        "hour_and_day_totals_match": totals["hour"] == totals["day"],
+        "week_totals_match": totals["week"] == expected_weeks,
+    }, indent=2))
+    if mismatches or totals["hour"] != totals["day"] or totals["week"] != expected_weeks:
+        raise SystemExit(f"FAIL: series disagree ({mismatches}, {totals}, weeks expected {expected_weeks})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Response cache coherence check across uvicorn worker processes. Starts the API with several
+workers on one synthetic database and warms the materials, products and integrations lists and
+the AI alert snapshot in every worker. It then alternates writes (material stock and name,
+product price, integration toggle, bulk material import, material delete) with bursts of reads,
+each on a new connection so the kernel spreads them across the workers.
+
+Every read after a write must show the write and carry a new ETag. A conditional request with
+the previous ETag must get a 200, and one with the new ETag a 304. Exits 1 on any stale
+response, or if the reads did not reach at least two workers or never hit a cache.
+
+    python -m benchmarks.check_cache_coherence --workers 4 --rounds 5
+    python -m benchmarks.check_cache_coherence --driver sqlite+aiosqlite
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+_handle, DB_PATH = tempfile.mkstemp(prefix="tally-cache-check-", suffix=".db")
+os.close(_handle)
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+import httpx
+from benchmarks.load_test import free_port, start_server
+from benchmarks.synthetic_data import make_engine, populate, prepare
+
+MATERIALS, PRODUCTS, INTEGRATIONS = "/api/materials/?limit=1000", "/api/products/?limit=1000", "/api/integrations/"
+ALERTS = "/api/ai/alerts"
+
+class Checker:
+    def __init__(self, client: httpx.Client, reads: int):
+        self.client = client
+        self.reads = reads
+        self.etags = {}
+        self.results = {"hit": 0, "miss": 0}
+        self.failures = []
+
+    def burst(self, path: str, expect, label: str):
+        """``reads`` GETs of path; each must satisfy expect(body) and the ETag must have changed"""
+        previous = self.etags.get(path)
+        etags = set()
+        for _ in range(self.reads):
+            response = self.client.get(path)
+            # The alert snapshot is not a response cache entry and has no X-Cache
+            if "x-cache" in response.headers:
+                self.results[response.headers["x-cache"]] += 1
+            if response.status_code != 200 or not expect(response.json()):
+                self.failures.append(f"{label}: stale or failed {path} ({response.status_code}, {response.headers.get('x-cache')})")
+            etags.add(response.headers.get("etag"))
+        if len(etags) != 1:
+            self.failures.append(f"{label}: {path} served {len(etags)} different ETags for the same data")
+        etag = etags.pop()
+        if previous is not None and etag == previous:
+            self.failures.append(f"{label}: {path} kept its ETag after the write")
+        for _ in range(self.reads // 2):
+            if previous is not None and self.client.get(path, headers={"If-None-Match": previous}).status_code != 200:
+                self.failures.append(f"{label}: {path} answered 304 to the ETag from before the write")
+            if self.client.get(path, headers={"If-None-Match": etag}).status_code != 304:
+                self.failures.append(f"{label}: {path} did not answer 304 to its current ETag")
+        self.etags[path] = etag
+
+def by_id(rows, row_id):
+    return next((row for row in rows if row["id"] == row_id), None)
+
+def bom_stock(products, material_id):
+    return {line["available"] for product in products for line in product["bom"] if line["materialId"] == material_id}
+
+def alert_quantities(body, material_id):
+    return {alert["current_quantity"] for alert in body["alerts"] if alert["material_id"] == material_id}
+
+def bom_names(products, material_id):
+    return {line["materialName"] for product in products for line in product["bom"] if line["materialId"] == material_id}
+
+def worker_pids(client: httpx.Client, workers: int):
+    """{pid: cache status} from /health/cache, sampled on new connections until every worker answered"""
+    statuses = {}
+    for _ in range(workers * 50):
+        status = client.get("/health/cache").json()
+        statuses[status["pid"]] = status
+        if len(statuses) >= workers:
+            break
+    return statuses
+
+def main_check():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--reads", type=int, default=20, help="reads per list after each write")
+    parser.add_argument("--driver", default="sqlite", help="sqlite or sqlite+aiosqlite (async routes)")
+    args = parser.parse_args()
+
+    engine, _ = make_engine(DB_PATH)
+    populate(engine, materials=200, products=100, bom_per_product=4, orders=2000, queue=100, shortages=50)
+    prepare(engine)
+    engine.dispose()
+    port = free_port()
+    server = start_server(f"{args.driver}:///{DB_PATH}", port, workers=args.workers)
+    # No keep-alive: every request opens a connection, which any worker may accept
+    limits = httpx.Limits(max_keepalive_connections=0)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+            checker = Checker(client, args.reads)
+            for path in (MATERIALS, PRODUCTS, INTEGRATIONS):
+                checker.burst(path, lambda rows: len(rows) > 0, "warm-up")
+            checker.burst(ALERTS, lambda body: "alerts" in body, "warm-up")
+
+            material_id = client.get(PRODUCTS).json()[0]["bom"][0]["materialId"]
+            for round_number in range(args.rounds):
+                label = f"round {round_number + 1}"
+                stock = 10000 + round_number
+                client.put(f"/api/materials/{material_id}", json={"quantity": stock}).raise_for_status()
+                checker.burst(MATERIALS, lambda rows: by_id(rows, material_id)["quantity"] == stock, f"{label} material stock")
+                checker.burst(PRODUCTS, lambda rows: bom_stock(rows, material_id) == {stock}, f"{label} material stock in BOM")
+
+                # A rename leaves can_build alone, so only the BOM invalidation can refresh products
+                material_name = f"Renamed material {round_number}"
+                client.put(f"/api/materials/{material_id}", json={"name": material_name}).raise_for_status()
+                checker.burst(PRODUCTS, lambda rows: bom_names(rows, material_id) == {material_name}, f"{label} material name in BOM")
+
+                # Each worker's alert snapshot must be recomputed after a write on any worker
+                client.put(f"/api/materials/{material_id}", json={"quantity": 0}).raise_for_status()
+                checker.burst(ALERTS, lambda body: alert_quantities(body, material_id) == {0}, f"{label} stock-out alert")
+                client.put(f"/api/materials/{material_id}", json={"quantity": stock}).raise_for_status()
+                checker.burst(ALERTS, lambda body: 0 not in alert_quantities(body, material_id), f"{label} restocked alert")
+
+                price = 100 + round_number
+                client.put("/api/products/1", json={"price": price}).raise_for_status()
+                checker.burst(PRODUCTS, lambda rows: by_id(rows, 1)["price"] == price, f"{label} product price")
+
+                enabled = round_number % 2 == 0
+                client.put("/api/integrations/2", json={"enabled": enabled}).raise_for_status()
+                checker.burst(INTEGRATIONS, lambda rows: by_id(rows, 2)["enabled"] is enabled, f"{label} integration toggle")
+
+                name = f"Coherence fabric {round_number}"
+                client.post("/api/bulk/materials", json=[{"name": name, "color": "Teal", "quantity": 1, "unit": "yards", "required": 1}]).raise_for_status()
+                checker.burst(MATERIALS, lambda rows: any(row["name"] == name for row in rows), f"{label} bulk import")
+
+                new_id = next(row["id"] for row in client.get(MATERIALS).json() if row["name"] == name)
+                client.delete(f"/api/materials/{new_id}").raise_for_status()
+                checker.burst(MATERIALS, lambda rows: by_id(rows, new_id) is None, f"{label} material delete")
+
+            statuses = worker_pids(client, args.workers)
+    finally:
+        server.terminate()
+        server.wait()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(DB_PATH + suffix):
+                os.remove(DB_PATH + suffix)
+
+    print(f"{'worker pid':>10} {'hits':>6} {'misses':>7} {'304s':>6}")
+    for pid, status in sorted(statuses.items()):
+        totals = [sum(dataset[name] for dataset in status["datasets"].values()) for name in ("hits", "misses", "not_modified")]
+        print(f"{pid:>10} {totals[0]:>6} {totals[1]:>7} {totals[2]:>6}")
+    print(f"reads: {checker.results['hit']} cache hits, {checker.results['miss']} misses")
+    failures = checker.failures
+    if len(statuses) < 2:
+        failures.append(f"reads reached {len(statuses)} worker(s); the check needs at least two")
+    if checker.results["hit"] == 0:
+        failures.append("no read was served from the cache")
+    if failures:
+        print("FAIL:\n  " + "\n  ".join(failures[:50]))
+        sys.exit(1)
+    print(f"OK: no stale list or ETag across {len(statuses)} workers")
+
+if __name__ == "__main__":
+    main_check()
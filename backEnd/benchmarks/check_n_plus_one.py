@@ -0,0 +1,107 @@
+"""
+N+1 check over the API with the request profiler: populates a database, calls the list, detail,
+dashboard, analytics, export and AI endpoints and the main writes (material, product and order
+writes, reservations, shortage checks, can-build recalculation, bulk imports) through the full
+middleware stack, then reads the profiler's per-route report. Exits 1 if any route repeated a
+SELECT shape more than QUERY_PROFILER_N_PLUS_ONE_THRESHOLD times in a request, or if the
+Server-Timing header or /metrics are missing.
+
+    python -m benchmarks.check_n_plus_one
+"""
+import os
+import sys
+import tempfile
+
+_handle, DB_PATH = tempfile.mkstemp(prefix="tally-check-", suffix=".db")
+os.close(_handle)
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from fastapi.testclient import TestClient
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate
+from models import OrderQueue
+from services import order_rollups
+
+READS = [
+    "/api/materials/?limit=500", "/api/materials/1", "/api/products/?limit=500", "/api/products/1",
+    "/api/orders/?limit=500", "/api/order-queue/?limit=500", "/api/integrations/",
+    "/api/dashboard/stats", "/api/dashboard/trends", "/api/dashboard/consistency",
+    "/api/analytics/orders", "/api/analytics/products", "/api/export/orders", "/api/export/materials",
+    # No lifespan here, so the alert snapshot is computed inside the first of these requests
+    "/api/ai/alerts", "/api/ai/analysis",
+]
+
+def check_writes(client, queued_id):
+    """(method, path, json) for the writes, in an order where each one finds what it needs"""
+    material = {"name": "Check Fabric", "color": "Teal", "quantity": 100, "unit": "yards", "required": 10}
+    # POST /api/orders/ does not assign an id, so the order goes through the bulk import
+    order = {
+        "id": "CHECK-ORDER-1", "customer": "Check", "email": "check@example.com", "shipping_address": "1 Check St", "total": 0,
+        "items": [{"product_id": product_id, "product_name": f"P{product_id}", "quantity": 1, "price": 10}
+                  for product_id in range(1, 51)],
+    }
+    return [
+        ("POST", "/api/materials/", material),
+        ("PUT", "/api/materials/1", {"quantity": 5000}),
+        ("POST", "/api/products/", {"name": "Check Tee", "sku": "CHECK-1", "color": "Teal", "price": 20}),
+        ("PUT", "/api/products/1", {"price": 21}),
+        ("POST", "/api/bulk/orders", [order]),
+        ("PUT", "/api/orders/CHECK-ORDER-1", {"status": "Shipped"}),
+        ("POST", "/api/order-queue/shortages", {}),
+        ("POST", f"/api/order-queue/{queued_id}/reservation", None),
+        ("DELETE", f"/api/order-queue/{queued_id}/reservation", None),
+        ("POST", "/api/products/recalculate-can-build", None),
+        ("POST", "/api/bulk/materials", [
+            {"name": f"Bulk {index}", "color": "Grey", "quantity": index, "unit": "yards", "required": 5}
+            for index in range(200)
+        ]),
+        ("POST", "/api/bulk/products", [
+            {"name": f"Bulk Tee {index}", "sku": f"BULK-{index}", "color": "Grey", "price": 15,
+             "bom": [{"material_id": 1, "quantity": 1}, {"material_id": 2, "quantity": 2}]}
+            for index in range(200)
+        ]),
+    ]
+
+def main_check():
+    engine, _ = make_engine(DB_PATH)
+    populate(engine, materials=300, products=500, bom_per_product=8, orders=5000, queue=300, shortages=100)
+    session_factory = make_session_factory(engine)
+    with session_factory() as db:
+        order_rollups.rebuild_rollups(db)
+        queued_id = db.query(OrderQueue.id).filter(OrderQueue.status == "Queued").order_by(OrderQueue.id).first()[0]
+    engine.dispose()
+
+    # Imported once the database is populated, so the app's engine opens the finished file
+    import main
+    client = TestClient(main.app)
+    failures = []
+    for path in READS:
+        response = client.get(path)
+        if response.status_code != 200:
+            failures.append(f"GET {path} returned {response.status_code}")
+        if "server-timing" not in response.headers:
+            failures.append(f"GET {path} has no Server-Timing header")
+    for method, path, body in check_writes(client, queued_id):
+        response = client.request(method, path, json=body)
+        if response.status_code >= 400:
+            failures.append(f"{method} {path} returned {response.status_code}: {response.text[:200]}")
+
+    report = client.get("/health/queries").json()
+    exposition = client.get("/metrics").text
+    os.remove(DB_PATH)
+
+    print(f"{'route':<55} {'requests':>8} {'statements':>10} {'slowest ms':>11}  repeated SELECT shapes")
+    for route, stats in report["routes"].items():
+        repeats = ", ".join(f"{count}x" for count in stats["repeated_shapes"].values()) or "-"
+        print(f"{route:<55} {stats['requests']:>8} {stats['max_statements']:>10} {stats['slowest_statement_ms']:>11}  {repeats}")
+        for shape, count in stats["repeated_shapes"].items():
+            failures.append(f"{route}: {count}x {shape[:160]}")
+    if "tally_db_statements_per_request_bucket" not in exposition:
+        failures.append("/metrics has no statements-per-request histogram")
+
+    if failures:
+        print("FAIL:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print(f"OK: no SELECT shape repeated more than {report['n_plus_one_threshold']} times in a request")
+
+if __name__ == "__main__":
+    main_check()
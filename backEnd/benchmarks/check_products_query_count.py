@@ -0,0 +1,56 @@
+"""
+Query-count regression check for GET /api/products/: the number of SQL statements must not
+grow with the page size (no N+1 BOM lookups). Exits non-zero on regression.
+
+    python -m benchmarks.check_products_query_count
+"""
+import os
+import sys
+import tempfile
+
+_handle, DB_PATH = tempfile.mkstemp(prefix="tally-check-", suffix=".db")
+os.close(_handle)
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from fastapi.testclient import TestClient
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate, QueryCounter
+from database import get_db, get_read_db
+import main
+
+MAX_STATEMENTS = 2
+PAGE_SIZES = [1, 10, 100, 1000]
+
+def main_check():
+    engine, _ = make_engine(DB_PATH)
+    populate(engine, materials=200, products=1000, bom_per_product=10, orders=0, queue=0, shortages=0)
+    session_factory = make_session_factory(engine)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    main.app.dependency_overrides[get_db] = override_get_db
+    main.app.dependency_overrides[get_read_db] = override_get_db
+    client = TestClient(main.app)
+    failures = []
+    for page_size in PAGE_SIZES:
+        with QueryCounter(engine) as counter:
+            response = client.get("/api/products/", params={"limit": page_size})
+        assert response.status_code == 200, response.text
+        products = response.json()
+        assert len(products) == page_size
+        assert all(len(product["bom"]) == 10 for product in products)
+        print(f"limit={page_size:<5} statements={counter.count}")
+        if counter.count > MAX_STATEMENTS:
+            failures.append(page_size)
+
+    if failures:
+        print(f"FAIL: more than {MAX_STATEMENTS} statements for page sizes {failures}")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main_check()
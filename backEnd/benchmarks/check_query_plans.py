@@ -0,0 +1,176 @@
+"""
+Query-plan regression check: runs the service queries against a synthetic SQLite database at
+scale, EXPLAIN QUERY PLANs every statement they issue and fails on full table scans.
+
+Each case lists the tables it is allowed to scan in full, with the reason (whole-table
+aggregates and exports read every row by design); any other "SCAN <table>" step without an
+index is a failure. A scan that reads rows in the requested order under a LIMIT (a first page
+ordered by the rowid) stops after the page and is not counted. Exits non-zero on failure.
+
+    python -m benchmarks.check_query_plans
+    python -m benchmarks.check_query_plans --orders 200000 --verbose
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+_handle, DB_PATH = tempfile.mkstemp(prefix="tally-plans-", suffix=".db")
+os.close(_handle)
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy import event
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate
+from schemas import MaterialUpdate, OrderQueueUpdate
+from services import (
+    materials_service, products_service, orders_service, integrations_service, reservations_service,
+    dashboard_counters, dashboard_service, order_rollups, export_service, bulk_service, bom_index
+)
+from models import Base, Order
+
+# "SCAN orders" or "SCAN orders_1" (an alias); "SCAN orders USING INDEX ..." is an index scan
+TABLE_SCAN = re.compile(r"^SCAN (\w+?)(?:_\d+)?$")
+LIMIT = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+EXPLAINED = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+WHOLE_TABLE_AGGREGATE = "whole-table aggregate, only run when rebuilding or checking the counters"
+SMALL_TABLE = "a few dozen rows, all of them needed"
+
+def first_page(statements):
+    """Drain the first chunk of an export generator"""
+    return next(iter(statements), None)
+
+CASES = [
+    # (name, call, {table: reason the full scan is expected})
+    ("materials list", lambda db: materials_service.get_materials(db, limit=100), {}),
+    ("materials list, next page", lambda db: materials_service.get_materials(
+        db, limit=100, cursor=materials_service.get_materials(db, limit=100).next_cursor), {}),
+    ("material by id", lambda db: materials_service.get_material(db, 7), {}),
+    ("material update", lambda db: materials_service.update_material(db, 7, MaterialUpdate(quantity=3)), {}),
+    ("material BOM rows (delete cascade)", lambda db: materials_service.get_material(db, 7).bom_items, {}),
+    ("order queue list", lambda db: materials_service.get_order_queue(db, limit=100), {}),
+    ("order queue status update", lambda db: materials_service.update_order_queue_status(
+        db, "ORD-00000005", OrderQueueUpdate(status="Processing")), {}),
+    ("products with BOM", lambda db: products_service.get_products_with_bom(db, limit=100), {}),
+    ("product by id", lambda db: products_service.get_product(db, 7), {}),
+    ("product order items (delete)", lambda db: products_service.get_product(db, 7).order_items, {}),
+    ("can_build for one product", lambda db: products_service.calculate_can_build(db, 7), {}),
+    ("can_build for a material's products", lambda db: products_service.recalculate_can_build(
+        db, bom_index.bom_index.products_for(db, [7])), {"product_materials": "reverse BOM index load, once per BOM version"}),
+    ("orders list", lambda db: orders_service.get_orders(db, limit=100), {}),
+    ("orders list, next page", lambda db: orders_service.get_orders(
+        db, limit=100, cursor=orders_service.get_orders(db, limit=100).next_cursor), {}),
+    ("order by id", lambda db: orders_service.get_order(db, "ORD-00000042"), {}),
+    ("order shortages", lambda db: orders_service.get_order_shortages(db, "ORD-00000042"), {}),
+    ("shortage check, some orders", lambda db: orders_service.refresh_shortages(
+        db, [f"ORD-{i:08d}" for i in range(1, 50)]), {}),
+    ("shortage check, open queue", lambda db: orders_service.check_shortages_batch(db),
+     {"materials": "the open queue needs most materials; reading them all beats IN-list lookups"}),
+    ("reservations for an order", lambda db: reservations_service.get_reservations(db, "ORD-00000042", "Active"), {}),
+    ("integrations list", lambda db: integrations_service.get_integrations(db), {}),
+    ("integration by name", lambda db: integrations_service.get_integration_by_name(db, "shopify"), {}),
+    ("dashboard stats", lambda db: dashboard_counters.get_dashboard_stats(db), {"dashboard_counters": SMALL_TABLE}),
+    ("daily order series", lambda db: order_rollups.get_order_series(db, days=30, granularity="day"), {}),
+    ("weekly order series", lambda db: order_rollups.get_order_series(db, days=90, granularity="week"), {}),
+    ("hourly order series, one status", lambda db: order_rollups.get_order_series(
+        db, days=7, granularity="hour", status="Shipped"), {}),
+    ("product sales series", lambda db: order_rollups.get_product_series(db, 7, days=365), {}),
+    ("top products", lambda db: order_rollups.get_top_products(db, days=30), {}),
+    ("queue status distribution", lambda db: dashboard_counters.get_queue_status_distribution(db),
+     {"dashboard_counters": SMALL_TABLE}),
+    ("raw stats recompute", lambda db: dashboard_service.compute_raw_stats(db), {
+        "materials": WHOLE_TABLE_AGGREGATE, "products": WHOLE_TABLE_AGGREGATE,
+        "orders": WHOLE_TABLE_AGGREGATE, "order_queue": WHOLE_TABLE_AGGREGATE,
+        "integrations": WHOLE_TABLE_AGGREGATE, "shortages": WHOLE_TABLE_AGGREGATE,
+    }),
+    ("orders export", lambda db: first_page(export_service.export_orders(db, chunk_size=500)), {}),
+    ("materials export", lambda db: first_page(export_service.export_materials(db, chunk_size=500)),
+     {"materials": "exports every row"}),
+    ("bulk import key lookup", lambda db: bulk_service._existing(db, Order.id, [f"ORD-{i:08d}" for i in range(1, 500)]), {}),
+]
+
+class StatementRecorder:
+    """Records the statements executed on an engine while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(EXPLAINED):
+            self.statements.append((statement, parameters[0] if executemany else parameters))
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+        return False
+
+def explain(engine, statement, parameters):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+
+def full_scans(statement, plan):
+    """Tables read in full by a plan: bare SCAN steps, unless a LIMIT stops an ordered scan"""
+    sorted_levels = {parent for _, parent, _, detail in plan if detail.startswith("USE TEMP B-TREE FOR ORDER BY")}
+    limited = bool(LIMIT.search(statement))
+    scans = []
+    for _, parent, _, detail in plan:
+        match = TABLE_SCAN.match(detail)
+        if not match or match.group(1) not in Base.metadata.tables:
+            continue
+        # Rows come out in the requested order, so the LIMIT ends the scan after the page
+        if limited and parent not in sorted_levels:
+            continue
+        scans.append(match.group(1))
+    return scans
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--materials", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--queue", type=int, default=20000)
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    engine, _ = make_engine(DB_PATH)
+    print(f"Populating {DB_PATH} with {args.orders} orders...")
+    populate(engine, materials=args.materials, products=args.products, bom_per_product=5, orders=args.orders,
+             queue=args.queue, shortages=args.orders // 10)
+    session_factory = make_session_factory(engine)
+    with session_factory() as db:
+        dashboard_counters.rebuild_counters(db)
+        order_rollups.rebuild_rollups(db)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+    failures = []
+    for name, call, allowed in CASES:
+        with session_factory() as db, StatementRecorder(engine) as recorder:
+            call(db)
+            db.rollback()
+        scans = []
+        for statement, parameters in recorder.statements:
+            plan = explain(engine, statement, parameters)
+            if args.verbose:
+                print(f"  {' '.join(statement.split())[:160]}")
+                print("".join(f"    {step[3]}\n" for step in plan), end="")
+            scans.extend(table for table in full_scans(statement, plan) if table not in allowed)
+        status = "FAIL" if scans else "ok"
+        print(f"{status:<4} {name:<38} statements={len(recorder.statements):<3} {'full scans: ' + ', '.join(sorted(set(scans))) if scans else ''}")
+        if scans:
+            failures.append(name)
+
+    engine.dispose()
+    os.remove(DB_PATH)
+    if failures:
+        print(f"FAIL: full table scans in {len(failures)} case(s)")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
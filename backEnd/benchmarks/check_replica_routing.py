@@ -0,0 +1,88 @@
+"""
+Read-replica routing check with two SQLite files: the replica starts as a copy of the primary
+and is never written to, so a row created through the API is visible only on the primary.
+
+Reads from a client without the read-your-writes cookie must go to the replica; right after a
+write they must go to the primary until the window expires. Statements are counted per engine.
+Run with an async driver to check the async routes. Exits non-zero on failure.
+
+    python -m benchmarks.check_replica_routing
+    python -m benchmarks.check_replica_routing --driver sqlite+aiosqlite
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--driver", default="sqlite")
+ARGS = parser.parse_args()
+
+WINDOW_SECONDS = 1
+DB_DIR = tempfile.mkdtemp(prefix="tally-replica-check-")
+PRIMARY_PATH = os.path.join(DB_DIR, "primary.db")
+REPLICA_PATH = os.path.join(DB_DIR, "replica.db")
+os.environ["DATABASE_URL"] = f"{ARGS.driver}:///{PRIMARY_PATH}"
+os.environ["DATABASE_REPLICA_URLS"] = f"{ARGS.driver}:///{REPLICA_PATH}"
+os.environ["READ_YOUR_WRITES_SECONDS"] = str(WINDOW_SECONDS)
+
+from fastapi.testclient import TestClient
+from benchmarks.synthetic_data import QueryCounter
+from database import read_session, engine, replica_engines, ASYNC_MODE, async_engine, async_replica_engines, STICKY_COOKIE
+from models import Material
+import main
+
+NAME = "Replica check"
+
+def main_check():
+    # main created the schema on the primary; the replica is a snapshot taken before the write
+    engine.dispose()
+    shutil.copyfile(PRIMARY_PATH, REPLICA_PATH)
+    # Statements are counted on the engines the routes use: the async ones in async mode
+    primary_engine = async_engine.sync_engine if ASYNC_MODE else engine
+    replica_engine = async_replica_engines[0].sync_engine if ASYNC_MODE else replica_engines[0]
+    failures = []
+
+    def read(client, expected):
+        with QueryCounter(primary_engine) as on_primary, QueryCounter(replica_engine) as on_replica:
+            response = client.get("/api/materials/")
+        assert response.status_code == 200, response.text
+        seen = "primary" if any(row["name"] == NAME for row in response.json()) else "replica"
+        counts = f"statements primary={on_primary.count} replica={on_replica.count}"
+        print(f"{'sticky' if client.cookies.get(STICKY_COOKIE) else 'plain':<7} expected={expected:<8} served_by={seen:<8} {counts}")
+        if seen != expected:
+            failures.append(expected)
+
+    with TestClient(main.app) as client:
+        read(client, "replica")
+        response = client.post("/api/materials/", json={"name": NAME, "color": "#000000", "quantity": 5, "unit": "pcs", "required": 1})
+        assert response.status_code == 200, response.text
+        assert client.cookies.get(STICKY_COOKIE), "write did not set the read-your-writes cookie"
+        read(client, "primary")
+        with TestClient(main.app) as other_client:
+            read(other_client, "replica")
+        time.sleep(WINDOW_SECONDS + 0.2)
+        read(client, "replica")
+
+        # Replica sessions refuse writes
+        db = read_session()
+        try:
+            db.add(Material(name="Should fail", color="#000000", unit="pcs"))
+            db.flush()
+            failures.append("read-only")
+            print("FAIL: replica session accepted a write")
+        except RuntimeError:
+            print("replica session rejected a write")
+        finally:
+            db.close()
+
+    shutil.rmtree(DB_DIR, ignore_errors=True)
+    if failures:
+        print(f"FAIL: {len(failures)} check(s) failed")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main_check()
@@ -0,0 +1,144 @@
+"""
+Correctness check for the order rollups: backfills them on a synthetic database, then writes
+through orders_service (create, status update, delete), plain ORM item edits, a rolled-back
+transaction and a bulk import, and compares the rollups with a raw aggregation of orders and
+order items after each step. Also times 12-month series from the rollups against the same
+aggregation over the raw tables. Exits 1 on any mismatch.
+
+    python -m benchmarks.check_rollups --orders 200000
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from sqlalchemy import func
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate, percentile
+from models import Order, OrderItem
+from schemas import BulkOrderCreate, OrderItemCreate, OrderUpdate, BulkImportResult
+from services import orders_service, order_rollups, bulk_service, dashboard_service
+
+def new_order(i, prefix="CHECK"):
+    # OrderCreate has no id field; the bulk schema adds it and is accepted by create_order
+    return BulkOrderCreate(
+        id=f"{prefix}-{i:06d}", order_date=datetime.now(), customer=f"Check {i}", email=f"check{i}@example.com",
+        status="Queued", total=51.98, shipping_address="1 Check St",
+        items=[OrderItemCreate(product_id=1 + i % 7, product_name="Product", quantity=2, price=25.99)]
+    )
+
+def orm_writes(db, count):
+    created = [orders_service.create_order(db, new_order(i)).id for i in range(count)]
+    for order_id in created[::2] + [f"ORD-{i:08d}" for i in range(1, count + 1)]:
+        orders_service.update_order(db, order_id, OrderUpdate(status="Shipped"))
+    for order_id in created[::3] + [f"ORD-{i:08d}" for i in range(count + 1, 2 * count + 1)]:
+        orders_service.delete_order(db, order_id)
+
+def item_edits(db, count):
+    items = db.query(OrderItem).order_by(OrderItem.id.desc()).limit(count).all()
+    for item in items[::2]:
+        item.quantity += 3
+        item.price = 19.99
+    for item in items[1::2]:
+        db.delete(item)
+    db.commit()
+
+def rolled_back(db, count):
+    for i in range(count):
+        db.add(Order(id=f"RB-{i}", customer="Rollback", email="rb@example.com", total=10.0, shipping_address="x",
+                     items=[OrderItem(product_id=1, product_name="Product", quantity=1, price=10.0)]))
+    db.flush()
+    db.rollback()
+
+def bulk_import(db, count):
+    rows = [
+        {**new_order(i, prefix="BULK").model_dump(mode="json"), "order_date": datetime(2025, 1, 1 + i % 28).isoformat()}
+        for i in range(count)
+    ]
+    result = bulk_service.import_chunk(db, "orders", list(enumerate(rows)), BulkImportResult())
+    assert result.inserted == count, result
+
+def raw_order_series(db, days):
+    """The 12-month daily series aggregated straight from the orders table"""
+    first, _ = order_rollups._window(days, "day", None)
+    bucket = dashboard_service.bucket_expression(db, Order.created_at, "day")
+    return {
+        dashboard_service.parse_bucket(day).date().isoformat(): (count, round(revenue, 2))
+        for day, count, revenue in db.query(bucket, func.count(Order.id), func.sum(Order.total))
+        .filter(Order.created_at >= first).group_by(bucket)
+    }
+
+def rollup_order_series(db, days):
+    return {row["date"]: (row["orders"], row["revenue"]) for row in order_rollups.get_order_series(db, days=days) if row["orders"]}
+
+def raw_top_products(db, days):
+    first, _ = order_rollups._window(days, "day", None)
+    units = func.sum(OrderItem.quantity)
+    return [
+        (product_id, int(total))
+        for product_id, total in db.query(OrderItem.product_id, units).join(Order, Order.id == OrderItem.order_id)
+        .filter(Order.created_at >= first).group_by(OrderItem.product_id)
+        .order_by(units.desc(), OrderItem.product_id).limit(20)
+    ]
+
+def rollup_top_products(db, days):
+    return [(row["product_id"], row["units"]) for row in order_rollups.get_top_products(db, days=days, limit=20)]
+
+def timed(fn, session_factory, iterations, days):
+    timings = []
+    for _ in range(iterations):
+        with session_factory() as db:
+            start = time.perf_counter()
+            result = fn(db, days)
+            timings.append((time.perf_counter() - start) * 1000)
+    return result, {"p50_ms": round(percentile(timings, 50), 2), "p95_ms": round(percentile(timings, 95), 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--writes", type=int, default=50, help="orders created, updated and deleted through the ORM")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    engine, path = make_engine()
+    print(f"Populating {path} with {args.orders} orders over 365 days...")
+    populate(engine, materials=50, products=200, orders=args.orders, days=365, queue=0, shortages=0)
+    session_factory = make_session_factory(engine)
+
+    failures = []
+    steps = [
+        ("backfill", lambda db: order_rollups.rebuild_rollups(db)),
+        ("orders_service create/update/delete", lambda db: orm_writes(db, args.writes)),
+        ("order item edits", lambda db: item_edits(db, args.writes)),
+        ("rolled-back transaction", lambda db: rolled_back(db, args.writes)),
+        ("bulk import", lambda db: bulk_import(db, args.writes)),
+    ]
+    for name, step in steps:
+        with session_factory() as db:
+            step(db)
+            report = order_rollups.check_rollups(db, limit=5)
+        print(f"{'ok' if report['consistent'] else 'FAIL':<4} {name:<38} mismatched rows={report['mismatch_count']}")
+        if not report["consistent"]:
+            failures.append(name)
+            for mismatch in report["mismatches"]:
+                print(f"       {mismatch}")
+
+    results, timings = {}, {}
+    for name, fn in (
+        ("raw_order_series", raw_order_series), ("rollup_order_series", rollup_order_series),
+        ("raw_top_products", raw_top_products), ("rollup_top_products", rollup_top_products),
+    ):
+        results[name], timings[name] = timed(fn, session_factory, args.iterations, 365)
+    if results["raw_order_series"] != results["rollup_order_series"]:
+        failures.append("12-month order series")
+    if results["raw_top_products"] != results["rollup_top_products"]:
+        failures.append("12-month top products")
+
+    print(json.dumps({"orders": args.orders, "timings_365_days": timings}, indent=2))
+    engine.dispose()
+    if failures:
+        print(f"FAIL: rollups disagree with the raw data ({', '.join(failures)})")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Load test: the API under uvicorn in sync mode (sqlite://) and async mode (sqlite+aiosqlite://)
+against the same synthetic database, with many concurrent keep-alive clients cycling through a
+set of read endpoints. Reports requests/s and latency percentiles per mode.
+
+    python -m benchmarks.load_test --clients 500 --duration 20
+    python -m benchmarks.load_test --modes postgresql://u:p@localhost/tally postgresql+asyncpg://u:p@localhost/tally
+
+The client runs in this process on one event loop; at high concurrency it can become the
+bottleneck, so compare modes with the same settings on the same machine.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import httpx
+from benchmarks.synthetic_data import make_engine, make_session_factory, populate, percentile
+from services import dashboard_counters, order_rollups
+
+DEFAULT_ENDPOINTS = ["/api/materials/", "/api/orders/?limit=20", "/api/products/?limit=20", "/api/dashboard/stats"]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(database_url: str, port: int, workers: int = 1) -> subprocess.Popen:
+    env = {**os.environ, "DATABASE_URL": database_url}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning", "--no-access-log",
+         "--workers", str(workers)],
+        env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    for _ in range(200):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/health", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f"server for {database_url} did not start")
+
+async def run_load(base_url: str, endpoints, clients: int, duration: float, warmup: float):
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        record_from, stop_at = start + warmup, start + warmup + duration
+
+        async def worker(offset):
+            nonlocal errors
+            i = offset
+            while time.perf_counter() < stop_at:
+                sent = time.perf_counter()
+                try:
+                    ok = (await client.get(endpoints[i % len(endpoints)])).status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                done = time.perf_counter()
+                # Count requests completing inside the measured window, however long they queued
+                if record_from <= done <= stop_at:
+                    if ok:
+                        latencies.append((done - sent) * 1000)
+                    else:
+                        errors += 1
+                i += 1
+
+        await asyncio.gather(*(worker(offset) for offset in range(clients)))
+    return latencies, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds per mode")
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--modes", nargs="+", help="database URLs to compare (default: sync and aiosqlite on a temp file)")
+    parser.add_argument("--endpoints", nargs="+", default=DEFAULT_ENDPOINTS)
+    args = parser.parse_args()
+
+    modes = args.modes
+    if not modes:
+        engine, path = make_engine()
+        print(f"Populating {path} with {args.orders} orders...")
+        populate(engine, materials=200, products=500, bom_per_product=5, orders=args.orders)
+        with make_session_factory(engine)() as db:
+            dashboard_counters.rebuild_counters(db)
+            order_rollups.rebuild_rollups(db)
+        engine.dispose()
+        modes = [f"sqlite:///{path}", f"sqlite+aiosqlite:///{path}"]
+
+    results = []
+    for database_url in modes:
+        port = free_port()
+        server = start_server(database_url, port)
+        try:
+            print(f"Loading {database_url} with {args.clients} clients for {args.duration}s...")
+            latencies, errors = asyncio.run(run_load(f"http://127.0.0.1:{port}", args.endpoints, args.clients, args.duration, args.warmup))
+        finally:
+            server.terminate()
+            server.wait()
+        results.append({
+            "database_url": database_url,
+            "requests": len(latencies),
+            "errors": errors,
+            "requests_per_second": round(len(latencies) / args.duration, 1),
+            "p50_ms": round(percentile(latencies, 50), 1) if latencies else None,
+            "p95_ms": round(percentile(latencies, 95), 1) if latencies else None,
+            "p99_ms": round(percentile(latencies, 99), 1) if latencies else None,
+        })
+
+    print(json.dumps({"clients": args.clients, "endpoints": args.endpoints, "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Local stub of the OpenAI chat completions API, for exercising /api/ai/chat without a key or
+network. Answers are deterministic (they quote the question and the prompt size) after a fixed
+latency, spread over the chunks when streamed ("stream": true). With --fail-every N, every Nth
+call gets a 503 first, to exercise retries. GET /stats reports the calls received, the size of the
+last prompt, and the most calls answered at once.
+
+    python -m benchmarks.stub_llm --port 8100 --latency 0.5
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=stub uvicorn main:app
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import json
+import re
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+def create_app(latency: float, fail_every: int = 0) -> FastAPI:
+    app = FastAPI(title="Stub LLM")
+    stats = {"calls": 0, "failures": 0, "prompt_chars": [], "in_flight": 0, "max_in_flight": 0}
+
+    async def stream_chunks(completion_id: str, model: str, content: str):
+        tokens = re.findall(r"\S+\s*", content)
+        try:
+            for token in tokens:
+                await asyncio.sleep(latency / len(tokens))
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                         "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            done = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            yield f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n"
+        finally:
+            stats["in_flight"] -= 1
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        prompt_chars = sum(len(message.get("content") or "") for message in messages)
+        stats["calls"] += 1
+        if fail_every and stats["calls"] % fail_every == 0:
+            stats["failures"] += 1
+            return JSONResponse({"error": {"message": "stub overloaded", "type": "server_error"}}, status_code=503)
+        stats["prompt_chars"].append(prompt_chars)
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        question = messages[-1]["content"] if messages else ""
+        content = f"Stub answer to {question!r} ({prompt_chars} prompt characters)."
+        completion_id = f"chatcmpl-stub-{stats['calls']}"
+        if body.get("stream"):
+            return StreamingResponse(stream_chunks(completion_id, body.get("model", "stub"), content),
+                                     media_type="text/event-stream")
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            stats["in_flight"] -= 1
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (prompt_chars + len(content)) // 4},
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        prompts = stats["prompt_chars"]
+        return {"calls": stats["calls"], "failures": stats["failures"], "last_prompt_chars": prompts[-1] if prompts else None,
+                "max_prompt_chars": max(prompts, default=None), "max_in_flight": stats["max_in_flight"]}
+
+    return app
+
+def start_stub(port: int, latency: float = 0.5, fail_every: int = 0) -> subprocess.Popen:
+    """Run the stub in a subprocess and wait until it answers"""
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stub_llm", "--port", str(port), "--latency", str(latency),
+         "--fail-every", str(fail_every)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    for _ in range(200):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/stats", timeout=1)
+            return stub
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    stub.kill()
+    raise RuntimeError("stub LLM did not start")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before each answer")
+    parser.add_argument("--fail-every", type=int, default=0, help="answer every Nth call with a 503")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.fail_every), port=args.port, log_level="warning", access_log=False)
+
+if __name__ == "__main__":
+    main()
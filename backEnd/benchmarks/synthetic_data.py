@@ -0,0 +1,172 @@
+"""
+Synthetic data generator for benchmarks - builds a throwaway SQLite database with bulk inserts.
+Run as a script to write a reproducible database (derived tables included) for the API to serve:
+
+    python -m benchmarks.synthetic_data --out bench.db --materials 2000 --products 1000 \
+        --bom-per-product 8 --orders 100000 --items-per-order 3 --days 365
+    DATABASE_URL=sqlite:///bench.db python main.py
+"""
+import argparse
+import json
+import math
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.orm import sessionmaker
+from models import Base, Material, Product, Order, OrderItem, OrderQueue, Integration, Shortage, product_materials
+from services import dashboard_counters, order_rollups
+
+CHUNK_SIZE = 10000
+
+def make_engine(path=None):
+    """Create an engine on a fresh SQLite file (a temp file unless a path is given)"""
+    if path is None:
+        handle, path = tempfile.mkstemp(prefix="tally-bench-", suffix=".db")
+        os.close(handle)
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return engine, path
+
+def make_session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _insert_chunked(conn, table, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        conn.execute(table.insert(), rows[start:start + CHUNK_SIZE])
+
+def populate(engine, materials=50, products=100, bom_per_product=5, orders=10000,
+             items_per_order=2, days=90, queue=1000, shortages=500, seed=42):
+    """Populate the database with reproducible random data using executemany inserts"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    colors = ["red", "black", "white", "blue", "green"]
+
+    with engine.begin() as conn:
+        _insert_chunked(conn, Material.__table__, [
+            {"id": i, "name": f"Material {i}", "color": rng.choice(colors),
+             "quantity": rng.randint(0, 500), "unit": "24 PCS", "required": rng.randint(10, 100),
+             "created_at": now}
+            for i in range(1, materials + 1)
+        ])
+        _insert_chunked(conn, Product.__table__, [
+            {"id": i, "name": f"Product {i}", "sku": f"SKU-{i:07d}", "color": rng.choice(colors),
+             "price": round(rng.uniform(10, 60), 2), "can_build": rng.randint(0, 20), "created_at": now}
+            for i in range(1, products + 1)
+        ])
+        bom_rows = []
+        for product_id in range(1, products + 1):
+            for material_id in rng.sample(range(1, materials + 1), min(bom_per_product, materials)):
+                bom_rows.append({"product_id": product_id, "material_id": material_id, "quantity": rng.randint(1, 3)})
+        _insert_chunked(conn, product_materials, bom_rows)
+
+        order_rows, item_rows = [], []
+        item_id = 1
+        for i in range(1, orders + 1):
+            created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+            order_id = f"ORD-{i:08d}"
+            total = 0.0
+            for _ in range(items_per_order):
+                product_id = rng.randint(1, products)
+                quantity = rng.randint(1, 4)
+                total += quantity * 25.99
+                item_rows.append({"id": item_id, "order_id": order_id, "product_id": product_id,
+                                  "product_name": f"Product {product_id}", "quantity": quantity, "price": 25.99})
+                item_id += 1
+            order_rows.append({"id": order_id, "customer": f"Customer {i}", "email": f"c{i}@example.com",
+                               "status": rng.choice(["Queued", "In Progress", "Shipped"]), "order_date": created_at,
+                               "total": round(total, 2), "shipping_address": "1 Bench St", "created_at": created_at})
+            if len(order_rows) >= CHUNK_SIZE:
+                _insert_chunked(conn, Order.__table__, order_rows)
+                _insert_chunked(conn, OrderItem.__table__, item_rows)
+                order_rows, item_rows = [], []
+        _insert_chunked(conn, Order.__table__, order_rows)
+        _insert_chunked(conn, OrderItem.__table__, item_rows)
+
+        _insert_chunked(conn, OrderQueue.__table__, [
+            {"id": f"ORD-{i:08d}", "customer": f"Customer {i}", "email": f"c{i}@example.com",
+             "status": rng.choice(["Queued", "Processing", "Completed", "Reserved"]),
+             "order_date": now - timedelta(hours=rng.randint(0, 240)), "total": 25.99,
+             "can_fulfill": rng.random() > 0.2, "created_at": now}
+            for i in range(1, min(queue, orders) + 1)
+        ])
+        _insert_chunked(conn, Integration.__table__, [
+            {"id": i, "name": name, "display_name": name.title(), "enabled": i % 2 == 1, "created_at": now}
+            for i, name in enumerate(["email", "shopify", "woocommerce", "slack", "webhooks"], start=1)
+        ])
+        _insert_chunked(conn, Shortage.__table__, [
+            {"id": i, "order_id": f"ORD-{rng.randint(1, max(orders, 1)):08d}", "material_id": rng.randint(1, materials),
+             "material_name": "Material", "needed": 10, "available": 5, "short": rng.choice([0, 5])}
+            for i in range(1, shortages + 1)
+        ])
+
+def prepare(engine):
+    """Rebuild the tables the API derives from the source rows (dashboard counters, order rollups)"""
+    with make_session_factory(engine)() as db:
+        dashboard_counters.rebuild_counters(db)
+        order_rollups.rebuild_rollups(db)
+
+def row_counts(engine):
+    tables = [model.__table__ for model in (Material, Product, Order, OrderItem, OrderQueue, Shortage)] + [product_materials]
+    with make_session_factory(engine)() as db:
+        return {table.name: db.query(func.count()).select_from(table).scalar() for table in tables}
+
+class QueryCounter:
+    """Counts SQL statements executed on an engine while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+        return False
+
+def percentile(samples, pct):
+    """Nearest-rank percentile"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="SQLite file to (re)create")
+    parser.add_argument("--materials", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--bom-per-product", type=int, default=8, help="BOM lines per product (BOM density)")
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--items-per-order", type=int, default=3)
+    parser.add_argument("--days", type=int, default=365, help="days of order history")
+    parser.add_argument("--queue", type=int, default=2000, help="order queue entries")
+    parser.add_argument("--shortages", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    engine, path = make_engine(args.out)
+    start = time.perf_counter()
+    populate(engine, materials=args.materials, products=args.products, bom_per_product=args.bom_per_product,
+             orders=args.orders, items_per_order=args.items_per_order, days=args.days, queue=args.queue,
+             shortages=args.shortages, seed=args.seed)
+    populated = time.perf_counter()
+    prepare(engine)
+    print(json.dumps({
+        "path": path,
+        "rows": row_counts(engine),
+        "populate_seconds": round(populated - start, 1),
+        "derived_tables_seconds": round(time.perf_counter() - populated, 1),
+    }, indent=2))
+    engine.dispose()
+
+if __name__ == "__main__":
+    main()
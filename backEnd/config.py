@@ -4,7 +4,78 @@ from dotenv import load_dotenv
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./tally.db")
+# Read replicas: comma-separated URLs using the same driver as DATABASE_URL (empty: read from the primary)
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Seconds a client keeps reading from the primary after one of its writes (read-your-writes)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+# Connection pool (pool_size + max_overflow should cover the ~40 threads serving sync routes)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "30"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# SQLite connection pragmas
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Server-sent events (/api/events): per-subscriber queue length, keep-alive interval, subscriber cap
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "5000"))
+
+# AI alert snapshots: full recompute interval, and the delay after a relevant write
+ALERTS_REFRESH_SECONDS = float(os.getenv("ALERTS_REFRESH_SECONDS", "60"))
+ALERTS_REFRESH_DEBOUNCE_SECONDS = float(os.getenv("ALERTS_REFRESH_DEBOUNCE_SECONDS", "2"))
+
+# Demand forecasting: days of history, Holt level/trend smoothing and trend damping, supplier lead
+# time, days of demand each reorder covers, and the service level the safety stock is sized for
+FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", "90"))
+FORECAST_ALPHA = float(os.getenv("FORECAST_ALPHA", "0.2"))
+FORECAST_BETA = float(os.getenv("FORECAST_BETA", "0.05"))
+FORECAST_DAMPING = float(os.getenv("FORECAST_DAMPING", "0.9"))
+FORECAST_LEAD_TIME_DAYS = float(os.getenv("FORECAST_LEAD_TIME_DAYS", "7"))
+FORECAST_REVIEW_DAYS = float(os.getenv("FORECAST_REVIEW_DAYS", "30"))
+FORECAST_SERVICE_LEVEL = float(os.getenv("FORECAST_SERVICE_LEVEL", "0.95"))
+
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+# OpenAI-compatible endpoint (empty: api.openai.com) and chat model
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+
+# /api/ai/chat: cached answers per (question, inventory version), and the size of the prompt digest
+AI_CHAT_CACHE_SIZE = int(os.getenv("AI_CHAT_CACHE_SIZE", "256"))
+AI_CHAT_CACHE_TTL_SECONDS = float(os.getenv("AI_CHAT_CACHE_TTL_SECONDS", "600"))
+AI_DIGEST_SHORTAGES = int(os.getenv("AI_DIGEST_SHORTAGES", "10"))
+AI_DIGEST_TOP_K = int(os.getenv("AI_DIGEST_TOP_K", "20"))
+
+# Shared LLM client: completions in flight per process, how long a chat waits for a slot,
+# request timeouts, and retries with jittered exponential backoff
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "30"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8"))
+
+# Per-request SQL profiling (Server-Timing header, /metrics, /health/queries); a SELECT shape
+# repeated more than the threshold in one request is flagged as an N+1 pattern
+QUERY_PROFILER_ENABLED = os.getenv("QUERY_PROFILER_ENABLED", "true").lower() == "true"
+QUERY_PROFILER_N_PLUS_ONE_THRESHOLD = int(os.getenv("QUERY_PROFILER_N_PLUS_ONE_THRESHOLD", "10"))
+
+# Response cache for the materials, products and integrations lists: entries, total body bytes and
+# seconds per entry in each process; with a redis:// URL (needs the redis package) entries are
+# kept in that Redis-compatible server instead, shared by the worker processes
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL", "")
@@ -1,24 +1,300 @@
-from sqlalchemy import create_engine
+import asyncio
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url, URL
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+import config
 from config import DATABASE_URL
 
+# Async drivers and the sync driver used for the same database by scripts and sync routes
+ASYNC_DRIVERS = {"aiosqlite": "pysqlite", "asyncpg": "psycopg2"}
+
+def sync_url(url: URL) -> URL:
+    """The same database through its sync driver"""
+    if url.get_driver_name() in ASYNC_DRIVERS:
+        return url.set(drivername=f"{url.get_backend_name()}+{ASYNC_DRIVERS[url.get_driver_name()]}")
+    return url
+
+database_url = make_url(DATABASE_URL)
+# An async driver in DATABASE_URL (sqlite+aiosqlite://, postgresql+asyncpg://) enables async mode
+ASYNC_MODE = database_url.get_driver_name() in ASYNC_DRIVERS
+sync_database_url = sync_url(database_url)
+replica_urls = [make_url(url) for url in config.DATABASE_REPLICA_URLS]
+
+class PoolMetrics:
+    """Checkout counts and time spent waiting for a free connection, per pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waited = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            # Checkouts over a millisecond waited for a returned connection or opened a new one
+            if seconds >= 0.001:
+                self.waited += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "idle": pool.checkedin(),
+                "checkouts": self.checkouts,
+                "waited": self.waited,
+                "timeouts": self.timeouts,
+                "wait_ms_avg": round(self.wait_seconds_total / attempts * 1000, 3) if attempts else 0.0,
+                "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+            }
+
+class _MeteredPool:
+    """Times every checkout from the pool's queue, including waits for a connection to be returned"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - start)
+        return connection
+
+class MeteredQueuePool(_MeteredPool, QueuePool):
+    pass
+
+class MeteredAsyncAdaptedQueuePool(_MeteredPool, AsyncAdaptedQueuePool):
+    pass
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers proceed during a write; NORMAL sync is durable in WAL except on power loss"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+    # A negative cache_size is in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+def set_sqlite_query_only(dbapi_connection, connection_record):
+    """Replica connections refuse writes in SQLite itself, whatever API issues them"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+def make_engine(url: URL, is_async: bool = False, read_only: bool = False):
+    """Engine with the configured pool; SQLite files also get the connection pragmas.
+    A read-only engine runs read-only transactions (PostgreSQL) or query_only connections (SQLite)"""
+    is_sqlite = url.get_backend_name() == "sqlite"
+    kwargs = {}
+    # In-memory SQLite lives in a single connection; it keeps SQLAlchemy's default pool
+    if not (is_sqlite and url.database in (None, "", ":memory:")):
+        kwargs.update(
+            poolclass=MeteredAsyncAdaptedQueuePool if is_async else MeteredQueuePool,
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+            pool_pre_ping=config.DB_POOL_PRE_PING,
+        )
+    if is_sqlite:
+        kwargs["connect_args"] = {"check_same_thread": False}
+    if read_only and url.get_backend_name() == "postgresql":
+        kwargs["execution_options"] = {"postgresql_readonly": True}
+
+    if is_async:
+        new_engine = create_async_engine(url, **kwargs)
+        sync_engine = new_engine.sync_engine
+    else:
+        new_engine = sync_engine = create_engine(url, **kwargs)
+    if is_sqlite:
+        event.listen(sync_engine, "connect", set_sqlite_pragmas)
+        if read_only:
+            event.listen(sync_engine, "connect", set_sqlite_query_only)
+    return new_engine
+
+def pool_status(target_engine) -> dict:
+    pool = getattr(target_engine, "sync_engine", target_engine).pool
+    metrics = getattr(pool, "metrics", None)
+    if metrics is None:
+        return {"pool": type(pool).__name__}
+    return {"pool": type(pool).__name__, **metrics.snapshot(pool)}
+
+class ReadOnlySession(Session):
+    """Session for read replicas: flushing changes or executing INSERT/UPDATE/DELETE raises instead
+    of writing to a replica; the replica engines also refuse writes at the database level"""
+
+@event.listens_for(ReadOnlySession, "before_flush")
+def _reject_writes(session, flush_context, instances):
+    if session.new or session.dirty or session.deleted:
+        raise RuntimeError("Read replica sessions are read-only")
+
+@event.listens_for(ReadOnlySession, "do_orm_execute")
+def _reject_write_statements(orm_execute_state):
+    # Core insert()/update()/delete() and Query.update()/delete() do not flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        raise RuntimeError("Read replica sessions are read-only")
+
 # Create database engine
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    engine = create_engine(DATABASE_URL)
+engine = make_engine(sync_database_url)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Read replica engines and session factories (empty without DATABASE_REPLICA_URLS)
+replica_engines = [make_engine(sync_url(url), read_only=True) for url in replica_urls]
+ReplicaSessionLocals = [
+    sessionmaker(autocommit=False, autoflush=False, bind=replica_engine, class_=ReadOnlySession)
+    for replica_engine in replica_engines
+]
+
+# Async engine and session factory, only in async mode
+async_engine = make_engine(database_url, is_async=True) if ASYNC_MODE else None
+# Objects stay loaded after commit: lazy loads cannot happen while FastAPI serializes the response
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False) if ASYNC_MODE else None
+async_replica_engines = [make_engine(url, is_async=True, read_only=True) for url in replica_urls] if ASYNC_MODE else []
+AsyncReplicaSessionLocals = [
+    async_sessionmaker(replica_engine, autoflush=False, expire_on_commit=False, sync_session_class=ReadOnlySession)
+    for replica_engine in async_replica_engines
+]
+
 # Create base class for models
 Base = declarative_base()
 
-# Dependency to get database session
-def get_db():
-    db = SessionLocal()
+class SessionSlots:
+    """Caps open request sessions at the pool's capacity, waiting on the event loop.
+
+    A request session keeps its connection until after the response is sent, and the sync
+    route and response serialization need threadpool threads. With more requests in flight
+    than connections, every thread can end up blocked in pool checkout while the sessions
+    holding the connections wait for a thread to finish - until the pool timeout. Requests
+    beyond capacity wait here instead, without holding a thread.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._semaphores = {}
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores = {loop: asyncio.Semaphore(self.capacity)}
+        return self._semaphores[loop]
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self.capacity <= 0:
+            yield
+            return
+        async with self._semaphore():
+            yield
+
+def slots_for(target_engine) -> SessionSlots:
+    """Slots for an engine's pool; unbounded for pools without a fixed size (in-memory SQLite, max_overflow=-1)"""
+    pool = target_engine.pool
+    return SessionSlots(
+        config.DB_POOL_SIZE + config.DB_MAX_OVERFLOW
+        if isinstance(pool, QueuePool) and config.DB_MAX_OVERFLOW >= 0 else 0
+    )
+
+session_slots = slots_for(engine)
+replica_slots = [slots_for(replica_engine) for replica_engine in replica_engines]
+
+# Cookie set after a write; until the time it holds, the client's reads go to the primary
+STICKY_COOKIE = "tally_read_primary_until"
+
+class ReplicaRouter:
+    """Round-robin over the replicas"""
+
+    def __init__(self, count: int):
+        self._lock = threading.Lock()
+        self._indexes = itertools.cycle(range(count)) if count else None
+
+    def next_index(self):
+        if self._indexes is None:
+            return None
+        with self._lock:
+            return next(self._indexes)
+
+replica_router = ReplicaRouter(len(replica_engines))
+
+def wants_primary(request) -> bool:
+    """Whether a client wrote within the last READ_YOUR_WRITES_SECONDS"""
     try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def mark_wrote(response):
+    """Send reads from this client to the primary for the read-your-writes window"""
+    response.set_cookie(
+        STICKY_COOKIE, f"{time.time() + config.READ_YOUR_WRITES_SECONDS:.3f}",
+        max_age=max(1, int(config.READ_YOUR_WRITES_SECONDS) + 1), httponly=True, samesite="lax"
+    )
+
+def read_session():
+    """A session on the next replica (the primary when none is configured), for background reads"""
+    index = replica_router.next_index()
+    return SessionLocal() if index is None else ReplicaSessionLocals[index]()
+
+# Dependency to get database session
+async def get_db():
+    async with session_slots.acquire():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            # The pool's reset-on-return rollback is blocking I/O; keep it off the event loop
+            await run_in_threadpool(db.close)
+
+# Dependency to get a read-only session: a replica, or the primary right after the client wrote
+async def get_read_db(request: Request):
+    index = None if wants_primary(request) else replica_router.next_index()
+    if index is None:
+        slots, session_factory = session_slots, SessionLocal
+    else:
+        slots, session_factory = replica_slots[index], ReplicaSessionLocals[index]
+    async with slots.acquire():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+
+# Dependency to get an async database session (async mode only)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Async counterpart of get_read_db
+async def get_async_read_db(request: Request):
+    index = None if wants_primary(request) else replica_router.next_index()
+    session_factory = AsyncSessionLocal if index is None else AsyncReplicaSessionLocals[index]
+    async with session_factory() as db:
         yield db
-    finally:
-        db.close()
@@ -1,30 +1,64 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 import uvicorn
+import json
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_
-from typing import List
+from typing import Any, Dict, List, Optional
 
-from database import get_db, engine
+from database import (
+    get_db, get_read_db, read_session, mark_wrote, engine, ASYNC_MODE, async_engine, pool_status,
+    replica_engines, async_replica_engines
+)
 from models import Base, Material as MaterialModel, Product as ProductModel, Order as OrderModel, OrderQueue as OrderQueueModel, Integration as IntegrationModel, OrderItem, Shortage
 from schemas import (
     Material, MaterialCreate, MaterialUpdate, 
     Product, ProductCreate, ProductUpdate, 
     Order, OrderCreate, OrderUpdate, 
     OrderQueue, OrderQueueCreate, OrderQueueUpdate,
-    Integration, IntegrationCreate, IntegrationUpdate
+    Integration, IntegrationCreate, IntegrationUpdate,
+    ShortageCheckRequest, ShortageCheckResult, Reservation,
+    BulkImportResult
 )
-from services import materials_service, products_service, orders_service, integrations_service
-from services.ai_service import AIInventoryAssistant
+from services import materials_service, products_service, orders_service, integrations_service, dashboard_service, dashboard_counters, order_rollups, reservations_service, export_service, bulk_service, events, ai_service
+from services.ai_service import chat_cache
+from services.inventory_digest import digest_cache
+from services.alert_snapshots import alert_snapshots
+from services.llm_client import LLMBusy, llm_client
+from services.query_profiler import QueryProfilerMiddleware, metrics
+from services.reservations_service import InsufficientStockError
+from services.response_cache import etag_matches, response_cache
+from services.pagination import InvalidCursorError, set_next_cursor
+import async_routes
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Recompute the AI alert snapshot in the background, on a schedule and after relevant writes
+    alert_snapshots.start()
+    yield
+    await alert_snapshots.stop()
+    await llm_client.aclose()
+    # Close pooled connections (aiosqlite keeps a worker thread per open connection)
+    if ASYNC_MODE:
+        await async_engine.dispose()
+    for async_replica_engine in async_replica_engines:
+        await async_replica_engine.dispose()
+    engine.dispose()
+    for replica_engine in replica_engines:
+        replica_engine.dispose()
+
 app = FastAPI(
     title="Tally Inventory Management API",
     description="Backend API for Tally inventory management system",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -34,8 +68,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link", "ETag"],
 )
 
+# SQL statements, DB time and rows per request: Server-Timing header and /metrics histograms
+app.add_middleware(QueryProfilerMiddleware)
+
+@app.exception_handler(InvalidCursorError)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursorError):
+    return JSONResponse(status_code=400, content={"detail": f"Invalid cursor: {exc}"})
+
+# Read-your-writes: after a successful write, the client's reads go to the primary for a short window
+if replica_engines:
+    @app.middleware("http")
+    async def read_your_writes(request: Request, call_next):
+        response = await call_next(request)
+        if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+            mark_wrote(response)
+        return response
+
+# In async mode these routes take precedence over the sync routes of the same path below
+if ASYNC_MODE:
+    app.include_router(async_routes.router)
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -45,13 +100,56 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/db")
+async def database_health():
+    """Connection pool occupancy and checkout wait times"""
+    pools = {"sync": pool_status(engine)}
+    if ASYNC_MODE:
+        pools["async"] = pool_status(async_engine)
+    for index, replica_engine in enumerate(replica_engines):
+        pools[f"replica_{index}"] = pool_status(replica_engine)
+    for index, async_replica_engine in enumerate(async_replica_engines):
+        pools[f"async_replica_{index}"] = pool_status(async_replica_engine)
+    return {"backend": engine.dialect.name, "pools": pools}
+
+@app.get("/health/events")
+async def events_health():
+    """Open event streams, published events and resyncs sent to lagging subscribers"""
+    return events.broker.status()
+
+@app.get("/health/alerts")
+async def alerts_health():
+    """Version and age of the AI alert snapshot, and how long the last refresh took"""
+    return alert_snapshots.status()
+
+@app.get("/health/ai")
+async def ai_health():
+    """Chat prompt digest version and age, the chat answer cache's hits and misses, and LLM client slots and retries"""
+    return {"digest": digest_cache.status(), "chat_cache": chat_cache.stats(), "llm": llm_client.status()}
+
+@app.get("/health/queries")
+async def queries_health():
+    """Per route: requests, the slowest SQL statement seen, and SELECT shapes repeated like N+1 queries"""
+    return metrics.route_status()
+
+@app.get("/health/cache")
+async def cache_health():
+    """List response cache of this worker process: hits, misses and 304s per dataset, and the store"""
+    return response_cache.status()
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Per-route request and SQL histograms and response cache counters in the Prometheus text format"""
+    return PlainTextResponse(metrics.render() + response_cache.render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Materials endpoints
 @app.get("/api/materials/", response_model=List[Material])
-def get_materials(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return materials_service.get_materials(db, skip=skip, limit=limit)
+def get_materials(request: Request, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_read_db)):
+    return response_cache.respond(request, db, response_cache.MATERIALS, Material,
+                                  lambda: materials_service.get_materials(db, skip=skip, limit=limit, cursor=cursor))
 
 @app.get("/api/materials/{material_id}", response_model=Material)
-def get_material(material_id: int, db: Session = Depends(get_db)):
+def get_material(material_id: int, db: Session = Depends(get_read_db)):
     material = materials_service.get_material(db, material_id)
     if material is None:
         raise HTTPException(status_code=404, detail="Material not found")
@@ -77,8 +175,8 @@ def delete_material(material_id: int, db: Session = Depends(get_db)):
 
 # Order Queue endpoints
 @app.get("/api/order-queue/", response_model=List[OrderQueue])
-def get_order_queue(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return materials_service.get_order_queue(db, skip=skip, limit=limit)
+def get_order_queue(request: Request, response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_read_db)):
+    return set_next_cursor(request, response, materials_service.get_order_queue(db, skip=skip, limit=limit, cursor=cursor))
 
 @app.post("/api/order-queue/", response_model=OrderQueue)
 def create_order_queue_item(order: OrderQueueCreate, db: Session = Depends(get_db)):
@@ -91,13 +189,60 @@ def update_order_queue_status(order_id: str, order_update: OrderQueueUpdate, db:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
 
+@app.post("/api/order-queue/{order_id}/reservation", response_model=List[Reservation])
+def reserve_order(order_id: str, db: Session = Depends(get_db)):
+    """Atomically reserve all materials of an order (Queued -> Reserved)"""
+    try:
+        reservations = reservations_service.reserve_order(db, order_id)
+    except InsufficientStockError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "shortages": e.shortages})
+    if reservations is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return reservations
+
+@app.delete("/api/order-queue/{order_id}/reservation", response_model=List[Reservation])
+def release_order_reservation(order_id: str, db: Session = Depends(get_db)):
+    """Return an order's reserved materials to stock (Reserved -> Queued)"""
+    reservations = reservations_service.release_order(db, order_id)
+    if reservations is None:
+        raise HTTPException(status_code=404, detail="No active reservation for this order")
+    return reservations
+
+@app.post("/api/order-queue/shortages", response_model=ShortageCheckResult)
+def check_queue_shortages(request: ShortageCheckRequest = ShortageCheckRequest(), db: Session = Depends(get_db)):
+    """Recompute and store material shortages for the given orders, or the whole open queue"""
+    checked_ids, shortages = orders_service.refresh_shortages(db, request.order_ids)
+    return {
+        "orders_checked": len(checked_ids),
+        "orders_short": len(shortages),
+        "shortages": [
+            {
+                "order_id": shortage.order_id,
+                "material_id": shortage.material_id,
+                "material_name": shortage.material_name,
+                "needed": shortage.needed,
+                "available": shortage.available,
+                "short": shortage.short
+            }
+            for order_shortages in shortages.values()
+            for shortage in order_shortages
+        ]
+    }
+
 # Products endpoints
 @app.get("/api/products/")
-def get_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return products_service.get_products_with_bom(db, skip=skip, limit=limit)
+def get_products(request: Request, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_read_db)):
+    return response_cache.respond(request, db, response_cache.PRODUCTS, Dict[str, Any],
+                                  lambda: products_service.get_products_with_bom(db, skip=skip, limit=limit, cursor=cursor))
+
+@app.post("/api/products/recalculate-can-build")
+def recalculate_can_build(db: Session = Depends(get_db)):
+    """Refresh can_build for every product from current stock"""
+    updated = products_service.recalculate_all_can_build(db)
+    return {"message": "Buildable quantities recalculated", "updated": updated}
 
 @app.get("/api/products/{product_id}", response_model=Product)
-def get_product(product_id: int, db: Session = Depends(get_db)):
+def get_product(product_id: int, db: Session = Depends(get_read_db)):
     product = products_service.get_product(db, product_id)
     if product is None:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -123,11 +268,11 @@ def delete_product(product_id: int, db: Session = Depends(get_db)):
 
 # Orders endpoints
 @app.get("/api/orders/", response_model=List[Order])
-def get_orders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return orders_service.get_orders(db, skip=skip, limit=limit)
+def get_orders(request: Request, response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_read_db)):
+    return set_next_cursor(request, response, orders_service.get_orders(db, skip=skip, limit=limit, cursor=cursor))
 
 @app.get("/api/orders/{order_id}", response_model=Order)
-def get_order(order_id: str, db: Session = Depends(get_db)):
+def get_order(order_id: str, db: Session = Depends(get_read_db)):
     order = orders_service.get_order(db, order_id)
     if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -153,11 +298,12 @@ def delete_order(order_id: str, db: Session = Depends(get_db)):
 
 # Integrations endpoints
 @app.get("/api/integrations/", response_model=List[Integration])
-def get_integrations(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return integrations_service.get_integrations(db, skip=skip, limit=limit)
+def get_integrations(request: Request, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_read_db)):
+    return response_cache.respond(request, db, response_cache.INTEGRATIONS, Integration,
+                                  lambda: integrations_service.get_integrations(db, skip=skip, limit=limit, cursor=cursor))
 
 @app.get("/api/integrations/{integration_id}", response_model=Integration)
-def get_integration(integration_id: int, db: Session = Depends(get_db)):
+def get_integration(integration_id: int, db: Session = Depends(get_read_db)):
     integration = integrations_service.get_integration(db, integration_id)
     if integration is None:
         raise HTTPException(status_code=404, detail="Integration not found")
@@ -181,168 +327,209 @@ def delete_integration(integration_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Integration not found")
     return {"message": "Integration deleted successfully"}
 
+# Export endpoints
+def stream_export(export, fmt: str, filename: str) -> StreamingResponse:
+    """Stream an export_service generator; it gets its own (replica) session, which outlives the request scope"""
+    if fmt not in export_service.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt} (use {', '.join(export_service.FORMATS)})")
+
+    def chunks():
+        db = read_session()
+        try:
+            yield from export(db, fmt)
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        chunks(),
+        media_type=export_service.FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
+
+@app.get("/api/export/orders")
+def export_orders(format: str = "ndjson"):
+    return stream_export(export_service.export_orders, format, "orders")
+
+@app.get("/api/export/materials")
+def export_materials(format: str = "ndjson"):
+    return stream_export(export_service.export_materials, format, "materials")
+
+# Bulk import endpoints
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+async def run_bulk_import(kind: str, request: Request, db: Session) -> BulkImportResult:
+    """Feed a JSON array body or an NDJSON stream to bulk_service one chunk at a time"""
+    if request.headers.get("content-type", "").split(";")[0].strip() in NDJSON_CONTENT_TYPES:
+        rows = bulk_service.iter_ndjson(request.stream())
+    else:
+        try:
+            rows = bulk_service.parse_json_array(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Body must be a JSON array or NDJSON: {str(e)}")
+
+    result = BulkImportResult()
+    chunk = []
+    index = 0
+    async def flush():
+        await run_in_threadpool(bulk_service.import_chunk, db, kind, chunk, result)
+        chunk.clear()
+
+    if isinstance(rows, list):
+        for index, row in enumerate(rows):
+            chunk.append((index, row))
+            if len(chunk) >= bulk_service.CHUNK_SIZE:
+                await flush()
+    else:
+        async for row in rows:
+            chunk.append((index, row))
+            index += 1
+            if len(chunk) >= bulk_service.CHUNK_SIZE:
+                await flush()
+    if chunk:
+        await flush()
+    return result
+
+@app.post("/api/bulk/materials", response_model=BulkImportResult)
+async def bulk_import_materials(request: Request, db: Session = Depends(get_db)):
+    return await run_bulk_import("materials", request, db)
+
+@app.post("/api/bulk/products", response_model=BulkImportResult)
+async def bulk_import_products(request: Request, db: Session = Depends(get_db)):
+    """Products with an optional `bom` list of {material_id, quantity}"""
+    return await run_bulk_import("products", request, db)
+
+@app.post("/api/bulk/bom", response_model=BulkImportResult)
+async def bulk_import_bom(request: Request, db: Session = Depends(get_db)):
+    """BOM rows {product_id, material_id, quantity} for existing products"""
+    return await run_bulk_import("bom", request, db)
+
+@app.post("/api/bulk/orders", response_model=BulkImportResult)
+async def bulk_import_orders(request: Request, db: Session = Depends(get_db)):
+    """Orders with their `id` and `items`"""
+    return await run_bulk_import("orders", request, db)
+
 # AI Assistant endpoints
-@app.get("/api/ai/alerts")
-def get_smart_alerts(db: Session = Depends(get_db)):
-    """Get AI-powered smart alerts for inventory management"""
+async def snapshot_response(request: Request, name: str, error: str) -> Response:
+    """A body of the current alert snapshot, or 304 if the client already has it"""
     try:
-        ai_assistant = AIInventoryAssistant(db)
-        alerts = ai_assistant.get_smart_alerts()
-        return {"alerts": alerts, "count": len(alerts)}
+        # A version read, or the analysis itself after a write in any worker process
+        snapshot = await run_in_threadpool(alert_snapshots.current)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating alerts: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"{error}: {str(e)}")
+    body, etag = snapshot.bodies[name]
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Snapshot-Version": str(snapshot.version)}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/api/ai/alerts")
+async def get_smart_alerts(request: Request):
+    """Get AI-powered smart alerts for inventory management (from the background-refreshed snapshot)"""
+    return await snapshot_response(request, "alerts", "Error generating alerts")
 
 @app.get("/api/ai/analysis")
-def get_inventory_analysis(db: Session = Depends(get_db)):
-    """Get comprehensive inventory health analysis"""
+async def get_inventory_analysis(request: Request):
+    """Get comprehensive inventory health analysis (from the background-refreshed snapshot)"""
+    return await snapshot_response(request, "analysis", "Error analyzing inventory")
+
+def chat_event(event_type: str, data: dict) -> bytes:
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n".encode()
+
+async def stream_chat(query: str):
+    """SSE: a token event per chunk of the answer, then done (or error)"""
     try:
-        ai_assistant = AIInventoryAssistant(db)
-        analysis = ai_assistant.analyze_inventory_health()
-        return analysis
+        async for token in ai_service.stream_procurement_insights(query):
+            yield chat_event("token", {"token": token})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error analyzing inventory: {str(e)}")
+        yield chat_event("error", {"detail": f"Error processing AI request: {str(e)}"})
+        return
+    yield chat_event("done", {"timestamp": datetime.now().isoformat(), "query": query})
 
 @app.post("/api/ai/chat")
-def chat_with_ai(request: dict, db: Session = Depends(get_db)):
-    """Chat with AI assistant for procurement insights"""
+async def chat_with_ai(request: dict, http_request: Request):
+    """Chat with AI assistant for procurement insights (streamed as SSE with "stream": true or Accept: text/event-stream)"""
+    query = request.get("message", "")
+    if not query:
+        raise HTTPException(status_code=400, detail="Message is required")
+    if request.get("stream") or "text/event-stream" in http_request.headers.get("accept", ""):
+        return StreamingResponse(
+            stream_chat(query),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
     try:
-        query = request.get("message", "")
-        if not query:
-            raise HTTPException(status_code=400, detail="Message is required")
-        
-        ai_assistant = AIInventoryAssistant(db)
-        response = ai_assistant.generate_procurement_insights(query)
-        
-        return {
-            "response": response,
-            "timestamp": datetime.now().isoformat(),
-            "query": query
-        }
+        response = await ai_service.generate_procurement_insights(query)
+    except LLMBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing AI request: {str(e)}")
+        # Not cached, so the question is asked again once the AI service recovers
+        response = f"I apologize, but I'm having trouble accessing the AI service right now. Error: {str(e)}"
+    return {
+        "response": response,
+        "timestamp": datetime.now().isoformat(),
+        "query": query
+    }
+
+# Change events (Server-Sent Events)
+@app.get("/api/events")
+async def stream_events(request: Request):
+    """Stream committed changes (materials, orders, order queue, stock alerts) as they happen"""
+    try:
+        subscriber = events.broker.subscribe(request.headers.get("last-event-id"))
+    except events.TooManySubscribers as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+    return StreamingResponse(
+        events.broker.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # Dashboard endpoints
 @app.get("/api/dashboard/stats")
-def get_dashboard_stats(db: Session = Depends(get_db)):
+def get_dashboard_stats(db: Session = Depends(get_read_db)):
     """Get comprehensive dashboard statistics"""
     try:
-        # Get current date and date ranges
-        now = datetime.now()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_ago = now - timedelta(days=7)
-        month_ago = now - timedelta(days=30)
-        
-        # Material stats
-        total_materials = db.query(MaterialModel).count()
-        low_stock_materials = db.query(MaterialModel).filter(MaterialModel.quantity < MaterialModel.required).count()
-        out_of_stock_materials = db.query(MaterialModel).filter(MaterialModel.quantity == 0).count()
-        
-        # Product stats
-        total_products = db.query(ProductModel).count()
-        products_can_build = db.query(ProductModel).filter(ProductModel.can_build > 0).count()
-        products_cannot_build = db.query(ProductModel).filter(ProductModel.can_build == 0).count()
-        
-        # Order stats
-        total_orders = db.query(OrderModel).count()
-        orders_today = db.query(OrderModel).filter(OrderModel.created_at >= today_start).count()
-        orders_this_week = db.query(OrderModel).filter(OrderModel.created_at >= week_ago).count()
-        orders_this_month = db.query(OrderModel).filter(OrderModel.created_at >= month_ago).count()
-        
-        # Order queue stats
-        queued_orders = db.query(OrderQueueModel).filter(OrderQueueModel.status == "Queued").count()
-        processing_orders = db.query(OrderQueueModel).filter(OrderQueueModel.status == "Processing").count()
-        completed_orders = db.query(OrderQueueModel).filter(OrderQueueModel.status == "Completed").count()
-        blocked_orders = db.query(OrderQueueModel).filter(OrderQueueModel.can_fulfill == False).count()
-        
-        # Revenue stats
-        total_revenue = db.query(func.sum(OrderModel.total)).scalar() or 0
-        revenue_today = db.query(func.sum(OrderModel.total)).filter(OrderModel.created_at >= today_start).scalar() or 0
-        revenue_this_week = db.query(func.sum(OrderModel.total)).filter(OrderModel.created_at >= week_ago).scalar() or 0
-        revenue_this_month = db.query(func.sum(OrderModel.total)).filter(OrderModel.created_at >= month_ago).scalar() or 0
-        
-        # Integration stats
-        total_integrations = db.query(IntegrationModel).count()
-        active_integrations = db.query(IntegrationModel).filter(IntegrationModel.enabled == True).count()
-        
-        # Shortage stats
-        total_shortages = db.query(Shortage).count()
-        critical_shortages = db.query(Shortage).filter(Shortage.short > 0).count()
-        
-        return {
-            "materials": {
-                "total": total_materials,
-                "low_stock": low_stock_materials,
-                "out_of_stock": out_of_stock_materials,
-                "stock_health": round((total_materials - low_stock_materials - out_of_stock_materials) / max(total_materials, 1) * 100, 1)
-            },
-            "products": {
-                "total": total_products,
-                "can_build": products_can_build,
-                "cannot_build": products_cannot_build,
-                "build_rate": round(products_can_build / max(total_products, 1) * 100, 1)
-            },
-            "orders": {
-                "total": total_orders,
-                "today": orders_today,
-                "this_week": orders_this_week,
-                "this_month": orders_this_month
-            },
-            "order_queue": {
-                "queued": queued_orders,
-                "processing": processing_orders,
-                "completed": completed_orders,
-                "blocked": blocked_orders,
-                "fulfillment_rate": round(completed_orders / max(completed_orders + blocked_orders, 1) * 100, 1)
-            },
-            "revenue": {
-                "total": round(total_revenue, 2),
-                "today": round(revenue_today, 2),
-                "this_week": round(revenue_this_week, 2),
-                "this_month": round(revenue_this_month, 2)
-            },
-            "integrations": {
-                "total": total_integrations,
-                "active": active_integrations,
-                "uptime": round(active_integrations / max(total_integrations, 1) * 100, 1)
-            },
-            "shortages": {
-                "total": total_shortages,
-                "critical": critical_shortages,
-                "impact_rate": round(critical_shortages / max(total_shortages, 1) * 100, 1)
-            }
-        }
+        return dashboard_counters.get_dashboard_stats(db)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching dashboard stats: {str(e)}")
 
+@app.get("/api/dashboard/consistency")
+def check_dashboard_consistency(db: Session = Depends(get_read_db)):
+    """Compare the materialized dashboard counters against a full recompute"""
+    try:
+        return dashboard_counters.check_consistency(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error checking dashboard counters: {str(e)}")
+
+@app.post("/api/dashboard/consistency/repair")
+def repair_dashboard_consistency(db: Session = Depends(get_db)):
+    """Rebuild the dashboard counters and order rollups if they disagree with a full recompute"""
+    try:
+        report = dashboard_counters.check_consistency(db)
+        report["repaired"] = False
+        if not report["consistent"]:
+            dashboard_counters.rebuild_counters(db)
+            # The time windows are summed from the hourly order rollups
+            order_rollups.rebuild_rollups(db)
+            report["repaired"] = True
+        return report
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error repairing dashboard counters: {str(e)}")
+
+# Response key of the order series per granularity ("daily_orders" by default)
+TREND_SERIES_KEYS = {"hour": "hourly_orders", "day": "daily_orders", "week": "weekly_orders"}
+
+def _check_granularity(granularity: str):
+    if granularity not in TREND_SERIES_KEYS:
+        raise HTTPException(status_code=400, detail=f"Unsupported granularity: {granularity} (use {', '.join(TREND_SERIES_KEYS)})")
+
 @app.get("/api/dashboard/trends")
-def get_dashboard_trends(db: Session = Depends(get_db)):
+def get_dashboard_trends(days: int = Query(30, ge=1, le=366), granularity: str = "day", db: Session = Depends(get_read_db)):
     """Get trend data for charts"""
+    _check_granularity(granularity)
     try:
-        # Get last 30 days of data
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=30)
-        
-        # Get all orders from the last 30 days
-        recent_orders = db.query(OrderModel).filter(OrderModel.created_at >= start_date).all()
-        
-        # Group orders by date (simplified approach)
-        daily_orders_dict = {}
-        for order in recent_orders:
-            date_str = order.created_at.date().isoformat()
-            if date_str not in daily_orders_dict:
-                daily_orders_dict[date_str] = {"orders": 0, "revenue": 0.0}
-            daily_orders_dict[date_str]["orders"] += 1
-            daily_orders_dict[date_str]["revenue"] += order.total or 0.0
-        
-        # Convert to list format
-        daily_orders = [
-            {
-                "date": date,
-                "orders": data["orders"],
-                "revenue": data["revenue"]
-            }
-            for date, data in sorted(daily_orders_dict.items())
-        ]
+        # Order volume and revenue per bucket over the window, grouped in SQL from the order rollups
+        order_series = order_rollups.get_order_series(db, days=days, granularity=granularity)
         
         # Material stock trends (simplified - showing current vs required)
         material_stock = db.query(
@@ -361,13 +548,10 @@ def get_dashboard_trends(db: Session = Depends(get_db)):
         ).all()
         
         # Order status distribution
-        order_status_dist = db.query(
-            OrderQueueModel.status,
-            func.count(OrderQueueModel.id).label('count')
-        ).group_by(OrderQueueModel.status).all()
+        order_status_dist = dashboard_counters.get_queue_status_distribution(db)
         
         return {
-            "daily_orders": daily_orders,
+            TREND_SERIES_KEYS[granularity]: order_series,
             "material_stock": [
                 {
                     "name": row.name,
@@ -387,16 +571,44 @@ def get_dashboard_trends(db: Session = Depends(get_db)):
                 }
                 for row in product_buildability
             ],
-            "order_status_distribution": [
-                {
-                    "status": row.status,
-                    "count": row.count
-                }
-                for row in order_status_dist
-            ]
+            "order_status_distribution": order_status_dist
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching trend data: {str(e)}")
 
+# Analytics endpoints (served from the order rollups)
+@app.get("/api/analytics/orders")
+def get_order_analytics(days: int = Query(365, ge=1, le=731), granularity: str = "day", status: Optional[str] = None,
+                        db: Session = Depends(get_read_db)):
+    """Orders and revenue per hour/day/week, optionally for one order status"""
+    _check_granularity(granularity)
+    return {
+        "granularity": granularity,
+        "status": status,
+        "series": order_rollups.get_order_series(db, days=days, granularity=granularity, status=status)
+    }
+
+@app.get("/api/analytics/products")
+def get_product_analytics(days: int = Query(30, ge=1, le=731), limit: int = Query(20, ge=1, le=500),
+                          db: Session = Depends(get_read_db)):
+    """Best-selling products by units over the window"""
+    return {"days": days, "products": order_rollups.get_top_products(db, days=days, limit=limit)}
+
+@app.get("/api/analytics/products/{product_id}")
+def get_product_sales(product_id: int, days: int = Query(365, ge=1, le=731), granularity: str = "day",
+                      db: Session = Depends(get_read_db)):
+    """Units, revenue and order lines of one product per hour/day/week"""
+    _check_granularity(granularity)
+    return {
+        "product_id": product_id,
+        "granularity": granularity,
+        "series": order_rollups.get_product_series(db, product_id, days=days, granularity=granularity)
+    }
+
+@app.post("/api/analytics/rebuild")
+def rebuild_analytics(db: Session = Depends(get_db)):
+    """Rebuild the order rollups from orders and order items"""
+    return order_rollups.rebuild_rollups(db)
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8001)
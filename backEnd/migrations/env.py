@@ -0,0 +1,33 @@
+"""
+Alembic environment: migrates the database named by DATABASE_URL (through its sync driver).
+
+Tables are still created by Base.metadata.create_all when the app starts; revisions cover the
+changes create_all does not make to existing tables, such as new indexes.
+"""
+from logging.config import fileConfig
+from alembic import context
+from database import make_engine, sync_database_url
+from models import Base
+
+if context.config.config_file_name is not None:
+    fileConfig(context.config.config_file_name)
+
+def run_migrations_offline():
+    context.configure(url=sync_database_url.render_as_string(hide_password=False), target_metadata=Base.metadata,
+                      literal_binds=True, render_as_batch=sync_database_url.get_backend_name() == "sqlite")
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    engine = make_engine(sync_database_url)
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=Base.metadata,
+                          render_as_batch=connection.dialect.name == "sqlite")
+        with context.begin_transaction():
+            context.run_migrations()
+    engine.dispose()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
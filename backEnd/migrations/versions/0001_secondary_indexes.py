@@ -0,0 +1,57 @@
+"""Secondary indexes for the hot access paths
+
+Adds the indexes declared in models.py to databases whose tables predate them (create_all
+only indexes the tables it creates). Indexes that already exist are skipped, as are tables
+that do not exist yet: create_all builds those with every index when the app starts.
+
+Revision ID: 0001_secondary_indexes
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import context, op
+import sqlalchemy as sa
+from models import OPEN_QUEUE_PREDICATE
+
+revision = "0001_secondary_indexes"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# (name, table, columns, partial index predicate)
+INDEXES = [
+    ("ix_orders_created_at_id", "orders", ["created_at", "id"], None),
+    ("ix_order_items_order_id", "order_items", ["order_id"], None),
+    ("ix_order_items_product_id", "order_items", ["product_id"], None),
+    ("ix_product_materials_material_id", "product_materials", ["material_id"], None),
+    ("ix_shortages_order_id", "shortages", ["order_id"], None),
+    ("ix_order_queue_created_at_id", "order_queue", ["created_at", "id"], None),
+    ("ix_order_queue_open", "order_queue", ["order_date", "id"], OPEN_QUEUE_PREDICATE),
+    ("ix_order_queue_status_can_fulfill", "order_queue", ["status", "can_fulfill"], None),
+]
+
+def _existing_indexes():
+    if context.is_offline_mode():
+        # Generating SQL without a database: emit every index, assume none exists
+        return {table for _, table, _, _ in INDEXES}, set()
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    return tables, {index["name"] for table in tables for index in inspector.get_indexes(table)}
+
+def upgrade():
+    tables, existing = _existing_indexes()
+    for name, table, columns, predicate in INDEXES:
+        if table not in tables or name in existing:
+            continue
+        where = {} if predicate is None else {
+            "sqlite_where": sa.text(predicate), "postgresql_where": sa.text(predicate)
+        }
+        op.create_index(name, table, columns, **where)
+    # Refresh planner statistics for the new indexes
+    if context.get_context().dialect.name == "sqlite":
+        op.execute("ANALYZE")
+
+def downgrade():
+    tables, existing = _existing_indexes()
+    for name, table, _, _ in reversed(INDEXES):
+        if table in tables and name in existing:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,52 @@
+"""Order rollup tables
+
+Creates order_status_rollups and product_sales_rollups on databases that predate them (the app
+also creates them at startup). They start empty: fill them with ``python backfill_rollups.py``.
+
+Revision ID: 0002_order_rollups
+Revises: 0001_secondary_indexes
+Create Date: 2026-10-17
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0002_order_rollups"
+down_revision = "0001_secondary_indexes"
+branch_labels = None
+depends_on = None
+
+def _existing_tables():
+    if context.is_offline_mode():
+        return set()
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+def upgrade():
+    tables = _existing_tables()
+    if "order_status_rollups" not in tables:
+        op.create_table(
+            "order_status_rollups",
+            sa.Column("granularity", sa.String(), primary_key=True),
+            sa.Column("bucket_start", sa.DateTime(), primary_key=True),
+            sa.Column("status", sa.String(), primary_key=True),
+            sa.Column("orders", sa.Integer(), nullable=False),
+            sa.Column("revenue", sa.Float(), nullable=False),
+        )
+    if "product_sales_rollups" not in tables:
+        op.create_table(
+            "product_sales_rollups",
+            sa.Column("granularity", sa.String(), primary_key=True),
+            sa.Column("bucket_start", sa.DateTime(), primary_key=True),
+            sa.Column("product_id", sa.Integer(), primary_key=True),
+            sa.Column("units", sa.Integer(), nullable=False),
+            sa.Column("revenue", sa.Float(), nullable=False),
+            sa.Column("lines", sa.Integer(), nullable=False),
+        )
+        op.create_index("ix_product_sales_rollups_product", "product_sales_rollups", ["product_id", "granularity", "bucket_start"])
+
+def downgrade():
+    tables = _existing_tables()
+    if "product_sales_rollups" in tables:
+        op.drop_index("ix_product_sales_rollups_product", table_name="product_sales_rollups")
+        op.drop_table("product_sales_rollups")
+    if "order_status_rollups" in tables:
+        op.drop_table("order_status_rollups")
@@ -1,16 +1,28 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
 
-# Association table for Product-Material relationships (BOM)
-product_materials = Table(
-    'product_materials',
-    Base.metadata,
-    Column('product_id', Integer, ForeignKey('products.id'), primary_key=True),
-    Column('material_id', Integer, ForeignKey('materials.id'), primary_key=True),
-    Column('quantity', Integer, nullable=False)
-)
+# Queue statuses whose orders no longer compete for stock (reserved stock is already deducted)
+SETTLED_QUEUE_STATUSES = ("Completed", "Reserved")
+# Predicate of the open-queue partial index; SQLite only uses a partial index when the query
+# repeats it with literal values (see orders_service.OPEN_QUEUE)
+OPEN_QUEUE_PREDICATE = "status NOT IN ({})".format(", ".join(f"'{status}'" for status in SETTLED_QUEUE_STATUSES))
+
+# Association object for Product-Material relationships (BOM)
+class ProductMaterial(Base):
+    __tablename__ = "product_materials"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    # Indexed on its own for lookups by material (the primary key leads with product_id)
+    material_id = Column(Integer, ForeignKey("materials.id"), primary_key=True, index=True)
+    quantity = Column(Integer, nullable=False)
+
+    product = relationship("Product", back_populates="bom_items")
+    material = relationship("Material", back_populates="bom_items")
+
+# BOM table, for Core queries and inserts
+product_materials = ProductMaterial.__table__
 
 class Material(Base):
     __tablename__ = "materials"
@@ -24,8 +36,9 @@ class Material(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
-    # Relationship to products through BOM
-    products = relationship("Product", secondary=product_materials, back_populates="materials")
+    # BOM rows using this material, and the products they belong to
+    bom_items = relationship("ProductMaterial", back_populates="material", cascade="all, delete-orphan")
+    products = relationship("Product", secondary=product_materials, back_populates="materials", viewonly=True)
 
 class Product(Base):
     __tablename__ = "products"
@@ -39,8 +52,9 @@ class Product(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
-    # Relationship to materials through BOM
-    materials = relationship("Material", secondary=product_materials, back_populates="products")
+    # BOM rows (material + quantity per unit), and the materials they reference
+    bom_items = relationship("ProductMaterial", back_populates="product", cascade="all, delete-orphan")
+    materials = relationship("Material", secondary=product_materials, back_populates="products", viewonly=True)
     # Relationship to order items
     order_items = relationship("OrderItem", back_populates="product")
 
@@ -64,12 +78,17 @@ class Order(Base):
     # Relationship to shortages
     shortages = relationship("Shortage", back_populates="order")
 
+    __table_args__ = (
+        # Keyset pagination and date-window filters
+        Index("ix_orders_created_at_id", "created_at", "id"),
+    )
+
 class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(String, ForeignKey("orders.id"), nullable=False)
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    order_id = Column(String, ForeignKey("orders.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     product_name = Column(String, nullable=False)
     quantity = Column(Integer, nullable=False)
     price = Column(Float, nullable=False)
@@ -81,7 +100,7 @@ class Shortage(Base):
     __tablename__ = "shortages"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(String, ForeignKey("orders.id"), nullable=False)
+    order_id = Column(String, ForeignKey("orders.id"), nullable=False, index=True)
     material_id = Column(Integer, ForeignKey("materials.id"), nullable=False)
     material_name = Column(String, nullable=False)
     needed = Column(Integer, nullable=False)
@@ -91,6 +110,28 @@ class Shortage(Base):
     order = relationship("Order", back_populates="shortages")
     material = relationship("Material")
 
+class Reservation(Base):
+    __tablename__ = "reservations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(String, ForeignKey("orders.id"), nullable=False, index=True)
+    material_id = Column(Integer, ForeignKey("materials.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    status = Column(String, default="Active")  # Active, Released or Consumed
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    order = relationship("Order")
+    material = relationship("Material")
+
+    __table_args__ = (
+        # At most one active reservation per order line, so concurrent reserves cannot double up
+        Index(
+            "uq_reservations_active_line", "order_id", "material_id", unique=True,
+            sqlite_where=text("status = 'Active'"), postgresql_where=text("status = 'Active'")
+        ),
+    )
+
 class OrderQueue(Base):
     __tablename__ = "order_queue"
 
@@ -106,6 +147,18 @@ class OrderQueue(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        # Keyset pagination
+        Index("ix_order_queue_created_at_id", "created_at", "id"),
+        # Open orders in fulfillment priority, for shortage checks over the whole queue
+        Index(
+            "ix_order_queue_open", "order_date", "id",
+            sqlite_where=text(OPEN_QUEUE_PREDICATE), postgresql_where=text(OPEN_QUEUE_PREDICATE)
+        ),
+        # Per-status counts and the blocked count read this index instead of the table
+        Index("ix_order_queue_status_can_fulfill", "status", "can_fulfill"),
+    )
+
 class Integration(Base):
     __tablename__ = "integrations"
 
@@ -118,3 +171,39 @@ class Integration(Base):
     settings = Column(Text, nullable=True)  # JSON string for additional settings
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+class DashboardCounter(Base):
+    __tablename__ = "dashboard_counters"
+
+    name = Column(String, primary_key=True)
+    value = Column(Float, nullable=False, default=0.0)
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class OrderStatusRollup(Base):
+    __tablename__ = "order_status_rollups"
+
+    granularity = Column(String, primary_key=True)  # "hour" or "day"
+    bucket_start = Column(DateTime, primary_key=True)
+    status = Column(String, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+class ProductSalesRollup(Base):
+    __tablename__ = "product_sales_rollups"
+
+    granularity = Column(String, primary_key=True)  # "hour" or "day"
+    bucket_start = Column(DateTime, primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+    lines = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # One product's series
+        Index("ix_product_sales_rollups_product", "product_id", "granularity", "bucket_start"),
+    )
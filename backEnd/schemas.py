@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -147,6 +147,27 @@ class Shortage(ShortageBase):
     class Config:
         from_attributes = True
 
+class ShortageCheckRequest(BaseModel):
+    order_ids: Optional[List[str]] = None
+
+class ShortageCheckResult(BaseModel):
+    orders_checked: int
+    orders_short: int
+    shortages: List[ShortageCreate]
+
+# Reservation Schemas
+class Reservation(BaseModel):
+    id: int
+    order_id: str
+    material_id: int
+    quantity: int
+    status: str
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # Integration Schemas
 class IntegrationBase(BaseModel):
     name: str
@@ -172,3 +193,28 @@ class Integration(IntegrationBase):
 
     class Config:
         from_attributes = True
+
+# Bulk Import Schemas
+class BOMLineCreate(BaseModel):
+    material_id: int
+    quantity: int = Field(gt=0)
+
+class BOMRowCreate(BOMLineCreate):
+    product_id: int
+
+class BulkProductCreate(ProductCreate):
+    bom: List[BOMLineCreate] = []
+
+class BulkOrderCreate(OrderCreate):
+    id: str
+    order_date: Optional[datetime] = None
+
+class BulkRowError(BaseModel):
+    index: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    received: int = 0
+    inserted: int = 0
+    failed: int = 0
+    errors: List[BulkRowError] = []
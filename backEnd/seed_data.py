@@ -5,6 +5,9 @@ from sqlalchemy.orm import Session
 from database import SessionLocal, engine
 from models import Base, Material, Product, Order, OrderItem, OrderQueue, Integration, Shortage, product_materials
 from datetime import datetime, timedelta
+from services import dashboard_counters, data_versions, order_rollups, response_cache
+# Bumps the inventory version from flush events, so running servers rebuild the AI chat digest
+from services import inventory_digest
 
 # Create all tables
 Base.metadata.create_all(bind=engine)
@@ -73,6 +76,8 @@ def seed_database():
         db.execute(product_materials.insert().values(product_id=3, material_id=6, quantity=1))
         db.execute(product_materials.insert().values(product_id=3, material_id=9, quantity=1))
         
+        # Core inserts bypass the reverse BOM index; a version bump makes it reload
+        data_versions.bump_version(db.connection(), data_versions.BOM)
         db.commit()
         
         # Seed Order Queue
@@ -173,8 +178,14 @@ def seed_database():
             integration = Integration(**integration_data)
             db.add(integration)
         
+        # The bulk deletes and Core BOM inserts above bypass the service functions; running servers re-render their lists
+        response_cache.invalidate(db, *response_cache.DATASETS)
         db.commit()
         
+        # Bulk deletes above bypass the dashboard counters and rollups, so rebuild them from scratch
+        dashboard_counters.rebuild_counters(db)
+        order_rollups.rebuild_rollups(db)
+        
         print("✅ Database seeded successfully!")
         print(f"📦 Created {len(materials)} materials")
         print(f"🛍️ Created {len(products)} products")
@@ -1,24 +1,28 @@
-import openai
-import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, AsyncIterator
 from sqlalchemy.orm import Session
-from models import Material, Order, OrderQueue, Product
-from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from config import FORECAST_LEAD_TIME_DAYS, FORECAST_REVIEW_DAYS, AI_CHAT_CACHE_SIZE, AI_CHAT_CACHE_TTL_SECONDS
+from database import SessionLocal, session_slots
+from models import Material
+from services import forecasting
+from services.inventory_digest import Digest, digest_cache, normalize_query
+from services.llm_client import llm_client
+from services.ttl_cache import TTLCache
+from datetime import datetime
 import json
 
-# Initialize OpenAI client
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Chat answers per (normalized question, inventory digest version)
+chat_cache = TTLCache(AI_CHAT_CACHE_SIZE, AI_CHAT_CACHE_TTL_SECONDS)
 
 class AIInventoryAssistant:
     def __init__(self, db: Session):
         self.db = db
-        self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     
     def analyze_inventory_health(self) -> Dict[str, Any]:
         """Analyze current inventory and generate smart alerts"""
         materials = self.db.query(Material).all()
-        orders = self.db.query(Order).all()
-        order_queue = self.db.query(OrderQueue).all()
+        # Demand forecast, days of cover and reorder figures for every material at once
+        forecasts = forecasting.forecast_materials(self.db, materials)
         
         # Calculate inventory health metrics
         low_stock_items = []
@@ -26,13 +30,14 @@ class AIInventoryAssistant:
         reorder_recommendations = []
         
         for material in materials:
-            # Calculate days of stock remaining based on recent order patterns
-            days_remaining = self._calculate_days_remaining(material, orders, order_queue)
+            plan = forecasts[material.id]
+            days_remaining = plan["days_of_cover"]
             
             if days_remaining <= 7:  # Critical: less than 1 week
                 critical_stock_items.append({
                     "material": material,
                     "days_remaining": days_remaining,
+                    "daily_demand": plan["daily_demand"],
                     "urgency": "CRITICAL",
                     "recommended_action": f"Order immediately - will run out in {days_remaining} days"
                 })
@@ -40,19 +45,28 @@ class AIInventoryAssistant:
                 low_stock_items.append({
                     "material": material,
                     "days_remaining": days_remaining,
+                    "daily_demand": plan["daily_demand"],
                     "urgency": "LOW",
                     "recommended_action": f"Order soon - will run out in {days_remaining} days"
                 })
             
-            # Generate reorder recommendations
-            if days_remaining <= 21:  # Reorder point: 3 weeks
-                recommended_quantity = self._calculate_reorder_quantity(material, orders)
+            # Generate reorder recommendations: 3 weeks of cover left, or at the reorder point
+            if days_remaining <= 21 or (material.quantity or 0) <= plan["reorder_point"]:
+                recommended_quantity = plan["reorder_quantity"]
                 reorder_recommendations.append({
                     "material": material,
                     "current_stock": material.quantity,
                     "recommended_quantity": recommended_quantity,
                     "days_remaining": days_remaining,
-                    "reasoning": f"Based on consumption rate, order {recommended_quantity} units to maintain 30-day buffer"
+                    "daily_demand": plan["daily_demand"],
+                    "safety_stock": plan["safety_stock"],
+                    "reorder_point": plan["reorder_point"],
+                    "reasoning": (
+                        f"Forecast demand is {plan['daily_demand']} units/day; order {recommended_quantity} units to cover "
+                        f"{FORECAST_LEAD_TIME_DAYS + FORECAST_REVIEW_DAYS:g} days with {plan['safety_stock']} units of safety stock"
+                        if plan["daily_demand"] > 0 else
+                        f"No recent demand, but stock is at or below the minimum of {material.required}; order {recommended_quantity} units"
+                    )
                 })
         
         return {
@@ -63,107 +77,10 @@ class AIInventoryAssistant:
             "analysis_timestamp": datetime.now().isoformat()
         }
     
-    def _calculate_days_remaining(self, material: Material, orders: List[Order], order_queue: List[OrderQueue]) -> int:
-        """Calculate how many days of stock remain based on consumption patterns"""
-        # Get recent consumption (last 30 days)
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        
-        # Calculate average daily consumption from recent orders
-        total_consumption = 0
-        for order in orders:
-            if order.order_date >= thirty_days_ago:
-                # Estimate consumption based on order items
-                # This is simplified - in real app, you'd track actual material usage
-                total_consumption += len(order.items) * 2  # Assume 2 units per order item
-        
-        # Add pending orders from order queue
-        for pending_order in order_queue:
-            if pending_order.order_date >= thirty_days_ago:
-                total_consumption += 2  # Assume 2 units per pending order
-        
-        # Calculate daily average
-        daily_consumption = total_consumption / 30 if total_consumption > 0 else 1
-        
-        # Calculate days remaining
-        if daily_consumption > 0:
-            days_remaining = material.quantity / daily_consumption
-            return int(days_remaining)
-        else:
-            return 999  # No consumption, plenty of stock
-    
-    def _calculate_reorder_quantity(self, material: Material, orders: List[Order]) -> int:
-        """Calculate recommended reorder quantity"""
-        # Simple reorder logic: maintain 30-day buffer
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        
-        total_consumption = 0
-        for order in orders:
-            if order.order_date >= thirty_days_ago:
-                total_consumption += len(order.items) * 2
-        
-        daily_consumption = total_consumption / 30 if total_consumption > 0 else 1
-        recommended_quantity = int(daily_consumption * 30)  # 30-day supply
-        
-        return max(recommended_quantity, material.required)  # At least meet minimum requirement
-    
-    def generate_procurement_insights(self, query: str) -> str:
-        """Generate AI-powered insights based on user query"""
-        try:
-            # Get current inventory data
-            materials = self.db.query(Material).all()
-            orders = self.db.query(Order).all()
-            products = self.db.query(Product).all()
-            
-            # Create context for AI
-            inventory_context = {
-                "materials": [
-                    {
-                        "name": m.name,
-                        "quantity": m.quantity,
-                        "unit": m.unit,
-                        "required": m.required,
-                        "color": m.color
-                    } for m in materials
-                ],
-                "recent_orders": len([o for o in orders if o.order_date >= datetime.now() - timedelta(days=30)]),
-                "total_products": len(products),
-                "analysis_date": datetime.now().isoformat()
-            }
-            
-            # Create AI prompt
-            system_prompt = """You are an AI procurement assistant for a T-shirt manufacturing business. 
-            You help with inventory management, demand forecasting, and procurement decisions.
-            
-            Current inventory data:
-            """ + json.dumps(inventory_context, indent=2) + """
-            
-            Provide helpful, actionable insights based on the user's question. Focus on:
-            - Inventory optimization
-            - Demand forecasting
-            - Cost reduction opportunities
-            - Risk mitigation
-            - Business continuity planning
-            
-            Be specific and data-driven in your recommendations."""
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": query}
-                ],
-                max_tokens=200,
-                temperature=0.7
-            )
-            
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            return f"I apologize, but I'm having trouble accessing the AI service right now. Error: {str(e)}"
-    
-    def get_smart_alerts(self) -> List[Dict[str, Any]]:
-        """Get prioritized smart alerts for the dashboard"""
-        analysis = self.analyze_inventory_health()
+    def get_smart_alerts(self, analysis: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Get prioritized smart alerts for the dashboard (from a given analysis, or a fresh one)"""
+        if analysis is None:
+            analysis = self.analyze_inventory_health()
         alerts = []
         
         # Critical alerts (highest priority)
@@ -214,3 +131,59 @@ class AIInventoryAssistant:
         # Sort by priority
         alerts.sort(key=lambda x: x['priority'])
         return alerts
+
+async def current_digest() -> Digest:
+    """The inventory digest, looked up in a short-lived session (none is held while the LLM answers)"""
+    def lookup():
+        with SessionLocal() as db:
+            return digest_cache.get(db)
+    async with session_slots.acquire():
+        return await run_in_threadpool(lookup)
+
+def chat_messages(digest: Digest, query: str) -> List[Dict[str, str]]:
+    """Prompt for a procurement question about the current inventory"""
+    system_prompt = """You are an AI procurement assistant for a T-shirt manufacturing business. 
+    You help with inventory management, demand forecasting, and procurement decisions.
+    
+    Current inventory data (summary, materials closest to running out, materials relevant to the question):
+    """ + json.dumps(digest.context_for(query), separators=(",", ":")) + """
+    
+    Provide helpful, actionable insights based on the user's question. Focus on:
+    - Inventory optimization
+    - Demand forecasting
+    - Cost reduction opportunities
+    - Risk mitigation
+    - Business continuity planning
+    
+    Be specific and data-driven in your recommendations."""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": query}
+    ]
+
+CHAT_PARAMS = {"max_tokens": 200, "temperature": 0.7}
+
+async def generate_procurement_insights(query: str) -> str:
+    """Generate AI-powered insights based on user query"""
+    digest = await current_digest()
+    cache_key = (normalize_query(query), digest.version)
+    cached = chat_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    answer = await llm_client.complete(chat_messages(digest, query), **CHAT_PARAMS)
+    chat_cache.set(cache_key, answer)
+    return answer
+
+async def stream_procurement_insights(query: str) -> AsyncIterator[str]:
+    """Tokens of the answer as the LLM produces them (all at once when cached); the full answer is cached"""
+    digest = await current_digest()
+    cache_key = (normalize_query(query), digest.version)
+    cached = chat_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+    tokens = []
+    async for token in llm_client.stream(chat_messages(digest, query), **CHAT_PARAMS):
+        tokens.append(token)
+        yield token
+    chat_cache.set(cache_key, "".join(tokens))
@@ -0,0 +1,194 @@
+"""
+Precomputed snapshot of the inventory analysis behind /api/ai/alerts and /api/ai/analysis.
+
+A background task started in the app lifespan recomputes the analysis every
+``ALERTS_REFRESH_SECONDS``, and shortly after this process's committed writes that can change it
+(as reported by the change-event broker), so requests only serve a prebuilt body. Each snapshot
+also records the ``inventory`` and ``bom`` data versions it was computed from, which material,
+product, BOM, order and queue writes bump in their own transaction: a request that finds a newer
+version, after a write in any worker process, recomputes first. Each body carries a hash of its
+content as ETag; the snapshot version increases only when the content changes, and clients
+revalidating with If-None-Match get 304.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from config import ALERTS_REFRESH_SECONDS, ALERTS_REFRESH_DEBOUNCE_SECONDS
+from database import SessionLocal
+from services import data_versions, events
+from services.ai_service import AIInventoryAssistant
+
+# Writes that can change the analysis
+REFRESH_EVENTS = {
+    events.MATERIAL_CHANGED, events.MATERIAL_DELETED, events.MATERIALS_IMPORTED,
+    events.ORDER_CREATED, events.ORDERS_IMPORTED, events.QUEUE_CHANGED,
+}
+# Data versions the analysis depends on: materials, products, orders and the queue, and the BOM
+DATA_VERSIONS = (data_versions.INVENTORY, data_versions.BOM)
+# Computation times, left out of the content hash
+VOLATILE_KEYS = {"timestamp", "analysis_timestamp"}
+
+def _material(material) -> Dict[str, Any]:
+    return {
+        "id": material.id, "name": material.name, "color": material.color,
+        "quantity": material.quantity, "unit": material.unit, "required": material.required,
+    }
+
+def _serialize_analysis(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """The analysis with its Material objects as plain dicts"""
+    return {
+        key: [{**item, "material": _material(item["material"])} for item in value] if isinstance(value, list) else value
+        for key, value in analysis.items()
+    }
+
+def _without_volatile(value):
+    if isinstance(value, dict):
+        return {key: _without_volatile(item) for key, item in value.items() if key not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_without_volatile(item) for item in value]
+    return value
+
+def _fingerprint(content: Any) -> str:
+    encoded = json.dumps(_without_volatile(content), sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+class Snapshot:
+    """Encoded response bodies of one analysis run: {name: (body, etag)}"""
+
+    def __init__(self, version: int, computed_at: datetime, fingerprints: Dict[str, str],
+                 bodies: Dict[str, Tuple[bytes, str]], count: int, data_version: Tuple[int, ...]):
+        self.version = version
+        self.data_version = data_version
+        self.computed_at = computed_at
+        self.fingerprints = fingerprints
+        self.bodies = bodies
+        self.count = count
+
+class AlertSnapshots:
+    def __init__(self, interval: float = ALERTS_REFRESH_SECONDS, debounce: float = ALERTS_REFRESH_DEBOUNCE_SECONDS):
+        self.interval = interval
+        self.debounce = debounce
+        self.snapshot: Optional[Snapshot] = None
+        self.refreshes = 0
+        self.last_duration_ms = None
+        self.last_error = None
+        # One computation at a time, from the background task or a first request
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stale: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def compute(self, unless_at: Optional[Tuple[int, ...]] = None) -> Snapshot:
+        """Run the analysis and install a new snapshot if its content changed (blocking); with
+        unless_at, keep a snapshot that another thread computed at those data versions meanwhile"""
+        with self._lock:
+            if unless_at is not None and self.snapshot is not None and self.snapshot.data_version == unless_at:
+                return self.snapshot
+            started = datetime.now()
+            db = SessionLocal()
+            try:
+                # Read first: the analysis below sees these writes at least
+                data_version = data_versions.get_versions(db, DATA_VERSIONS)
+                assistant = AIInventoryAssistant(db)
+                analysis = assistant.analyze_inventory_health()
+                alerts = assistant.get_smart_alerts(analysis)
+                analysis = _serialize_analysis(analysis)
+            finally:
+                db.close()
+            self.refreshes += 1
+            self.last_duration_ms = round((datetime.now() - started).total_seconds() * 1000, 1)
+
+            fingerprints = {"alerts": _fingerprint(alerts), "analysis": _fingerprint(analysis)}
+            previous = self.snapshot
+            if previous is not None and previous.fingerprints == fingerprints:
+                previous.data_version = data_version
+                return previous
+            version = (previous.version if previous else 0) + 1
+            contents = {
+                "alerts": {"alerts": alerts, "count": len(alerts), "version": version, "computed_at": started.isoformat()},
+                "analysis": {**analysis, "version": version, "computed_at": started.isoformat()},
+            }
+            bodies = {
+                name: (json.dumps(content, default=str).encode(), f'"{fingerprints[name]}"')
+                for name, content in contents.items()
+            }
+            self.snapshot = Snapshot(version, started, fingerprints, bodies, len(alerts), data_version)
+        events.broker.publish([(events.ALERTS_UPDATED, {
+            "version": version, "count": len(alerts), "etag": bodies["alerts"][1]
+        })])
+        return self.snapshot
+
+    def current(self) -> Snapshot:
+        """The latest snapshot; computed now if there is none yet, no background refresh runs, or
+        a write committed since changed the data versions it was computed from (blocking)"""
+        snapshot = self.snapshot
+        if snapshot is None or self._task is None:
+            return self.compute()
+        with SessionLocal() as db:
+            data_version = data_versions.get_versions(db, DATA_VERSIONS)
+        if data_version == snapshot.data_version:
+            return snapshot
+        try:
+            return self.compute(unless_at=data_version)
+        except Exception as e:
+            # As in the background task: keep serving the previous snapshot
+            self.last_error = f"{type(e).__name__}: {e}"
+            return snapshot
+
+    def mark_stale(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        """Change-event listener: schedule a refresh after relevant writes (any thread)"""
+        if self._loop is None or not any(event_type in REFRESH_EVENTS for event_type, _ in batch):
+            return
+        self._loop.call_soon_threadsafe(self._stale.set)
+
+    async def _run(self):
+        while True:
+            try:
+                await run_in_threadpool(self.compute)
+                self.last_error = None
+            except Exception as e:
+                # Keep serving the previous snapshot
+                self.last_error = f"{type(e).__name__}: {e}"
+            try:
+                await asyncio.wait_for(self._stale.wait(), self.interval)
+                # Let a burst of writes settle into one refresh
+                await asyncio.sleep(self.debounce)
+            except asyncio.TimeoutError:
+                pass
+            self._stale.clear()
+
+    def start(self):
+        """Start the refresh task on the running loop (app startup)"""
+        self._loop = asyncio.get_running_loop()
+        self._stale = asyncio.Event()
+        events.broker.listeners.append(self.mark_stale)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.mark_stale in events.broker.listeners:
+            events.broker.listeners.remove(self.mark_stale)
+        self._loop = self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "computed_at": snapshot.computed_at.isoformat() if snapshot else None,
+            "alerts": snapshot.count if snapshot else None,
+            "refreshes": self.refreshes,
+            "last_duration_ms": self.last_duration_ms,
+            "last_error": self.last_error,
+            "background": self._task is not None,
+        }
+
+alert_snapshots = AlertSnapshots()
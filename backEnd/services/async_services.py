@@ -0,0 +1,77 @@
+"""
+Async versions of the service functions, for routes running on an AsyncSession.
+
+Each one runs the sync implementation through ``AsyncSession.run_sync``: the ORM code executes
+in a greenlet on the async driver (aiosqlite, asyncpg), so the event loop is never blocked
+and no threadpool thread is held while the database works. Results are converted to their
+response schema inside the greenlet too, since lazy loads are only possible there; the
+dashboard counter and BOM Session events fire exactly as on the sync path.
+"""
+from typing import Any, Callable, Optional, Type
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+from starlette.responses import Response
+from schemas import Material, Product, Order, OrderQueue, Integration
+from services import materials_service, products_service, orders_service, integrations_service, dashboard_counters
+from services.response_cache import response_cache
+from services.pagination import Page
+
+def _to_schema(result: Any, schema: Optional[Type[BaseModel]]) -> Any:
+    if schema is None or result is None or isinstance(result, bool):
+        return result
+    if isinstance(result, Page):
+        return Page([schema.model_validate(row) for row in result], result.next_cursor)
+    if isinstance(result, list):
+        return [schema.model_validate(row) for row in result]
+    return schema.model_validate(result)
+
+def run_async(function: Callable, schema: Optional[Type[BaseModel]] = None) -> Callable:
+    """Async version of a sync service function taking the Session first"""
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(lambda session: _to_schema(function(session, *args, **kwargs), schema))
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+async def cached_list(request: Request, db: AsyncSession, dataset: str, schema: Any, function: Callable, **params) -> Response:
+    """response_cache.respond for a sync list function; the version lookup and a miss's query run in the greenlet"""
+    return await db.run_sync(
+        lambda session: response_cache.respond(request, session, dataset, schema, lambda: function(session, **params))
+    )
+
+# Materials
+get_materials = run_async(materials_service.get_materials, Material)
+get_material = run_async(materials_service.get_material, Material)
+create_material = run_async(materials_service.create_material, Material)
+update_material = run_async(materials_service.update_material, Material)
+delete_material = run_async(materials_service.delete_material)
+
+# Order queue
+get_order_queue = run_async(materials_service.get_order_queue, OrderQueue)
+create_order_queue_item = run_async(materials_service.create_order_queue_item, OrderQueue)
+update_order_queue_status = run_async(materials_service.update_order_queue_status, OrderQueue)
+
+# Products
+get_products_with_bom = run_async(products_service.get_products_with_bom)
+get_product = run_async(products_service.get_product, Product)
+create_product = run_async(products_service.create_product, Product)
+update_product = run_async(products_service.update_product, Product)
+delete_product = run_async(products_service.delete_product)
+
+# Orders
+get_orders = run_async(orders_service.get_orders, Order)
+get_order = run_async(orders_service.get_order, Order)
+create_order = run_async(orders_service.create_order, Order)
+update_order = run_async(orders_service.update_order, Order)
+delete_order = run_async(orders_service.delete_order)
+
+# Integrations
+get_integrations = run_async(integrations_service.get_integrations, Integration)
+get_integration = run_async(integrations_service.get_integration, Integration)
+create_integration = run_async(integrations_service.create_integration, Integration)
+update_integration = run_async(integrations_service.update_integration, Integration)
+delete_integration = run_async(integrations_service.delete_integration)
+
+# Dashboard
+get_dashboard_stats = run_async(dashboard_counters.get_dashboard_stats)
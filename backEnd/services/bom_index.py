@@ -0,0 +1,96 @@
+"""
+In-memory reverse BOM index: material_id -> ids of the products whose BOM uses it.
+
+The index is built lazily from ``product_materials`` and kept current from Session events:
+BOM rows added or removed through the ORM are applied after commit. Every BOM flush also bumps
+the ``bom`` data version in the same transaction, so a lookup that finds a version it did not
+produce (a write from another process, or a Core bulk insert) reloads the index.
+"""
+import threading
+from collections import defaultdict
+from typing import Iterable, Set
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session
+from models import ProductMaterial
+from services import data_versions
+
+class ReverseBOMIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._products_by_material = None
+        self._version = None
+
+    def _load(self, db: Session, version: int):
+        index = defaultdict(set)
+        for material_id, product_id in db.query(ProductMaterial.material_id, ProductMaterial.product_id):
+            index[material_id].add(product_id)
+        self._products_by_material = index
+        self._version = version
+
+    def products_for(self, db: Session, material_ids: Iterable[int]) -> Set[int]:
+        """Ids of the products using any of the given materials"""
+        version = data_versions.get_version(db, data_versions.BOM)
+        with self._lock:
+            if self._products_by_material is None or self._version != version:
+                self._load(db, version)
+            products = set()
+            for material_id in material_ids:
+                products |= self._products_by_material.get(material_id, set())
+            return products
+
+    def apply(self, added: Iterable[tuple], removed: Iterable[tuple], version: int):
+        """Apply committed (material_id, product_id) changes that produced the given version"""
+        with self._lock:
+            if self._products_by_material is None:
+                return
+            if self._version != version - 1:
+                # Someone else changed the BOM in between; reload on next lookup
+                self.invalidate()
+                return
+            for material_id, product_id in removed:
+                self._products_by_material[material_id].discard(product_id)
+            for material_id, product_id in added:
+                self._products_by_material[material_id].add(product_id)
+            self._version = version
+
+    def invalidate(self):
+        self._products_by_material = None
+        self._version = None
+
+bom_index = ReverseBOMIndex()
+
+def _bom_key(obj, previous: bool = False) -> tuple:
+    if previous:
+        state = sa_inspect(obj)
+        keys = []
+        for attr in ("material_id", "product_id"):
+            history = state.attrs[attr].history
+            keys.append(history.deleted[0] if history.deleted else getattr(obj, attr))
+        return tuple(keys)
+    return (obj.material_id, obj.product_id)
+
+@event.listens_for(Session, "after_flush")
+def _record_bom_changes(session, flush_context):
+    added, removed = [], []
+    for obj in session.new:
+        if isinstance(obj, ProductMaterial):
+            added.append(_bom_key(obj))
+    for obj in session.dirty:
+        if isinstance(obj, ProductMaterial) and session.is_modified(obj):
+            removed.append(_bom_key(obj, previous=True))
+            added.append(_bom_key(obj))
+    for obj in session.deleted:
+        if isinstance(obj, ProductMaterial):
+            removed.append(_bom_key(obj))
+    if added or removed:
+        version = data_versions.bump_version(session.connection(), data_versions.BOM)
+        session.info.setdefault("bom_changes", []).append((added, removed, version))
+
+@event.listens_for(Session, "after_commit")
+def _apply_bom_changes(session):
+    for added, removed, version in session.info.pop("bom_changes", []):
+        bom_index.apply(added, removed, version)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_bom_changes(session, previous_transaction):
+    session.info.pop("bom_changes", None)
@@ -0,0 +1,252 @@
+"""
+Bulk imports of materials, products (with their BOM), BOM rows and orders (with their items).
+
+Rows are validated and inserted in chunks of CHUNK_SIZE, one transaction per chunk, with
+executemany Core inserts. Rows that fail validation or reference missing/duplicate records
+are reported by their position in the input and skipped; the rest of the chunk is still
+inserted. If a chunk hits a constraint anyway (e.g. a concurrent insert of the same SKU), it is
+rolled back and retried row by row so only the offending rows fail.
+
+Core inserts bypass the Session events, so dashboard counters, the BOM and response cache
+versions and can_build are maintained explicitly here.
+"""
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Set, Tuple
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+from models import Material, Product, Order, OrderItem, product_materials
+from schemas import MaterialCreate, BulkProductCreate, BOMRowCreate, BulkOrderCreate, BulkImportResult, BulkRowError
+from services import dashboard_counters, data_versions, events, inventory_digest, order_rollups, products_service, response_cache
+
+# Rows per validation batch and transaction
+CHUNK_SIZE = 1000
+# Maximum number of ids per IN (...) clause
+IN_CHUNK_SIZE = 500
+
+def parse_json_array(body: bytes) -> List[Any]:
+    """Rows of a JSON array body; raises ValueError for anything else"""
+    rows = json.loads(body)
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array of rows")
+    return rows
+
+async def iter_ndjson(stream: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Non-blank lines of an NDJSON byte stream, left unparsed so a bad line fails only its row"""
+    buffer = b""
+    async for data in stream:
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+def _error_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in exc.errors()
+    )
+
+def _existing(db: Session, column, values: Iterable) -> Set:
+    """The subset of values present in column"""
+    values = list(set(values))
+    found = set()
+    for start in range(0, len(values), IN_CHUNK_SIZE):
+        found.update(db.scalars(select(column).where(column.in_(values[start:start + IN_CHUNK_SIZE]))))
+    return found
+
+def _has_duplicates(keys: List) -> bool:
+    return len(set(keys)) != len(keys)
+
+def _insert_returning(db: Session, table, rows: List[Dict[str, Any]], columns: List, statement=None) -> List[tuple]:
+    """Insert rows with one executemany and return the given columns of each row, in input order.
+
+    Uses INSERT ... RETURNING where the dialect supports it for executemany; otherwise reads the
+    rows back by the first column, which must be unique and supplied by the caller. SQLite takes
+    the second path: ordered RETURNING there runs one INSERT per row.
+    """
+    statement = statement if statement is not None else table.insert()
+    dialect = db.get_bind().dialect
+    if dialect.insert_executemany_returning_sort_by_parameter_order and dialect.name != "sqlite":
+        return [tuple(row) for row in db.execute(statement.returning(*columns, sort_by_parameter_order=True), rows)]
+    db.execute(statement, rows)
+    key = columns[0]
+    keys = [row[key.name] for row in rows]
+    found = {}
+    for start in range(0, len(keys), IN_CHUNK_SIZE):
+        for row in db.execute(select(*columns).where(key.in_(keys[start:start + IN_CHUNK_SIZE]))):
+            found[row[0]] = tuple(row)
+    return [found[key_value] for key_value in keys]
+
+def _insert_bom_rows(db: Session, rows: List[Dict[str, Any]]):
+    db.execute(product_materials.insert(), rows)
+    data_versions.bump_version(db.connection(), data_versions.BOM)
+    response_cache.invalidate(db, response_cache.PRODUCTS)
+    products_service.recalculate_can_build(db, {row["product_id"] for row in rows})
+
+# Materials
+def _check_materials(db: Session, items: List[Tuple[int, MaterialCreate]]) -> Dict[int, str]:
+    return {}
+
+def _insert_materials(db: Session, materials: List[MaterialCreate]):
+    rows = [material.dict() for material in materials]
+    db.execute(Material.__table__.insert(), rows)
+    dashboard_counters.record_rows(db, Material, rows)
+    inventory_digest.record_change(db)
+    response_cache.invalidate(db, response_cache.MATERIALS)
+    events.record(db, events.MATERIALS_IMPORTED, {"count": len(rows)})
+
+# Products with BOM
+def _check_products(db: Session, items: List[Tuple[int, BulkProductCreate]]) -> Dict[int, str]:
+    errors = {}
+    taken = _existing(db, Product.sku, [product.sku for _, product in items])
+    materials = _existing(db, Material.id, [line.material_id for _, product in items for line in product.bom])
+    for index, product in items:
+        missing = sorted({line.material_id for line in product.bom} - materials)
+        if product.sku in taken:
+            errors[index] = f"sku: {product.sku} already exists"
+        elif missing:
+            errors[index] = f"bom: unknown material ids {missing}"
+        elif _has_duplicates([line.material_id for line in product.bom]):
+            errors[index] = "bom: a material is listed more than once"
+        else:
+            # A later row with the same SKU in this chunk sees it as taken
+            taken.add(product.sku)
+    return errors
+
+def _insert_products(db: Session, products: List[BulkProductCreate]):
+    rows = [{**product.dict(exclude={"bom"}), "can_build": 0} for product in products]
+    table = Product.__table__
+    ids = [product_id for _, product_id in _insert_returning(db, table, rows, [table.c.sku, table.c.id])]
+    dashboard_counters.record_rows(db, Product, rows)
+    inventory_digest.record_change(db)
+    response_cache.invalidate(db, response_cache.PRODUCTS)
+    bom_rows = [
+        {"product_id": product_id, "material_id": line.material_id, "quantity": line.quantity}
+        for product_id, product in zip(ids, products)
+        for line in product.bom
+    ]
+    if bom_rows:
+        _insert_bom_rows(db, bom_rows)
+
+# BOM rows for existing products
+def _check_bom_rows(db: Session, items: List[Tuple[int, BOMRowCreate]]) -> Dict[int, str]:
+    errors = {}
+    products = _existing(db, Product.id, [row.product_id for _, row in items])
+    materials = _existing(db, Material.id, [row.material_id for _, row in items])
+    pairs = [(row.product_id, row.material_id) for _, row in items]
+    taken = set()
+    product_ids = list(products)
+    for start in range(0, len(product_ids), IN_CHUNK_SIZE):
+        taken.update(tuple(row) for row in db.execute(
+            select(product_materials.c.product_id, product_materials.c.material_id)
+            .where(product_materials.c.product_id.in_(product_ids[start:start + IN_CHUNK_SIZE]))
+        ))
+    for (index, row), pair in zip(items, pairs):
+        if row.product_id not in products:
+            errors[index] = f"product_id: unknown product {row.product_id}"
+        elif row.material_id not in materials:
+            errors[index] = f"material_id: unknown material {row.material_id}"
+        elif pair in taken:
+            errors[index] = "material is already in this product's BOM"
+        else:
+            taken.add(pair)
+    return errors
+
+def _insert_bom(db: Session, bom_rows: List[BOMRowCreate]):
+    _insert_bom_rows(db, [row.dict() for row in bom_rows])
+
+# Orders with items
+def _check_orders(db: Session, items: List[Tuple[int, BulkOrderCreate]]) -> Dict[int, str]:
+    errors = {}
+    taken = _existing(db, Order.id, [order.id for _, order in items])
+    products = _existing(db, Product.id, [item.product_id for _, order in items for item in order.items])
+    for index, order in items:
+        missing = sorted({item.product_id for item in order.items} - products)
+        if order.id in taken:
+            errors[index] = f"id: order {order.id} already exists"
+        elif missing:
+            errors[index] = f"items: unknown product ids {missing}"
+        else:
+            taken.add(order.id)
+    return errors
+
+def _insert_orders(db: Session, orders: List[BulkOrderCreate]):
+    table = Order.__table__
+    rows = [{**order.dict(exclude={"items", "order_date"}), "order_date_value": order.order_date} for order in orders]
+    # Orders without an order_date get the column's server default, as through the ORM. Imported
+    # orders were created when they were placed: the dashboard counters, the order rollups and
+    # so the demand forecast bucket orders by created_at
+    placed = func.coalesce(bindparam("order_date_value", type_=table.c.order_date.type), func.now())
+    statement = table.insert().values(order_date=placed, created_at=placed)
+    inserted = _insert_returning(db, table, rows, [table.c.id, table.c.total, table.c.created_at, table.c.status], statement)
+    dashboard_counters.record_rows(db, Order, [{"total": total, "created_at": created_at} for _, total, created_at, _ in inserted])
+    item_rows = [{**item.dict(), "order_id": order.id} for order in orders for item in order.items]
+    if item_rows:
+        db.execute(OrderItem.__table__.insert(), item_rows)
+    created = {order_id: created_at for order_id, _, created_at, _ in inserted}
+    order_rollups.record_orders(
+        db,
+        [{"created_at": created_at, "status": status, "total": total} for _, total, created_at, status in inserted],
+        [{**row, "created_at": created.get(row["order_id"])} for row in item_rows]
+    )
+    inventory_digest.record_change(db)
+    events.record(db, events.ORDERS_IMPORTED, {"count": len(inserted)})
+
+# kind -> (row schema, check returning {index: error}, insert)
+IMPORTERS = {
+    "materials": (MaterialCreate, _check_materials, _insert_materials),
+    "products": (BulkProductCreate, _check_products, _insert_products),
+    "bom": (BOMRowCreate, _check_bom_rows, _insert_bom),
+    "orders": (BulkOrderCreate, _check_orders, _insert_orders),
+}
+
+def _validate(schema, raw: Any) -> BaseModel:
+    if isinstance(raw, (bytes, str)):
+        return schema.model_validate_json(raw)
+    return schema.model_validate(raw)
+
+def import_chunk(db: Session, kind: str, rows: List[Tuple[int, Any]], result: BulkImportResult) -> BulkImportResult:
+    """Validate and insert one chunk of (input index, raw row) pairs, committing what succeeds.
+
+    Raw rows are dicts or undecoded NDJSON lines. Counts and per-row errors are added to result.
+    """
+    schema, check, insert = IMPORTERS[kind]
+    errors = []
+    valid = []
+    for index, raw in rows:
+        try:
+            valid.append((index, _validate(schema, raw)))
+        except ValidationError as exc:
+            errors.append(BulkRowError(index=index, error=_error_message(exc)))
+
+    if valid:
+        rejected = check(db, valid)
+        errors.extend(BulkRowError(index=index, error=error) for index, error in rejected.items())
+        valid = [(index, item) for index, item in valid if index not in rejected]
+
+    inserted = 0
+    if valid:
+        try:
+            insert(db, [item for _, item in valid])
+            db.commit()
+            inserted = len(valid)
+        except (IntegrityError, DataError):
+            db.rollback()
+            # Isolate the failing rows: one transaction per row
+            for index, item in valid:
+                try:
+                    insert(db, [item])
+                    db.commit()
+                    inserted += 1
+                except (IntegrityError, DataError) as exc:
+                    db.rollback()
+                    errors.append(BulkRowError(index=index, error=str(exc.orig)))
+
+    result.received += len(rows)
+    result.inserted += inserted
+    result.failed += len(errors)
+    result.errors.extend(sorted(errors, key=lambda error: error.index))
+    return result
@@ -0,0 +1,315 @@
+"""
+Materialized dashboard counters.
+
+Counters live in the ``dashboard_counters`` table and are updated inside the same transaction
+as the ORM writes that change them (via Session flush events), so every worker process sees
+consistent values and reads are O(1) regardless of table size. Time-windowed order volume and
+revenue are summed at read time from the hourly ``order_status_rollups`` (see order_rollups), so
+they roll over on their own; week/month windows start on the hour.
+
+Writes that bypass the ORM unit of work (Core/bulk statements) must report their effect
+through ``adjust_counters`` / ``record_rows``; ``rebuild_counters`` resets everything from a
+full recompute.
+"""
+from sqlalchemy import event, select, func, and_, inspect as sa_inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from typing import Dict, Any, Optional, List, Iterable
+from datetime import datetime
+from collections import defaultdict
+from database import ReadOnlySession, SessionLocal
+from models import Material, Product, Order, OrderQueue, Integration, Shortage, DashboardCounter, OrderStatusRollup
+from services import dashboard_service
+
+INITIALIZED_COUNTER = "counters.initialized"
+QUEUE_STATUS_PREFIX = "order_queue.status:"
+REVENUE_PREFIX = "revenue."
+
+def _material_counters(v) -> Dict[str, int]:
+    quantity, required = v("quantity"), v("required")
+    return {
+        "materials.total": 1,
+        "materials.low_stock": int(quantity is not None and required is not None and quantity < required),
+        "materials.out_of_stock": int(quantity == 0),
+    }
+
+def _product_counters(v) -> Dict[str, int]:
+    can_build = v("can_build")
+    return {
+        "products.total": 1,
+        "products.can_build": int(can_build is not None and can_build > 0),
+        "products.cannot_build": int(can_build == 0),
+    }
+
+def _order_counters(v) -> Dict[str, float]:
+    return {"orders.total": 1, "revenue.total": v("total") or 0.0}
+
+def _order_queue_counters(v) -> Dict[str, int]:
+    return {
+        f"{QUEUE_STATUS_PREFIX}{v('status')}": 1,
+        "order_queue.blocked": int(v("can_fulfill") is False),
+    }
+
+def _integration_counters(v) -> Dict[str, int]:
+    return {"integrations.total": 1, "integrations.active": int(v("enabled") is True)}
+
+def _shortage_counters(v) -> Dict[str, int]:
+    short = v("short")
+    return {"shortages.total": 1, "shortages.critical": int(short is not None and short > 0)}
+
+# Model -> (attributes the counters depend on, contribution of a single row)
+COUNTER_SPECS = {
+    Material: (("quantity", "required"), _material_counters),
+    Product: (("can_build",), _product_counters),
+    Order: (("total",), _order_counters),
+    OrderQueue: (("status", "can_fulfill"), _order_queue_counters),
+    Integration: (("enabled",), _integration_counters),
+    Shortage: (("short",), _shortage_counters),
+}
+
+def _column_default(model, attr):
+    default = model.__table__.c[attr].default
+    if default is not None and default.is_scalar:
+        return default.arg
+    return None
+
+class _Deltas:
+    """Accumulates counter deltas for one flush or bulk operation"""
+
+    def __init__(self):
+        self.counters = defaultdict(float)
+
+    def add(self, model, values: Dict[str, Any], sign: int = 1):
+        attrs, contribution = COUNTER_SPECS[model]
+        for name, delta in contribution(values.get).items():
+            self.counters[name] += sign * delta
+
+    def __bool__(self):
+        return bool(self.counters)
+
+def _current_values(obj, attrs) -> Dict[str, Any]:
+    values = {}
+    for attr in attrs:
+        value = getattr(obj, attr)
+        if value is None:
+            value = _column_default(type(obj), attr)
+        values[attr] = value
+    return values
+
+def _previous_values(session: Session, obj, attrs) -> Dict[str, Any]:
+    """Committed values of a dirty object, read from the database if history is incomplete"""
+    state = sa_inspect(obj)
+    values = {}
+    for attr in attrs:
+        history = state.attrs[attr].history
+        if history.deleted:
+            values[attr] = history.deleted[0]
+        elif not history.added:
+            values[attr] = getattr(obj, attr)
+        else:
+            model = type(obj)
+            pk = model.__table__.primary_key.columns.values()[0]
+            row = session.connection().execute(
+                select(*[model.__table__.c[a] for a in attrs]).where(pk == state.identity[0])
+            ).mappings().first()
+            return dict(row) if row else {}
+    return values
+
+def _has_changes(obj, attrs) -> bool:
+    state = sa_inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+@event.listens_for(Session, "before_flush")
+def _collect_deltas(session, flush_context, instances):
+    deltas = session.info.setdefault("dashboard_deltas", _Deltas())
+    for obj in session.new:
+        model = type(obj)
+        if model in COUNTER_SPECS:
+            deltas.add(model, _current_values(obj, COUNTER_SPECS[model][0]))
+    for obj in session.dirty:
+        model = type(obj)
+        if model in COUNTER_SPECS and session.is_modified(obj) and _has_changes(obj, COUNTER_SPECS[model][0]):
+            attrs = COUNTER_SPECS[model][0]
+            deltas.add(model, _previous_values(session, obj, attrs), sign=-1)
+            deltas.add(model, _current_values(obj, attrs))
+    for obj in session.deleted:
+        model = type(obj)
+        if model in COUNTER_SPECS:
+            deltas.add(model, _current_values(obj, COUNTER_SPECS[model][0]), sign=-1)
+
+@event.listens_for(Session, "after_flush")
+def _apply_deltas(session, flush_context):
+    deltas = session.info.pop("dashboard_deltas", None)
+    if not deltas:
+        return
+    _write_deltas(session.connection(), deltas)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_deltas(session, previous_transaction):
+    session.info.pop("dashboard_deltas", None)
+
+def upsert_add(connection, table, keys: List[str], rows: List[Dict[str, Any]], add_columns: List[str]):
+    """INSERT rows, or add their values onto existing rows with the same key"""
+    if not rows:
+        return
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite_insert if dialect == "sqlite" else pg_insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={column: table.c[column] + stmt.excluded[column] for column in add_columns}
+        )
+        connection.execute(stmt, rows)
+        return
+    for row in rows:
+        result = connection.execute(
+            table.update()
+            .where(and_(*[table.c[key] == row[key] for key in keys]))
+            .values({column: table.c[column] + row[column] for column in add_columns})
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**row))
+
+def _write_deltas(connection, deltas: _Deltas):
+    upsert_add(connection, DashboardCounter.__table__, ["name"], [
+        {"name": name, "value": value} for name, value in deltas.counters.items() if value
+    ], ["value"])
+
+def adjust_counters(db: Session, counters: Dict[str, float]):
+    """Apply raw counter deltas in the caller's transaction (for writes that bypass the ORM)"""
+    deltas = _Deltas()
+    deltas.counters.update(counters)
+    _write_deltas(db.connection(), deltas)
+
+def record_rows(db: Session, model, rows: Iterable[Dict[str, Any]], sign: int = 1):
+    """Account for rows inserted (sign=1) or deleted (sign=-1) with Core/bulk statements"""
+    attrs = COUNTER_SPECS[model][0]
+    deltas = _Deltas()
+    for row in rows:
+        deltas.add(model, {attr: row.get(attr, _column_default(model, attr)) for attr in attrs}, sign)
+    _write_deltas(db.connection(), deltas)
+
+def record_changes(db: Session, model, changes: Iterable[tuple]):
+    """Account for (old_values, new_values) pairs updated with Core/bulk statements"""
+    deltas = _Deltas()
+    for old, new in changes:
+        deltas.add(model, old, sign=-1)
+        deltas.add(model, new)
+    _write_deltas(db.connection(), deltas)
+
+def rebuild_counters(db: Session):
+    """Recompute every counter from the source tables and commit (the order rollups behind the
+    time windows are rebuilt by order_rollups.rebuild_rollups)"""
+    raw = dashboard_service.compute_raw_stats(db)
+    counters = {
+        name: raw[name] for name in (
+            "materials.total", "materials.low_stock", "materials.out_of_stock",
+            "products.total", "products.can_build", "products.cannot_build",
+            "orders.total", "revenue.total", "order_queue.blocked",
+            "integrations.total", "integrations.active",
+            "shortages.total", "shortages.critical",
+        )
+    }
+    for status, count in db.query(OrderQueue.status, func.count(OrderQueue.id)).group_by(OrderQueue.status):
+        counters[f"{QUEUE_STATUS_PREFIX}{status}"] = count
+    counters[INITIALIZED_COUNTER] = 1
+
+    db.query(DashboardCounter).delete()
+    db.execute(DashboardCounter.__table__.insert(), [{"name": k, "value": v} for k, v in counters.items()])
+    db.commit()
+
+def _read_counters(db: Session) -> Optional[Dict[str, float]]:
+    """The counters, built first if missing; None on a read replica that has none yet (it is never written)"""
+    counters = {row.name: row.value for row in db.query(DashboardCounter.name, DashboardCounter.value)}
+    if INITIALIZED_COUNTER not in counters:
+        if isinstance(db, ReadOnlySession):
+            return None
+        rebuild_counters(db)
+        counters = {row.name: row.value for row in db.query(DashboardCounter.name, DashboardCounter.value)}
+    return counters
+
+def get_bucket_windows(now: Optional[datetime] = None) -> Dict[str, datetime]:
+    """Dashboard windows aligned to the hourly rollup buckets"""
+    return {name: dashboard_service.truncate(start, "hour") for name, start in dashboard_service.get_time_windows(now).items()}
+
+def get_raw_stats(db: Session, now: Optional[datetime] = None) -> Dict[str, float]:
+    """Raw dashboard figures read from the counters (two small queries)"""
+    counters = _read_counters(db)
+    if counters is None:
+        # The replica has not received the counters yet: read (and build) them on the primary
+        with SessionLocal() as primary:
+            return get_raw_stats(primary, now)
+    windows = get_bucket_windows(now)
+    windowed = db.query(
+        *[
+            dashboard_service.sum_if(OrderStatusRollup.bucket_start >= windows[window], column)
+            for column in (OrderStatusRollup.orders, OrderStatusRollup.revenue)
+            for window in ("today", "week", "month")
+        ]
+    ).filter(OrderStatusRollup.granularity == "hour", OrderStatusRollup.bucket_start >= windows["month"]).one()
+
+    def count(name):
+        return int(round(counters.get(name, 0)))
+
+    return {
+        "materials.total": count("materials.total"),
+        "materials.low_stock": count("materials.low_stock"),
+        "materials.out_of_stock": count("materials.out_of_stock"),
+        "products.total": count("products.total"),
+        "products.can_build": count("products.can_build"),
+        "products.cannot_build": count("products.cannot_build"),
+        "orders.total": count("orders.total"),
+        "orders.today": int(windowed[0]),
+        "orders.this_week": int(windowed[1]),
+        "orders.this_month": int(windowed[2]),
+        "revenue.total": counters.get("revenue.total", 0.0),
+        "revenue.today": windowed[3] or 0.0,
+        "revenue.this_week": windowed[4] or 0.0,
+        "revenue.this_month": windowed[5] or 0.0,
+        "order_queue.queued": count(f"{QUEUE_STATUS_PREFIX}Queued"),
+        "order_queue.processing": count(f"{QUEUE_STATUS_PREFIX}Processing"),
+        "order_queue.completed": count(f"{QUEUE_STATUS_PREFIX}Completed"),
+        "order_queue.blocked": count("order_queue.blocked"),
+        "integrations.total": count("integrations.total"),
+        "integrations.active": count("integrations.active"),
+        "shortages.total": count("shortages.total"),
+        "shortages.critical": count("shortages.critical"),
+    }
+
+def get_dashboard_stats(db: Session, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Dashboard statistics served from the counters"""
+    return dashboard_service.format_stats(get_raw_stats(db, now))
+
+def get_queue_status_distribution(db: Session) -> List[Dict[str, Any]]:
+    """Order queue rows per status, from the counters"""
+    counters = _read_counters(db)
+    if counters is None:
+        with SessionLocal() as primary:
+            return get_queue_status_distribution(primary)
+    return [
+        {"status": name[len(QUEUE_STATUS_PREFIX):], "count": int(round(value))}
+        for name, value in sorted(counters.items())
+        if name.startswith(QUEUE_STATUS_PREFIX) and round(value) > 0
+    ]
+
+def check_consistency(db: Session, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Compare the counters against a full recompute over the same (hour-aligned) windows"""
+    counted = get_raw_stats(db, now)
+    recomputed = dashboard_service.compute_raw_stats(db, get_bucket_windows(now))
+    mismatches = {}
+    for name, expected in recomputed.items():
+        actual = counted[name]
+        tolerance = 0.01 if name.startswith(REVENUE_PREFIX) else 0
+        if abs((actual or 0) - (expected or 0)) > tolerance:
+            mismatches[name] = {"counter": actual, "recomputed": expected}
+
+    distribution = {row["status"]: row["count"] for row in get_queue_status_distribution(db)}
+    for status, count in db.query(OrderQueue.status, func.count(OrderQueue.id)).group_by(OrderQueue.status):
+        if distribution.pop(status, 0) != count:
+            mismatches[f"{QUEUE_STATUS_PREFIX}{status}"] = {"counter": None, "recomputed": count}
+    for status, count in distribution.items():
+        mismatches[f"{QUEUE_STATUS_PREFIX}{status}"] = {"counter": count, "recomputed": 0}
+
+    return {"consistent": not mismatches, "mismatches": mismatches, "checked_at": datetime.now().isoformat()}
@@ -0,0 +1,182 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case
+from typing import Dict, Any, Optional
+from datetime import datetime, timedelta
+from models import Material, Product, Order, OrderQueue, Integration, Shortage
+
+def count_if(condition):
+    """SUM(CASE WHEN condition THEN 1 ELSE 0 END) - a COUNT restricted to matching rows"""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+def sum_if(condition, column):
+    """SUM(CASE WHEN condition THEN column ELSE 0 END)"""
+    return func.coalesce(func.sum(case((condition, column), else_=0)), 0)
+
+# Trend granularities and the length of one bucket
+GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1), "week": timedelta(weeks=1)}
+
+def bucket_expression(db: Session, column, granularity: str = "hour"):
+    """SQL expression truncating a datetime column to the start of its hour/day/week bucket (weeks start on Monday)"""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc(granularity, column)
+    if granularity == "week":
+        # Forward to the week's Sunday (or stay on it), then back to its Monday
+        return func.strftime("%Y-%m-%d 00:00:00", column, "weekday 0", "-6 days")
+    formats = {"hour": "%Y-%m-%d %H:00:00", "day": "%Y-%m-%d 00:00:00"}
+    return func.strftime(formats[granularity], column)
+
+def truncate(value: datetime, granularity: str) -> datetime:
+    """Python counterpart of bucket_expression"""
+    value = value.replace(minute=0, second=0, microsecond=0)
+    if granularity != "hour":
+        value = value.replace(hour=0)
+    if granularity == "week":
+        value -= timedelta(days=value.weekday())
+    return value
+
+def parse_bucket(value) -> datetime:
+    """Bucket values come back as datetimes (PostgreSQL) or strings (SQLite)"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+def get_time_windows(now: Optional[datetime] = None) -> Dict[str, datetime]:
+    """Window boundaries used by the dashboard (today / last 7 days / last 30 days)"""
+    now = now or datetime.now()
+    return {
+        "today": now.replace(hour=0, minute=0, second=0, microsecond=0),
+        "week": now - timedelta(days=7),
+        "month": now - timedelta(days=30),
+    }
+
+def compute_raw_stats(db: Session, windows: Optional[Dict[str, datetime]] = None) -> Dict[str, float]:
+    """Compute the raw dashboard figures with one conditional-aggregate query per table"""
+    windows = windows or get_time_windows()
+    today_start, week_ago, month_ago = windows["today"], windows["week"], windows["month"]
+
+    materials = db.query(
+        func.count(Material.id),
+        count_if(Material.quantity < Material.required),
+        count_if(Material.quantity == 0)
+    ).one()
+
+    products = db.query(
+        func.count(Product.id),
+        count_if(Product.can_build > 0),
+        count_if(Product.can_build == 0)
+    ).one()
+
+    orders = db.query(
+        func.count(Order.id),
+        count_if(Order.created_at >= today_start),
+        count_if(Order.created_at >= week_ago),
+        count_if(Order.created_at >= month_ago),
+        func.coalesce(func.sum(Order.total), 0),
+        sum_if(Order.created_at >= today_start, Order.total),
+        sum_if(Order.created_at >= week_ago, Order.total),
+        sum_if(Order.created_at >= month_ago, Order.total)
+    ).one()
+
+    order_queue = db.query(
+        count_if(OrderQueue.status == "Queued"),
+        count_if(OrderQueue.status == "Processing"),
+        count_if(OrderQueue.status == "Completed"),
+        count_if(OrderQueue.can_fulfill == False)
+    ).one()
+
+    integrations = db.query(
+        func.count(Integration.id),
+        count_if(Integration.enabled == True)
+    ).one()
+
+    shortages = db.query(
+        func.count(Shortage.id),
+        count_if(Shortage.short > 0)
+    ).one()
+
+    return {
+        "materials.total": materials[0],
+        "materials.low_stock": materials[1],
+        "materials.out_of_stock": materials[2],
+        "products.total": products[0],
+        "products.can_build": products[1],
+        "products.cannot_build": products[2],
+        "orders.total": orders[0],
+        "orders.today": orders[1],
+        "orders.this_week": orders[2],
+        "orders.this_month": orders[3],
+        "revenue.total": orders[4] or 0,
+        "revenue.today": orders[5] or 0,
+        "revenue.this_week": orders[6] or 0,
+        "revenue.this_month": orders[7] or 0,
+        "order_queue.queued": order_queue[0],
+        "order_queue.processing": order_queue[1],
+        "order_queue.completed": order_queue[2],
+        "order_queue.blocked": order_queue[3],
+        "integrations.total": integrations[0],
+        "integrations.active": integrations[1],
+        "shortages.total": shortages[0],
+        "shortages.critical": shortages[1],
+    }
+
+def format_stats(raw: Dict[str, float]) -> Dict[str, Any]:
+    """Shape raw figures into the /api/dashboard/stats response"""
+    total_materials = raw["materials.total"]
+    low_stock_materials = raw["materials.low_stock"]
+    out_of_stock_materials = raw["materials.out_of_stock"]
+    total_products = raw["products.total"]
+    products_can_build = raw["products.can_build"]
+    completed_orders = raw["order_queue.completed"]
+    blocked_orders = raw["order_queue.blocked"]
+    total_integrations = raw["integrations.total"]
+    active_integrations = raw["integrations.active"]
+    total_shortages = raw["shortages.total"]
+    critical_shortages = raw["shortages.critical"]
+
+    return {
+        "materials": {
+            "total": total_materials,
+            "low_stock": low_stock_materials,
+            "out_of_stock": out_of_stock_materials,
+            "stock_health": round((total_materials - low_stock_materials - out_of_stock_materials) / max(total_materials, 1) * 100, 1)
+        },
+        "products": {
+            "total": total_products,
+            "can_build": products_can_build,
+            "cannot_build": raw["products.cannot_build"],
+            "build_rate": round(products_can_build / max(total_products, 1) * 100, 1)
+        },
+        "orders": {
+            "total": raw["orders.total"],
+            "today": raw["orders.today"],
+            "this_week": raw["orders.this_week"],
+            "this_month": raw["orders.this_month"]
+        },
+        "order_queue": {
+            "queued": raw["order_queue.queued"],
+            "processing": raw["order_queue.processing"],
+            "completed": completed_orders,
+            "blocked": blocked_orders,
+            "fulfillment_rate": round(completed_orders / max(completed_orders + blocked_orders, 1) * 100, 1)
+        },
+        "revenue": {
+            "total": round(raw["revenue.total"], 2),
+            "today": round(raw["revenue.today"], 2),
+            "this_week": round(raw["revenue.this_week"], 2),
+            "this_month": round(raw["revenue.this_month"], 2)
+        },
+        "integrations": {
+            "total": total_integrations,
+            "active": active_integrations,
+            "uptime": round(active_integrations / max(total_integrations, 1) * 100, 1)
+        },
+        "shortages": {
+            "total": total_shortages,
+            "critical": critical_shortages,
+            "impact_rate": round(critical_shortages / max(total_shortages, 1) * 100, 1)
+        }
+    }
+
+def get_dashboard_stats(db: Session, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Get comprehensive dashboard statistics (six queries, one per table)"""
+    return format_stats(compute_raw_stats(db, get_time_windows(now)))
@@ -0,0 +1,28 @@
+"""
+Monotonic per-dataset version numbers stored in ``data_versions``.
+
+Writers bump a version inside their own transaction; in-process caches compare the stored
+version with the one they were built from to notice changes made by other worker processes.
+"""
+from typing import Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import DataVersion
+from services.dashboard_counters import upsert_add
+
+BOM = "bom"
+# Materials, products, orders and the order queue (the AI chat digest)
+INVENTORY = "inventory"
+
+def bump_version(connection, name: str) -> int:
+    """Increment a version in the connection's transaction and return the new value"""
+    upsert_add(connection, DataVersion.__table__, ["name"], [{"name": name, "version": 1}], ["version"])
+    return connection.execute(select(DataVersion.version).where(DataVersion.name == name)).scalar()
+
+def get_version(db: Session, name: str) -> int:
+    return db.query(DataVersion.version).filter(DataVersion.name == name).scalar() or 0
+
+def get_versions(db: Session, names: Tuple[str, ...]) -> Tuple[int, ...]:
+    """Several versions in one query, in the order of names"""
+    stored = dict(db.query(DataVersion.name, DataVersion.version).filter(DataVersion.name.in_(names)))
+    return tuple(stored.get(name, 0) for name in names)
@@ -0,0 +1,248 @@
+"""
+Change events for the ``/api/events`` Server-Sent Events stream.
+
+Writes are not instrumented one by one: Session flush events collect material quantity
+changes, new orders and order queue status changes, and the batch is published after the
+transaction commits (and dropped on rollback). Core/bulk writes add theirs with ``record``.
+
+The broker fans each event out to every subscriber on this process's event loop. An event is
+encoded once; each subscriber holds a bounded queue of encoded frames. A subscriber that falls
+``EVENTS_QUEUE_SIZE`` frames behind (a stalled or slow connection) loses its backlog and gets
+a single ``resync`` event telling it to refetch, so one slow client never holds memory or
+delays the others. Reconnecting clients send Last-Event-ID and are replayed the events they
+missed while those are still in the replay buffer, otherwise they get ``resync`` too.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+from sqlalchemy import event
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+from config import EVENTS_QUEUE_SIZE, EVENTS_HEARTBEAT_SECONDS, EVENTS_MAX_SUBSCRIBERS
+from models import Material, Order, OrderQueue
+
+MATERIAL_CHANGED = "material.changed"    # {id, name, quantity, previous, required}
+MATERIAL_DELETED = "material.deleted"    # {id, name}
+MATERIALS_IMPORTED = "materials.imported"  # {count}
+ORDER_CREATED = "order.created"          # {id, customer, status, total}
+ORDERS_IMPORTED = "orders.imported"      # {count}
+QUEUE_CHANGED = "queue.changed"          # {id, status, previous}
+ALERT = "alert"                          # {material_id, name, level, quantity, required}
+ALERTS_UPDATED = "alerts.updated"        # {version, count, etag} - a new /api/ai/alerts snapshot
+RESYNC = "resync"                        # {} - state may have been missed; refetch it
+EVENT_TYPES = (
+    MATERIAL_CHANGED, MATERIAL_DELETED, MATERIALS_IMPORTED, ORDER_CREATED, ORDERS_IMPORTED,
+    QUEUE_CHANGED, ALERT, ALERTS_UPDATED, RESYNC,
+)
+# Stock levels, least to most urgent, as shown by the dashboard
+STOCK_LEVELS = ("good", "low", "critical", "out")
+
+class TooManySubscribers(Exception):
+    """Raised when EVENTS_MAX_SUBSCRIBERS streams are already open on this process"""
+
+def stock_level(quantity: Optional[int], required: Optional[int]) -> str:
+    quantity, required = quantity or 0, required or 0
+    if quantity <= 0:
+        return "out"
+    if quantity < required:
+        return "critical"
+    if quantity < required * 1.5:
+        return "low"
+    return "good"
+
+def _encode(event_id: int, event_type: str, data: Dict[str, Any]) -> bytes:
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, default=str)}\n\n".encode()
+
+class Subscriber:
+    """One open stream: a bounded backlog of encoded frames and the stream's wake-up future"""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.frames: Deque[bytes] = deque()
+        self.waiter: Optional[asyncio.Future] = None
+        self.resyncs = 0
+
+    def offer(self, frame: bytes, resync: bytes):
+        if len(self.frames) >= self.queue_size:
+            # Too far behind: drop the backlog, the client refetches on resync
+            self.frames.clear()
+            frame = resync
+            self.resyncs += 1
+        self.frames.append(frame)
+        self._wake()
+
+    def _wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def wait(self, timeout: float):
+        """Wait until frames are queued or ``timeout`` seconds pass"""
+        if self.frames:
+            return
+        loop = asyncio.get_running_loop()
+        self.waiter = loop.create_future()
+        # A timer handle rather than asyncio.wait_for: no task per wait with thousands of streams
+        timer = loop.call_later(timeout, self._wake)
+        try:
+            await self.waiter
+        finally:
+            timer.cancel()
+            self.waiter = None
+
+class EventBroker:
+    """In-process fan-out of committed change events to the open /api/events streams"""
+
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE, max_subscribers: int = EVENTS_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.subscribers: Set[Subscriber] = set()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.last_id = 0
+        self.published = 0
+        self.resyncs = 0
+        self._recent: Deque[Tuple[int, bytes]] = deque(maxlen=queue_size)
+        # In-process consumers of every committed batch, called on the committing thread
+        self.listeners: List[Callable[[List[Tuple[str, Dict[str, Any]]]], None]] = []
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Subscriber:
+        """Open a stream (on the event loop); replays events after ``last_event_id`` if still buffered"""
+        if len(self.subscribers) >= self.max_subscribers:
+            raise TooManySubscribers(f"{len(self.subscribers)} event streams already open")
+        self.loop = asyncio.get_running_loop()
+        subscriber = Subscriber(self.queue_size)
+        if last_event_id is not None and last_event_id.isdigit() and int(last_event_id) != self.last_id:
+            after = int(last_event_id)
+            if after < self.last_id and self._recent and self._recent[0][0] <= after + 1:
+                for event_id, frame in self._recent:
+                    if event_id > after:
+                        subscriber.offer(frame, self._resync_frame())
+            else:
+                # Missed events are no longer buffered (or ids restarted with the process)
+                subscriber.offer(self._resync_frame(), self._resync_frame())
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        self.resyncs += subscriber.resyncs
+
+    def _resync_frame(self) -> bytes:
+        return _encode(self.last_id, RESYNC, {})
+
+    def _fan_out(self, events: List[Tuple[str, Dict[str, Any]]]):
+        for event_type, data in events:
+            self.last_id += 1
+            frame = _encode(self.last_id, event_type, data)
+            self._recent.append((self.last_id, frame))
+            resync = self._resync_frame()
+            for subscriber in self.subscribers:
+                subscriber.offer(frame, resync)
+            self.published += 1
+
+    def publish(self, events: List[Tuple[str, Dict[str, Any]]]):
+        """Fan out (type, data) events; safe to call from any thread"""
+        if not events:
+            return
+        for listener in self.listeners:
+            listener(events)
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        stamped = [(event_type, {**data, "ts": time.time()}) for event_type, data in events]
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._fan_out(stamped)
+        else:
+            # Sync routes commit on threadpool threads
+            loop.call_soon_threadsafe(self._fan_out, stamped)
+
+    async def stream(self, subscriber: Subscriber, heartbeat: float = EVENTS_HEARTBEAT_SECONDS):
+        """SSE body for one subscriber: frames as they arrive, a comment line when idle"""
+        try:
+            yield f"retry: 3000\n: connected, last event {self.last_id}\n\n".encode()
+            while True:
+                await subscriber.wait(heartbeat)
+                if not subscriber.frames:
+                    yield b": keep-alive\n\n"
+                    continue
+                # Everything queued since the last send goes out in one write
+                frames = b"".join(subscriber.frames)
+                subscriber.frames.clear()
+                yield frames
+        finally:
+            self.unsubscribe(subscriber)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "last_event_id": self.last_id,
+            "queued_frames": sum(len(subscriber.frames) for subscriber in self.subscribers),
+            "resyncs": self.resyncs + sum(subscriber.resyncs for subscriber in self.subscribers),
+        }
+
+broker = EventBroker()
+
+# Collection from the ORM, published on commit
+def record(db: Session, event_type: str, data: Dict[str, Any]):
+    """Queue an event for after the current transaction commits (for writes that bypass the ORM)"""
+    db.info.setdefault("pending_events", []).append((event_type, data))
+
+def record_stock_change(db: Session, material_id: int, previous: Optional[int], quantity: int, required: int,
+                        name: Optional[str] = None, previous_required: Optional[int] = None):
+    """Queue material.changed, and an alert if the material's stock level got worse (through its
+    quantity or its required level; previous_required defaults to an unchanged required)"""
+    record(db, MATERIAL_CHANGED, {
+        "id": material_id, "name": name, "quantity": quantity, "previous": previous, "required": required
+    })
+    level = stock_level(quantity, required)
+    if previous_required is None:
+        previous_required = required
+    before = stock_level(previous, previous_required) if previous is not None else "good"
+    if STOCK_LEVELS.index(level) > STOCK_LEVELS.index(before):
+        record(db, ALERT, {
+            "material_id": material_id, "name": name, "level": level, "quantity": quantity, "required": required
+        })
+
+def _previous(obj, attr):
+    """Value before this flush, or None if the attribute did not change"""
+    history = sa_inspect(obj).attrs[attr].history
+    if not history.has_changes():
+        return None
+    return history.deleted[0] if history.deleted else None
+
+@event.listens_for(Session, "after_flush")
+def _collect_events(session, flush_context):
+    # new/dirty/deleted and attribute history still describe the flushed changes here
+    for obj in session.new:
+        if isinstance(obj, Material):
+            record_stock_change(session, obj.id, None, obj.quantity, obj.required, obj.name)
+        elif isinstance(obj, Order):
+            record(session, ORDER_CREATED, {"id": obj.id, "customer": obj.customer, "status": obj.status, "total": obj.total})
+        elif isinstance(obj, OrderQueue):
+            record(session, QUEUE_CHANGED, {"id": obj.id, "status": obj.status, "previous": None})
+    for obj in session.dirty:
+        if isinstance(obj, Material):
+            state = sa_inspect(obj)
+            if state.attrs.quantity.history.has_changes() or state.attrs.required.history.has_changes():
+                previous = _previous(obj, "quantity")
+                record_stock_change(session, obj.id, obj.quantity if previous is None else previous,
+                                    obj.quantity, obj.required, obj.name, _previous(obj, "required"))
+        elif isinstance(obj, OrderQueue) and sa_inspect(obj).attrs.status.history.has_changes():
+            record(session, QUEUE_CHANGED, {"id": obj.id, "status": obj.status, "previous": _previous(obj, "status")})
+    for obj in session.deleted:
+        if isinstance(obj, Material):
+            record(session, MATERIAL_DELETED, {"id": obj.id, "name": obj.name})
+
+@event.listens_for(Session, "after_commit")
+def _publish_events(session):
+    broker.publish(session.info.pop("pending_events", None) or [])
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_events(session, previous_transaction):
+    session.info.pop("pending_events", None)
@@ -0,0 +1,80 @@
+"""
+Streaming exports of whole tables as NDJSON or CSV.
+
+Rows are read through a server-side cursor (``yield_per``) one partition at a time, the items
+of each partition of orders are loaded with one ``IN`` query, and every partition is encoded and
+yielded before the next is fetched, so memory stays flat however large the table is. Rows are
+plain Core tuples; no ORM objects or Pydantic models are built. Field names follow the API
+schemas so an export line looks like the matching ``GET`` response.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Dict, Iterator, List
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import Material, Order, OrderItem
+from schemas import Material as MaterialSchema, Order as OrderSchema, OrderItem as OrderItemSchema
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CHUNK_SIZE = 1000
+
+ORDER_FIELDS = [name for name in OrderSchema.model_fields if name != "items"]
+ORDER_ITEM_FIELDS = list(OrderItemSchema.model_fields)
+MATERIAL_FIELDS = list(MaterialSchema.model_fields)
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _ndjson(records: List[Dict]) -> str:
+    return "".join(json.dumps(record, default=_json_value) + "\n" for record in records)
+
+def _csv(rows: List[List]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([[_json_value(value) for value in row] for row in rows])
+    return buffer.getvalue()
+
+def _partitions(db: Session, statement, chunk_size: int):
+    result = db.execute(statement.execution_options(yield_per=chunk_size))
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+def _items_by_order(db: Session, order_ids: List[str]) -> Dict[str, List[Dict]]:
+    items = {order_id: [] for order_id in order_ids}
+    columns = [getattr(OrderItem, name) for name in ORDER_ITEM_FIELDS]
+    for row in db.execute(select(*columns).where(OrderItem.order_id.in_(order_ids)).order_by(OrderItem.id)):
+        items[row.order_id].append(dict(row._mapping))
+    return items
+
+def export_orders(db: Session, fmt: str = "ndjson", chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Every order with its items, oldest first.
+
+    NDJSON has one order per line with a nested ``items`` list; CSV has one line per order item
+    (order columns repeated, ``item_``-prefixed item columns; empty for orders without items).
+    """
+    statement = select(*[getattr(Order, name) for name in ORDER_FIELDS]).order_by(Order.created_at, Order.id)
+    item_fields = [name for name in ORDER_ITEM_FIELDS if name != "order_id"]
+    if fmt == "csv":
+        yield _csv([ORDER_FIELDS + [f"item_{name}" for name in item_fields]])
+
+    for rows in _partitions(db, statement, chunk_size):
+        items = _items_by_order(db, [row.id for row in rows])
+        if fmt == "csv":
+            lines = []
+            for row in rows:
+                for item in items[row.id] or [None]:
+                    lines.append(list(row) + [item[name] if item else None for name in item_fields])
+            yield _csv(lines)
+        else:
+            yield _ndjson([{**row._mapping, "items": items[row.id]} for row in rows])
+
+def export_materials(db: Session, fmt: str = "ndjson", chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Every material ordered by id"""
+    statement = select(*[getattr(Material, name) for name in MATERIAL_FIELDS]).order_by(Material.id)
+    if fmt == "csv":
+        yield _csv([MATERIAL_FIELDS])
+    for rows in _partitions(db, statement, chunk_size):
+        yield _csv([list(row) for row in rows]) if fmt == "csv" else _ndjson([dict(row._mapping) for row in rows])
@@ -0,0 +1,170 @@
+"""
+Demand forecasting for the inventory analysis and its reorder recommendations.
+
+Daily material consumption is the daily product sales rollups (a dense product x day matrix)
+times the BOM quantities, summed into a dense material x day matrix. Every material is then forecast at once with
+NumPy: an EWMA of daily usage and Holt's damped linear trend (level + trend, with an EWMA of the
+squared one-step errors as the demand variance), one vector step per day of history.
+
+From the forecast rate and its error each material gets days of cover, a safety stock for the
+configured service level over the lead time, a reorder point and an order-up-to reorder quantity.
+"""
+import math
+from datetime import datetime, timedelta
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from sqlalchemy import String, select, type_coerce
+from sqlalchemy.orm import Session
+from config import (
+    FORECAST_HISTORY_DAYS, FORECAST_ALPHA, FORECAST_BETA, FORECAST_LEAD_TIME_DAYS, FORECAST_REVIEW_DAYS,
+    FORECAST_SERVICE_LEVEL, FORECAST_DAMPING,
+)
+from models import Material, ProductMaterial, ProductSalesRollup
+from services import dashboard_service
+
+# Reported for materials that are not being used
+MAX_DAYS_OF_COVER = 999
+# BOM lines multiplied out at once (each takes a row of ``days`` floats)
+BOM_CHUNK_SIZE = 20000
+
+def history_window(days: int = FORECAST_HISTORY_DAYS, now: Optional[datetime] = None) -> datetime:
+    """First day of the history: the ``days`` complete days before today"""
+    today = dashboard_service.truncate(now or datetime.now(), "day")
+    return today - timedelta(days=days)
+
+def product_sales_matrix(db: Session, days: int = FORECAST_HISTORY_DAYS, now: Optional[datetime] = None):
+    """Units of each product sold per day from the daily rollups: (product ids, matrix of shape (products, days))"""
+    first = history_window(days, now)
+    # Plain Core rows on the session's connection, buckets left as stored: at products x days rows,
+    # ORM row loading and datetime parsing would dominate
+    rows = db.connection().execute(select(
+        ProductSalesRollup.product_id, type_coerce(ProductSalesRollup.bucket_start, String), ProductSalesRollup.units
+    ).where(
+        ProductSalesRollup.granularity == "day",
+        ProductSalesRollup.bucket_start >= first,
+        ProductSalesRollup.bucket_start < first + timedelta(days=days)
+    )).all()
+    if not rows:
+        return [], np.zeros((0, days))
+    product_column, bucket_column, units = zip(*rows)
+    product_ids = sorted(set(product_column))
+    product_index = {product_id: row for row, product_id in enumerate(product_ids)}
+    # At most ``days`` distinct buckets: parse each once
+    day_index = {
+        bucket_start: (dashboard_service.parse_bucket(bucket_start) - first).days for bucket_start in set(bucket_column)
+    }
+    matrix = np.zeros((len(product_ids), days))
+    np.add.at(matrix, (
+        np.fromiter((product_index[product_id] for product_id in product_column), dtype=np.intp, count=len(rows)),
+        np.fromiter((day_index[bucket_start] for bucket_start in bucket_column), dtype=np.intp, count=len(rows)),
+    ), units)
+    return product_ids, matrix
+
+def consumption_matrix(db: Session, material_ids: Sequence[int], days: int = FORECAST_HISTORY_DAYS,
+                       now: Optional[datetime] = None) -> np.ndarray:
+    """Units of each material used per day, shape (len(material_ids), days), oldest day first"""
+    matrix = np.zeros((len(material_ids), days))
+    product_ids, sales = product_sales_matrix(db, days, now)
+    if not product_ids:
+        return matrix
+    material_index = {material_id: row for row, material_id in enumerate(material_ids)}
+    product_index = {product_id: row for row, product_id in enumerate(product_ids)}
+    # BOM lines of the forecast materials for products that sold, grouped by material
+    bom = sorted(
+        (material_index[material_id], product_index[product_id], quantity)
+        for material_id, product_id, quantity in db.query(
+            ProductMaterial.material_id, ProductMaterial.product_id, ProductMaterial.quantity
+        )
+        if material_id in material_index and product_id in product_index
+    )
+    # Usage = BOM quantity x product sales, summed per material, a bounded number of BOM lines at a time
+    for start in range(0, len(bom), BOM_CHUNK_SIZE):
+        materials, products, quantities = (np.array(column) for column in zip(*bom[start:start + BOM_CHUNK_SIZE]))
+        starts = np.flatnonzero(np.r_[True, materials[1:] != materials[:-1]])
+        usage = np.add.reduceat(sales[products] * quantities[:, None], starts, axis=0)
+        # A material split across two chunks gets both partial sums
+        matrix[materials[starts]] += usage
+    return matrix
+
+def ewma(matrix: np.ndarray, alpha: float = FORECAST_ALPHA) -> np.ndarray:
+    """Exponentially weighted mean of each row, the most recent day weighted highest"""
+    days = matrix.shape[1]
+    if days == 0:
+        return np.zeros(matrix.shape[0])
+    # Closed form of the recursion s = alpha * x + (1 - alpha) * s, seeded with the first day
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1)
+    weights[0] = (1 - alpha) ** (days - 1)
+    return matrix @ weights
+
+def holt(matrix: np.ndarray, alpha: float = FORECAST_ALPHA, beta: float = FORECAST_BETA,
+         damping: float = FORECAST_DAMPING):
+    """Holt's damped linear trend over each row: (level, trend per day, one-step error variance)"""
+    materials, days = matrix.shape
+    level = matrix[:, :min(days, 7)].mean(axis=1) if days else np.zeros(materials)
+    trend = np.zeros(materials)
+    variance = np.zeros(materials)
+    for day in range(1, days):
+        observed = matrix[:, day]
+        predicted = level + damping * trend
+        error = observed - predicted
+        variance = alpha * error * error + (1 - alpha) * variance
+        new_level = alpha * observed + (1 - alpha) * predicted
+        trend = beta * (new_level - level) + (1 - beta) * damping * trend
+        level = new_level
+    return level, trend, variance
+
+def forecast(matrix: np.ndarray, quantities: np.ndarray, required: np.ndarray,
+             lead_time: float = FORECAST_LEAD_TIME_DAYS, review: float = FORECAST_REVIEW_DAYS,
+             service_level: float = FORECAST_SERVICE_LEVEL, alpha: float = FORECAST_ALPHA,
+             beta: float = FORECAST_BETA, damping: float = FORECAST_DAMPING) -> Dict[str, np.ndarray]:
+    """Daily demand forecast and reorder figures for every row of a consumption matrix"""
+    level, trend, variance = holt(matrix, alpha, beta, damping)
+    horizon = lead_time + review
+    # Mean of the damped forecast level + trend * (damping + ... + damping^h) over the days a
+    # reorder has to cover; demand is never negative
+    trend_factor = np.cumsum(damping ** np.arange(1, math.ceil(horizon) + 1)).mean()
+    daily = np.maximum(level + trend * trend_factor, 0.0)
+    sigma = np.sqrt(variance)
+    safety_stock = NormalDist().inv_cdf(service_level) * sigma * math.sqrt(lead_time)
+    # Never below the material's minimum stock
+    reorder_point = np.maximum(daily * lead_time + safety_stock, required)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(daily > 0, quantities / daily, MAX_DAYS_OF_COVER)
+    days_of_cover = np.where(quantities <= 0, 0, np.minimum(np.floor(cover), MAX_DAYS_OF_COVER))
+    # Order up to the lead time and review period's demand plus the safety stock, at least the minimum stock
+    reorder_quantity = np.maximum(np.ceil(daily * horizon + safety_stock - np.maximum(quantities, 0)), required)
+    return {
+        "ewma": ewma(matrix, alpha),
+        "daily_demand": daily,
+        "trend": trend,
+        "sigma": sigma,
+        "safety_stock": safety_stock,
+        "reorder_point": reorder_point,
+        "days_of_cover": days_of_cover,
+        "reorder_quantity": reorder_quantity,
+    }
+
+def forecast_materials(db: Session, materials: List[Material], days: int = FORECAST_HISTORY_DAYS,
+                       now: Optional[datetime] = None) -> Dict[int, Dict[str, Any]]:
+    """Forecast and reorder figures per material id"""
+    ids = [material.id for material in materials]
+    result = forecast(
+        consumption_matrix(db, ids, days, now),
+        np.array([material.quantity or 0 for material in materials], dtype=float),
+        np.array([material.required or 0 for material in materials], dtype=float),
+    )
+    columns = {name: values.tolist() for name, values in result.items()}
+    return {
+        material_id: {
+            "daily_demand": round(columns["daily_demand"][row], 2),
+            "ewma_daily_demand": round(columns["ewma"][row], 2),
+            "trend": round(columns["trend"][row], 3),
+            "safety_stock": math.ceil(columns["safety_stock"][row]),
+            "reorder_point": math.ceil(columns["reorder_point"][row]),
+            "days_of_cover": int(columns["days_of_cover"][row]),
+            "reorder_quantity": int(columns["reorder_quantity"][row]),
+        }
+        for row, material_id in enumerate(ids)
+    }
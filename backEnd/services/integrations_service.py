@@ -2,9 +2,11 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from models import Integration
 from schemas import IntegrationCreate, IntegrationUpdate
+from services.pagination import Page, paginate
+from services import response_cache
 
-def get_integrations(db: Session, skip: int = 0, limit: int = 100) -> List[Integration]:
-    return db.query(Integration).offset(skip).limit(limit).all()
+def get_integrations(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> Page:
+    return paginate(db.query(Integration), [Integration.id], cursor=cursor, skip=skip, limit=limit)
 
 def get_integration(db: Session, integration_id: int) -> Optional[Integration]:
     return db.query(Integration).filter(Integration.id == integration_id).first()
@@ -15,6 +17,7 @@ def get_integration_by_name(db: Session, name: str) -> Optional[Integration]:
 def create_integration(db: Session, integration: IntegrationCreate) -> Integration:
     db_integration = Integration(**integration.dict())
     db.add(db_integration)
+    response_cache.invalidate(db, response_cache.INTEGRATIONS)
     db.commit()
     db.refresh(db_integration)
     return db_integration
@@ -28,6 +31,8 @@ def update_integration(db: Session, integration_id: int, integration_update: Int
     for field, value in update_data.items():
         setattr(db_integration, field, value)
     
+    if db.is_modified(db_integration):
+        response_cache.invalidate(db, response_cache.INTEGRATIONS)
     db.commit()
     db.refresh(db_integration)
     return db_integration
@@ -38,6 +43,7 @@ def delete_integration(db: Session, integration_id: int) -> bool:
         return False
     
     db.delete(db_integration)
+    response_cache.invalidate(db, response_cache.INTEGRATIONS)
     db.commit()
     return True
 
@@ -48,6 +54,7 @@ def toggle_integration(db: Session, integration_id: int) -> Optional[Integration
         return None
     
     db_integration.enabled = not db_integration.enabled
+    response_cache.invalidate(db, response_cache.INTEGRATIONS)
     db.commit()
     db.refresh(db_integration)
     return db_integration
@@ -0,0 +1,137 @@
+"""
+Compact, versioned inventory digest for the /api/ai/chat system prompt.
+
+Instead of every material, the prompt gets aggregates over materials, products, orders and the
+order queue, the ``AI_DIGEST_SHORTAGES`` materials closest to running out, and the
+``AI_DIGEST_TOP_K`` materials most relevant to the question (by words shared with their name and
+color). The digest is built once per ``inventory`` data version: material, product, order and
+queue writes bump it in their own transaction (from flush events here, explicitly on Core paths
+such as bulk imports and reservations), so every worker process notices on its next lookup.
+"""
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from config import AI_CHAT_CACHE_TTL_SECONDS, AI_DIGEST_SHORTAGES, AI_DIGEST_TOP_K
+from models import Material, Order, OrderItem, OrderQueue, Product, SETTLED_QUEUE_STATUSES
+from services import dashboard_service, data_versions, forecasting
+
+# Writes that change what the digest describes
+DIGEST_MODELS = (Material, Product, Order, OrderItem, OrderQueue)
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+def normalize_query(query: str) -> str:
+    """Cache key form of a question: case and whitespace do not matter"""
+    return " ".join(query.lower().split())
+
+class Digest:
+    def __init__(self, version: int, summary: Dict[str, Any], shortages: List[Dict[str, Any]],
+                 materials: List[Dict[str, Any]]):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.summary = summary
+        self.shortages = shortages
+        self.materials = materials
+        # word -> indexes of the materials whose name or color contains it
+        self._index = defaultdict(list)
+        for position, material in enumerate(materials):
+            for word in set(_words(f"{material['name']} {material['color']}")):
+                self._index[word].append(position)
+
+    def relevant(self, query: str, top_k: int = AI_DIGEST_TOP_K) -> List[Dict[str, Any]]:
+        """Materials sharing the most words with the question, the ones with the least cover first"""
+        scores = Counter()
+        for word in set(_words(query)):
+            for position in self._index.get(word, ()):
+                scores[position] += 1
+        ranked = sorted(scores, key=lambda position: (-scores[position], self.materials[position]["days_of_cover"], position))
+        return [self.materials[position] for position in ranked[:top_k]]
+
+    def context_for(self, query: str, top_k: int = AI_DIGEST_TOP_K) -> Dict[str, Any]:
+        return {
+            "summary": self.summary,
+            "shortages": self.shortages,
+            "relevant_materials": self.relevant(query, top_k),
+        }
+
+def build_digest(db: Session, version: int, shortages: int = AI_DIGEST_SHORTAGES,
+                 now: Optional[datetime] = None) -> Digest:
+    now = now or datetime.now()
+    materials = db.query(Material).all()
+    forecasts = forecasting.forecast_materials(db, materials, now=now)
+    rows = [
+        {
+            "id": material.id, "name": material.name, "color": material.color, "quantity": material.quantity or 0,
+            "unit": material.unit, "required": material.required or 0,
+            "daily_demand": forecasts[material.id]["daily_demand"],
+            "days_of_cover": forecasts[material.id]["days_of_cover"],
+        }
+        for material in materials
+    ]
+    recent_orders, recent_revenue = db.query(func.count(Order.id), func.coalesce(func.sum(Order.total), 0)).filter(
+        Order.order_date >= now - timedelta(days=30)
+    ).one()
+    open_queue, blocked = db.query(
+        func.count(OrderQueue.id), dashboard_service.count_if(OrderQueue.can_fulfill.is_(False))
+    ).filter(OrderQueue.status.notin_(SETTLED_QUEUE_STATUSES)).one()
+    summary = {
+        "materials": len(rows),
+        "out_of_stock": sum(1 for row in rows if row["quantity"] <= 0),
+        "below_required": sum(1 for row in rows if row["quantity"] < row["required"]),
+        "products": db.query(func.count(Product.id)).scalar(),
+        "orders_last_30_days": recent_orders,
+        "revenue_last_30_days": round(recent_revenue, 2),
+        "open_queue_orders": open_queue,
+        "blocked_queue_orders": int(blocked),
+        "date": now.date().isoformat(),
+    }
+    at_risk = [row for row in rows if row["quantity"] < row["required"] or row["days_of_cover"] <= 14]
+    at_risk.sort(key=lambda row: (row["days_of_cover"], row["quantity"] - row["required"], row["id"]))
+    return Digest(version, summary, at_risk[:shortages], rows)
+
+class DigestCache:
+    """The digest of the current inventory version, rebuilt on first use after a change"""
+
+    def __init__(self, max_age: float = AI_CHAT_CACHE_TTL_SECONDS):
+        self.max_age = max_age
+        self.digest: Optional[Digest] = None
+        self.builds = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> Digest:
+        version = data_versions.get_version(db, data_versions.INVENTORY)
+        with self._lock:
+            digest = self.digest
+            # Also rebuilt when old: the forecast and the 30-day window move with the date
+            if digest is None or digest.version != version or time.monotonic() - digest.built_at > self.max_age:
+                digest = self.digest = build_digest(db, version)
+                self.builds += 1
+            return digest
+
+    def status(self) -> Dict[str, Any]:
+        digest = self.digest
+        return {
+            "version": digest.version if digest else None,
+            "age_seconds": round(time.monotonic() - digest.built_at, 1) if digest else None,
+            "materials": len(digest.materials) if digest else None,
+            "builds": self.builds,
+        }
+
+digest_cache = DigestCache()
+
+def record_change(db: Session):
+    """Bump the inventory version for writes that bypass the ORM (bulk inserts, Core updates)"""
+    data_versions.bump_version(db.connection(), data_versions.INVENTORY)
+
+@event.listens_for(Session, "after_flush")
+def _bump_inventory_version(session, flush_context):
+    for objects in (session.new, session.dirty, session.deleted):
+        if any(isinstance(obj, DIGEST_MODELS) for obj in objects):
+            record_change(session)
+            return
@@ -0,0 +1,152 @@
+"""
+Shared async client for the OpenAI-compatible chat completions API.
+
+Every request in a process goes through one ``openai.AsyncOpenAI`` client, so HTTP connections
+are pooled and reused instead of opened per chat. At most ``LLM_MAX_CONCURRENCY`` completions are
+in flight at once; further callers wait up to ``LLM_QUEUE_TIMEOUT_SECONDS`` for a slot and then
+get ``LLMBusy``. Connection errors, timeouts, 429s and 5xx responses are retried up to
+``LLM_MAX_RETRIES`` times with full-jitter exponential backoff (the slot is released while
+waiting); a streamed completion is only retried until its first token has been sent.
+"""
+import asyncio
+import random
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+import httpx
+import openai
+from config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, OPENAI_MODEL, LLM_MAX_CONCURRENCY, LLM_TIMEOUT_SECONDS,
+    LLM_CONNECT_TIMEOUT_SECONDS, LLM_MAX_RETRIES, LLM_BACKOFF_BASE_SECONDS, LLM_BACKOFF_MAX_SECONDS,
+    LLM_QUEUE_TIMEOUT_SECONDS,
+)
+
+# Failures worth another attempt (APITimeoutError is an APIConnectionError)
+RETRYABLE_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+class LLMBusy(Exception):
+    """No completion slot became free within the queue timeout"""
+    pass
+
+class LLMClient:
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, timeout: float = LLM_TIMEOUT_SECONDS,
+                 connect_timeout: float = LLM_CONNECT_TIMEOUT_SECONDS, max_retries: int = LLM_MAX_RETRIES,
+                 backoff_base: float = LLM_BACKOFF_BASE_SECONDS, backoff_max: float = LLM_BACKOFF_MAX_SECONDS,
+                 queue_timeout: float = LLM_QUEUE_TIMEOUT_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+        self._client: Optional[openai.AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+
+    def _bind(self):
+        # The client's connections and the slots belong to the event loop they were first used in
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._client = None
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        self._bind()
+        if self._client is None:
+            pool = httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+            self._client = openai.AsyncOpenAI(
+                api_key=OPENAI_API_KEY or "unset",
+                base_url=OPENAI_BASE_URL or None,
+                timeout=self.timeout,
+                max_retries=0,  # retried here, with jitter and outside the concurrency slot
+                http_client=httpx.AsyncClient(limits=pool, timeout=self.timeout),
+            )
+        return self._client
+
+    @asynccontextmanager
+    async def _slot(self):
+        self._bind()
+        semaphore = self._semaphore
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise LLMBusy(f"All {self.max_concurrency} LLM slots stayed busy for {self.queue_timeout:g}s")
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.requests += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+
+    async def _backoff(self, attempt: int):
+        self.retries += 1
+        await asyncio.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+
+    async def complete(self, messages: List[Dict[str, str]], **params) -> str:
+        """The full answer to a chat completion"""
+        params.setdefault("model", OPENAI_MODEL)
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._slot():
+                    response = await self.client.chat.completions.create(messages=messages, **params)
+                return response.choices[0].message.content or ""
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_retries:
+                    self.failures += 1
+                    raise
+            await self._backoff(attempt)
+
+    async def stream(self, messages: List[Dict[str, str]], **params) -> AsyncIterator[str]:
+        """The answer to a chat completion, as its tokens arrive"""
+        params.setdefault("model", OPENAI_MODEL)
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                async with self._slot():
+                    response = await self.client.chat.completions.create(messages=messages, stream=True, **params)
+                    try:
+                        async for chunk in response:
+                            token = chunk.choices[0].delta.content if chunk.choices else None
+                            if token:
+                                started = True
+                                yield token
+                    finally:
+                        # Give the connection back to the pool, also when the caller stops early
+                        await response.response.aclose()
+                return
+            except RETRYABLE_ERRORS:
+                if started or attempt == self.max_retries:
+                    self.failures += 1
+                    raise
+            await self._backoff(attempt)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+        self._loop = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+llm_client = LLMClient()
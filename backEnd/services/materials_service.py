@@ -2,9 +2,12 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from models import Material, OrderQueue
 from schemas import MaterialCreate, MaterialUpdate, OrderQueueCreate, OrderQueueUpdate
+from services.pagination import Page, paginate
+from services import products_service, reservations_service, response_cache
+from services.bom_index import bom_index
 
-def get_materials(db: Session, skip: int = 0, limit: int = 100) -> List[Material]:
-    return db.query(Material).offset(skip).limit(limit).all()
+def get_materials(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> Page:
+    return paginate(db.query(Material), [Material.id], cursor=cursor, skip=skip, limit=limit)
 
 def get_material(db: Session, material_id: int) -> Optional[Material]:
     return db.query(Material).filter(Material.id == material_id).first()
@@ -16,6 +19,7 @@ def create_material(db: Session, material: MaterialCreate) -> Material:
         material_data['quantity'] = 0
     db_material = Material(**material_data)
     db.add(db_material)
+    response_cache.invalidate(db, response_cache.MATERIALS)
     db.commit()
     db.refresh(db_material)
     return db_material
@@ -26,12 +30,24 @@ def update_material(db: Session, material_id: int, material_update: MaterialUpda
         return None
     
     update_data = material_update.dict(exclude_unset=True)
+    previous_quantity = db_material.quantity
+    previous_name = db_material.name
     for field, value in update_data.items():
         # Ensure quantity is always a valid integer
         if field == 'quantity' and value is None:
             value = 0
         setattr(db_material, field, value)
     
+    if db.is_modified(db_material):
+        response_cache.invalidate(db, response_cache.MATERIALS)
+    if db_material.quantity != previous_quantity:
+        # Stock changed: refresh can_build for the products using this material, same transaction
+        db.flush()
+        products_service.recalculate_can_build_for_materials(db, [material_id])
+    
+    # The products list shows the name and stock of each BOM line's material
+    if (db_material.name, db_material.quantity) != (previous_name, previous_quantity) and bom_index.products_for(db, [material_id]):
+        response_cache.invalidate(db, response_cache.PRODUCTS)
     db.commit()
     db.refresh(db_material)
     return db_material
@@ -41,13 +57,19 @@ def delete_material(db: Session, material_id: int) -> bool:
     if db_material is None:
         return False
     
+    affected_products = bom_index.products_for(db, [material_id])
     db.delete(db_material)
+    response_cache.invalidate(db, response_cache.MATERIALS)
+    if affected_products:
+        db.flush()
+        products_service.recalculate_can_build(db, affected_products)
+        response_cache.invalidate(db, response_cache.PRODUCTS)
     db.commit()
     return True
 
 # Order Queue functions
-def get_order_queue(db: Session, skip: int = 0, limit: int = 100) -> List[OrderQueue]:
-    return db.query(OrderQueue).offset(skip).limit(limit).all()
+def get_order_queue(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> Page:
+    return paginate(db.query(OrderQueue), [OrderQueue.created_at, OrderQueue.id], cursor=cursor, skip=skip, limit=limit)
 
 def get_order_queue_item(db: Session, order_id: str) -> Optional[OrderQueue]:
     return db.query(OrderQueue).filter(OrderQueue.id == order_id).first()
@@ -68,6 +90,10 @@ def update_order_queue_status(db: Session, order_id: str, order_update: OrderQue
     for field, value in update_data.items():
         setattr(db_order, field, value)
     
+    if "status" in update_data:
+        # Completed uses reserved stock up; leaving Reserved any other way gives it back
+        reservations_service.settle_status_change(db, order_id, db_order.status)
+    
     db.commit()
     db.refresh(db_order)
     return db_order
@@ -77,6 +103,7 @@ def delete_order_queue_item(db: Session, order_id: str) -> bool:
     if db_order is None:
         return False
     
+    reservations_service.release_all(db, order_id)
     db.delete(db_order)
     db.commit()
     return True
@@ -0,0 +1,309 @@
+"""
+Order rollups for historical analytics: orders and revenue per status (``order_status_rollups``)
+and units, revenue and order lines per product (``product_sales_rollups``), in hourly and daily
+buckets of the order's created_at (for bulk-imported orders, their order_date).
+
+Like the dashboard counters, they are updated in the same transaction as the ORM writes that
+change orders and order items (Session flush events), so create_order, update_order and
+delete_order keep them current. Core/bulk inserts report their rows through ``record_orders``.
+``rebuild_rollups`` backfills them from the source tables and ``check_rollups`` compares them
+against a raw aggregation.
+"""
+from sqlalchemy import event, select, func, delete
+from sqlalchemy.orm import Session
+from typing import Dict, Any, Optional, List, Iterable, Tuple
+from datetime import datetime, timedelta
+from collections import defaultdict
+from models import Order, OrderItem, Product, OrderStatusRollup, ProductSalesRollup
+from services import dashboard_service
+from services.dashboard_counters import upsert_add, _current_values, _previous_values, _has_changes
+
+# Rollup granularities; week series are summed from the daily rows
+GRANULARITIES = ("hour", "day")
+ORDER_ATTRS = ("created_at", "status", "total")
+ITEM_ATTRS = ("order_id", "product_id", "quantity", "price")
+# Maximum number of ids per IN (...) clause
+CHUNK_SIZE = 500
+# Rows per executemany when backfilling
+INSERT_CHUNK_SIZE = 10000
+
+class _RollupDeltas:
+    """Accumulates rollup deltas for one flush or bulk operation"""
+
+    def __init__(self):
+        self.statuses = defaultdict(lambda: [0, 0.0])
+        self.products = defaultdict(lambda: [0, 0.0, 0])
+        # New orders and items: the order's created_at is a server default, read after the INSERT
+        self.pending_orders = []
+        self.pending_items = []
+
+    def add_order(self, created_at: Optional[datetime] = None, status: Optional[str] = None, total: Optional[float] = None, sign: int = 1):
+        if created_at is None:
+            return
+        for granularity in GRANULARITIES:
+            row = self.statuses[(granularity, dashboard_service.truncate(created_at, granularity), status)]
+            row[0] += sign
+            row[1] += sign * (total or 0.0)
+
+    def add_item(self, created_at: Optional[datetime], product_id: int, quantity: Optional[int], price: Optional[float], sign: int = 1):
+        if created_at is None:
+            return
+        for granularity in GRANULARITIES:
+            row = self.products[(granularity, dashboard_service.truncate(created_at, granularity), product_id)]
+            row[0] += sign * (quantity or 0)
+            row[1] += sign * (quantity or 0) * (price or 0.0)
+            row[2] += sign
+
+    def __bool__(self):
+        return bool(self.statuses or self.products or self.pending_orders or self.pending_items)
+
+def _created_at_by_order(connection, order_ids: Iterable[str]) -> Dict[str, datetime]:
+    order_ids = list(set(order_ids))
+    created = {}
+    for start in range(0, len(order_ids), CHUNK_SIZE):
+        created.update(connection.execute(
+            select(Order.id, Order.created_at).where(Order.id.in_(order_ids[start:start + CHUNK_SIZE]))
+        ).all())
+    return created
+
+@event.listens_for(Session, "before_flush")
+def _collect_rollup_deltas(session, flush_context, instances):
+    deltas = session.info.setdefault("rollup_deltas", _RollupDeltas())
+    # (item values, sign) for items whose order's created_at must be looked up
+    items = []
+    # Orders whose created_at moves take their items along: {order_id: (old, new)}
+    moved = {}
+
+    for obj in session.new:
+        if isinstance(obj, Order):
+            deltas.pending_orders.append(obj)
+        elif isinstance(obj, OrderItem):
+            deltas.pending_items.append(obj)
+    for obj in session.dirty:
+        if isinstance(obj, Order) and session.is_modified(obj) and _has_changes(obj, ORDER_ATTRS):
+            old, new = _previous_values(session, obj, ORDER_ATTRS), _current_values(obj, ORDER_ATTRS)
+            deltas.add_order(**old, sign=-1)
+            deltas.add_order(**new)
+            if old.get("created_at") != new["created_at"]:
+                moved[obj.id] = (old.get("created_at"), new["created_at"])
+        elif isinstance(obj, OrderItem) and session.is_modified(obj) and _has_changes(obj, ITEM_ATTRS):
+            items.append((_previous_values(session, obj, ITEM_ATTRS), -1))
+            items.append((_current_values(obj, ITEM_ATTRS), 1))
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            deltas.add_order(**_current_values(obj, ORDER_ATTRS), sign=-1)
+        elif isinstance(obj, OrderItem):
+            items.append((_current_values(obj, ITEM_ATTRS), -1))
+
+    if not (items or moved):
+        return
+    connection = session.connection()
+    # The orders still hold their committed created_at at this point
+    created = _created_at_by_order(connection, [values["order_id"] for values, _ in items])
+    for values, sign in items:
+        deltas.add_item(created.get(values["order_id"]), values["product_id"], values["quantity"], values["price"], sign)
+    moved_ids = list(moved)
+    for start in range(0, len(moved_ids), CHUNK_SIZE):
+        for order_id, product_id, quantity, price in connection.execute(
+            select(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity, OrderItem.price)
+            .where(OrderItem.order_id.in_(moved_ids[start:start + CHUNK_SIZE]))
+        ):
+            old, new = moved[order_id]
+            deltas.add_item(old, product_id, quantity, price, sign=-1)
+            deltas.add_item(new, product_id, quantity, price)
+
+@event.listens_for(Session, "after_flush")
+def _apply_rollup_deltas(session, flush_context):
+    deltas = session.info.pop("rollup_deltas", None)
+    if not deltas:
+        return
+    connection = session.connection()
+    if deltas.pending_orders or deltas.pending_items:
+        created = _created_at_by_order(connection, [obj.id for obj in deltas.pending_orders] +
+                                       [obj.order_id for obj in deltas.pending_items])
+        for obj in deltas.pending_orders:
+            values = _current_values(obj, ORDER_ATTRS)
+            deltas.add_order(created.get(obj.id), values["status"], values["total"])
+        for obj in deltas.pending_items:
+            deltas.add_item(created.get(obj.order_id), obj.product_id, obj.quantity, obj.price)
+    _write_deltas(connection, deltas)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rollup_deltas(session, previous_transaction):
+    session.info.pop("rollup_deltas", None)
+
+def _write_deltas(connection, deltas: _RollupDeltas):
+    upsert_add(connection, OrderStatusRollup.__table__, ["granularity", "bucket_start", "status"], [
+        {"granularity": granularity, "bucket_start": bucket, "status": status, "orders": orders, "revenue": revenue}
+        for (granularity, bucket, status), (orders, revenue) in deltas.statuses.items() if orders or revenue
+    ], ["orders", "revenue"])
+    upsert_add(connection, ProductSalesRollup.__table__, ["granularity", "bucket_start", "product_id"], [
+        {"granularity": granularity, "bucket_start": bucket, "product_id": product_id,
+         "units": units, "revenue": revenue, "lines": lines}
+        for (granularity, bucket, product_id), (units, revenue, lines) in deltas.products.items() if units or revenue or lines
+    ], ["units", "revenue", "lines"])
+
+def record_orders(db: Session, orders: Iterable[Dict[str, Any]], items: Iterable[Dict[str, Any]]):
+    """Account for orders and items inserted with Core/bulk statements.
+
+    ``orders`` carry created_at, status and total; ``items`` carry product_id, quantity, price
+    and the created_at of their order.
+    """
+    deltas = _RollupDeltas()
+    for order in orders:
+        deltas.add_order(order["created_at"], order["status"], order["total"])
+    for item in items:
+        deltas.add_item(item["created_at"], item["product_id"], item["quantity"], item["price"])
+    _write_deltas(db.connection(), deltas)
+
+# Backfill and verification
+def _raw_status_rows(db: Session, granularity: str):
+    bucket = dashboard_service.bucket_expression(db, Order.created_at, granularity)
+    return db.execute(
+        select(bucket, Order.status, func.count(Order.id), func.coalesce(func.sum(Order.total), 0))
+        .where(Order.created_at.isnot(None)).group_by(bucket, Order.status)
+    )
+
+def _raw_product_rows(db: Session, granularity: str):
+    bucket = dashboard_service.bucket_expression(db, Order.created_at, granularity)
+    return db.execute(
+        select(
+            bucket, OrderItem.product_id, func.coalesce(func.sum(OrderItem.quantity), 0),
+            func.coalesce(func.sum(OrderItem.quantity * OrderItem.price), 0), func.count(OrderItem.id)
+        ).join(Order, Order.id == OrderItem.order_id)
+        .where(Order.created_at.isnot(None)).group_by(bucket, OrderItem.product_id)
+    )
+
+def _raw_rollups(db: Session) -> Tuple[Dict[tuple, tuple], Dict[tuple, tuple]]:
+    statuses, products = {}, {}
+    for granularity in GRANULARITIES:
+        for bucket, status, orders, revenue in _raw_status_rows(db, granularity):
+            statuses[(granularity, dashboard_service.parse_bucket(bucket), status)] = (orders, revenue)
+        for bucket, product_id, units, revenue, lines in _raw_product_rows(db, granularity):
+            products[(granularity, dashboard_service.parse_bucket(bucket), product_id)] = (units, revenue, lines)
+    return statuses, products
+
+def _insert_chunked(db: Session, table, rows: List[Dict[str, Any]]):
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        db.execute(table.insert(), rows[start:start + INSERT_CHUNK_SIZE])
+
+def rebuild_rollups(db: Session) -> Dict[str, int]:
+    """Recompute both rollup tables from orders and order items and commit"""
+    statuses, products = _raw_rollups(db)
+    db.execute(delete(OrderStatusRollup))
+    db.execute(delete(ProductSalesRollup))
+    _insert_chunked(db, OrderStatusRollup.__table__, [
+        {"granularity": granularity, "bucket_start": bucket, "status": status, "orders": orders, "revenue": revenue}
+        for (granularity, bucket, status), (orders, revenue) in statuses.items()
+    ])
+    _insert_chunked(db, ProductSalesRollup.__table__, [
+        {"granularity": granularity, "bucket_start": bucket, "product_id": product_id,
+         "units": units, "revenue": revenue, "lines": lines}
+        for (granularity, bucket, product_id), (units, revenue, lines) in products.items()
+    ])
+    db.commit()
+    return {"order_status_rollups": len(statuses), "product_sales_rollups": len(products)}
+
+def _stored(db: Session, model, key_columns, value_columns) -> Dict[tuple, tuple]:
+    rows = db.execute(select(model.granularity, model.bucket_start, *key_columns, *value_columns))
+    stored = {}
+    for row in rows:
+        values = tuple(row[3:])
+        # Rows netted to zero by later writes (up to float rounding) are equivalent to missing rows
+        if any(abs(value or 0) > 0.005 for value in values):
+            stored[(row[0], row[1], *row[2:3])] = values
+    return stored
+
+def check_rollups(db: Session, limit: int = 20) -> Dict[str, Any]:
+    """Compare the rollup tables against a raw aggregation of orders and order items"""
+    raw_statuses, raw_products = _raw_rollups(db)
+    tables = {
+        "order_status_rollups": (raw_statuses, _stored(
+            db, OrderStatusRollup, [OrderStatusRollup.status], [OrderStatusRollup.orders, OrderStatusRollup.revenue])),
+        "product_sales_rollups": (raw_products, _stored(
+            db, ProductSalesRollup, [ProductSalesRollup.product_id],
+            [ProductSalesRollup.units, ProductSalesRollup.revenue, ProductSalesRollup.lines])),
+    }
+    mismatches = []
+    for table, (raw, stored) in tables.items():
+        for key in raw.keys() | stored.keys():
+            expected, actual = raw.get(key), stored.get(key)
+            if expected is None or actual is None or any(abs((a or 0) - (e or 0)) > 0.01 for a, e in zip(actual, expected)):
+                mismatches.append({
+                    "table": table, "granularity": key[0], "bucket_start": key[1].isoformat(), "key": key[2],
+                    "rollup": actual, "raw": expected,
+                })
+    return {
+        "consistent": not mismatches,
+        "mismatch_count": len(mismatches),
+        "mismatches": mismatches[:limit],
+        "checked_at": datetime.now().isoformat(),
+    }
+
+# Series
+def _window(days: int, granularity: str, now: Optional[datetime]) -> Tuple[datetime, datetime]:
+    """First and last bucket of the last ``days`` days (today included)"""
+    now = now or datetime.now()
+    window_start = dashboard_service.truncate(now - timedelta(days=days - 1), "day")
+    return dashboard_service.truncate(window_start, granularity), dashboard_service.truncate(now, granularity)
+
+def _source_granularity(granularity: str) -> str:
+    return "hour" if granularity == "hour" else "day"
+
+def _zero_filled(totals: Dict[datetime, tuple], first: datetime, last: datetime, granularity: str, names: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    step = dashboard_service.GRANULARITIES[granularity]
+    series = []
+    start = first
+    while start <= last:
+        values = totals.get(start, (0,) * len(names))
+        row = {"date": start.isoformat() if granularity == "hour" else start.date().isoformat()}
+        for name, value in zip(names, values):
+            row[name] = round(value or 0.0, 2) if name == "revenue" else int(value or 0)
+        series.append(row)
+        start += step
+    return series
+
+def get_order_series(db: Session, days: int = 30, granularity: str = "day", status: Optional[str] = None,
+                     now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Orders and revenue per hour/day/week over the last ``days`` days, zero-filled; weeks start on Monday"""
+    first, last = _window(days, granularity, now)
+    bucket = dashboard_service.bucket_expression(db, OrderStatusRollup.bucket_start, granularity)
+    query = db.query(bucket, func.sum(OrderStatusRollup.orders), func.sum(OrderStatusRollup.revenue)).filter(
+        OrderStatusRollup.granularity == _source_granularity(granularity),
+        OrderStatusRollup.bucket_start >= first
+    )
+    if status is not None:
+        query = query.filter(OrderStatusRollup.status == status)
+    totals = {dashboard_service.parse_bucket(start): (orders, revenue) for start, orders, revenue in query.group_by(bucket)}
+    return _zero_filled(totals, first, last, granularity, ("orders", "revenue"))
+
+def get_product_series(db: Session, product_id: int, days: int = 30, granularity: str = "day",
+                       now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Units, revenue and order lines of one product per hour/day/week, zero-filled"""
+    first, last = _window(days, granularity, now)
+    bucket = dashboard_service.bucket_expression(db, ProductSalesRollup.bucket_start, granularity)
+    rows = db.query(
+        bucket, func.sum(ProductSalesRollup.units), func.sum(ProductSalesRollup.revenue), func.sum(ProductSalesRollup.lines)
+    ).filter(
+        ProductSalesRollup.product_id == product_id,
+        ProductSalesRollup.granularity == _source_granularity(granularity),
+        ProductSalesRollup.bucket_start >= first
+    ).group_by(bucket)
+    totals = {dashboard_service.parse_bucket(start): (units, revenue, lines) for start, units, revenue, lines in rows}
+    return _zero_filled(totals, first, last, granularity, ("units", "revenue", "lines"))
+
+def get_top_products(db: Session, days: int = 30, limit: int = 20, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Products by units sold over the last ``days`` days, from the daily rollups"""
+    first, _ = _window(days, "day", now)
+    units = func.sum(ProductSalesRollup.units)
+    rows = db.query(
+        ProductSalesRollup.product_id, Product.name, units,
+        func.sum(ProductSalesRollup.revenue), func.sum(ProductSalesRollup.lines)
+    ).outerjoin(Product, Product.id == ProductSalesRollup.product_id).filter(
+        ProductSalesRollup.granularity == "day",
+        ProductSalesRollup.bucket_start >= first
+    ).group_by(ProductSalesRollup.product_id, Product.name).having(units > 0).order_by(units.desc(), ProductSalesRollup.product_id).limit(limit)
+    return [
+        {"product_id": product_id, "name": name, "units": int(units or 0), "revenue": round(revenue or 0.0, 2), "lines": int(lines or 0)}
+        for product_id, name, units, revenue, lines in rows
+    ]
@@ -1,28 +1,37 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from models import Order, OrderItem, Shortage, Material
+from sqlalchemy import func, bindparam
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional, Dict, Tuple
+from datetime import datetime
+from collections import defaultdict
+from models import Order, OrderItem, OrderQueue, Reservation, Shortage, Material, ProductMaterial, SETTLED_QUEUE_STATUSES
 from schemas import OrderCreate, OrderUpdate, OrderItemCreate, ShortageCreate
+from services.pagination import Page, paginate
+# order_rollups and the inventory digest version are updated by Session flush events on the order writes below
+from services import dashboard_counters, order_rollups, inventory_digest, reservations_service
 
-def get_orders(db: Session, skip: int = 0, limit: int = 100) -> List[Order]:
-    return db.query(Order).offset(skip).limit(limit).all()
+# Maximum number of ids per IN (...) clause
+CHUNK_SIZE = 500
+
+# Queue rows still competing for stock; the statuses are rendered inline so SQLite can use the
+# partial index ix_order_queue_open
+OPEN_QUEUE = OrderQueue.status.notin_(
+    bindparam("settled_statuses", list(SETTLED_QUEUE_STATUSES), expanding=True, literal_execute=True)
+)
+
+def get_orders(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> Page:
+    query = db.query(Order).options(selectinload(Order.items))
+    return paginate(query, [Order.created_at, Order.id], cursor=cursor, skip=skip, limit=limit)
 
 def get_order(db: Session, order_id: str) -> Optional[Order]:
-    return db.query(Order).filter(Order.id == order_id).first()
+    return db.query(Order).options(selectinload(Order.items)).filter(Order.id == order_id).first()
 
 def create_order(db: Session, order: OrderCreate) -> Order:
-    # Create the order
+    # Create the order and its items in one transaction
     db_order = Order(**order.dict(exclude={'items'}))
+    db_order.items = [OrderItem(**item_data.dict()) for item_data in order.items]
     db.add(db_order)
     db.commit()
     db.refresh(db_order)
-    
-    # Create order items
-    for item_data in order.items:
-        db_item = OrderItem(**item_data.dict(), order_id=db_order.id)
-        db.add(db_item)
-    
-    db.commit()
-    db.refresh(db_order)
     return db_order
 
 def update_order(db: Session, order_id: str, order_update: OrderUpdate) -> Optional[Order]:
@@ -43,42 +52,131 @@ def delete_order(db: Session, order_id: str) -> bool:
     if db_order is None:
         return False
     
+    # Give reserved stock back, then drop the reservations, which reference the order
+    reservations_service.release_all(db, order_id)
+    db.query(Reservation).filter(Reservation.order_id == order_id).delete(synchronize_session=False)
     db.delete(db_order)
     db.commit()
     return True
 
-def check_order_shortages(db: Session, order_id: str) -> List[Shortage]:
-    """Check for material shortages for an order"""
-    order = get_order(db, order_id)
-    if not order:
-        return []
+def _priority_order_ids(db: Session, order_ids: Optional[List[str]]) -> List[str]:
+    """Order ids in fulfillment priority: queue position (order_date, id) for the whole queue"""
+    if order_ids is None:
+        return [order_id for (order_id,) in db.query(OrderQueue.id).filter(
+            OPEN_QUEUE
+        ).order_by(OrderQueue.order_date, OrderQueue.id)]
+    
+    rows = []
+    order_ids = list(dict.fromkeys(order_ids))
+    for start in range(0, len(order_ids), CHUNK_SIZE):
+        rows.extend(db.query(Order.id, Order.order_date).filter(Order.id.in_(order_ids[start:start + CHUNK_SIZE])).all())
+    rows.sort(key=lambda row: (row.order_date is None, row.order_date or datetime.min, row.id))
+    return [row.id for row in rows]
+
+def get_material_demand(db: Session, order_ids: List[str]) -> Dict[str, Dict[int, int]]:
+    """Units of each material needed per order: SUM(order_items.quantity * product_materials.quantity)"""
+    demand = defaultdict(dict)
+    for start in range(0, len(order_ids), CHUNK_SIZE):
+        rows = db.query(
+            OrderItem.order_id,
+            ProductMaterial.material_id,
+            func.sum(OrderItem.quantity * ProductMaterial.quantity)
+        ).join(
+            ProductMaterial, ProductMaterial.product_id == OrderItem.product_id
+        ).filter(
+            OrderItem.order_id.in_(order_ids[start:start + CHUNK_SIZE])
+        ).group_by(OrderItem.order_id, ProductMaterial.material_id)
+        for order_id, material_id, needed in rows:
+            demand[order_id][material_id] = int(needed or 0)
+    return demand
+
+def _allocate_stock(db: Session, ordered_ids: List[str]) -> Dict[str, List[Shortage]]:
+    demand = get_material_demand(db, ordered_ids)
     
-    shortages = []
+    material_ids = sorted({material_id for needs in demand.values() for material_id in needs})
+    materials = {}
+    for start in range(0, len(material_ids), CHUNK_SIZE):
+        for material in db.query(Material.id, Material.name, Material.quantity).filter(
+            Material.id.in_(material_ids[start:start + CHUNK_SIZE])
+        ):
+            materials[material.id] = material
+    remaining = {material_id: material.quantity or 0 for material_id, material in materials.items()}
     
-    for item in order.items:
-        # Get product materials (BOM)
-        product = item.product
-        if not product or not product.materials:
+    shortages = {}
+    for order_id in ordered_ids:
+        needs = {material_id: needed for material_id, needed in demand.get(order_id, {}).items() if material_id in materials}
+        short = [material_id for material_id, needed in needs.items() if needed > remaining[material_id]]
+        if not short:
+            for material_id, needed in needs.items():
+                remaining[material_id] -= needed
             continue
-            
-        for material in product.materials:
-            # Calculate total needed for this order item
-            needed = item.quantity * 1  # Assuming 1 material per product for simplicity
-            available = material.quantity
-            
-            if needed > available:
-                shortage = Shortage(
-                    order_id=order_id,
-                    material_id=material.id,
-                    material_name=material.name,
-                    needed=needed,
-                    available=available,
-                    short=needed - available
-                )
-                shortages.append(shortage)
+        
+        shortages[order_id] = []
+        for material_id in sorted(short):
+            available = max(remaining[material_id], 0)
+            shortages[order_id].append(Shortage(
+                order_id=order_id,
+                material_id=material_id,
+                material_name=materials[material_id].name,
+                needed=needs[material_id],
+                available=available,
+                short=needs[material_id] - available
+            ))
     
     return shortages
 
+def check_shortages_batch(db: Session, order_ids: Optional[List[str]] = None) -> Dict[str, List[Shortage]]:
+    """Check material shortages for many orders at once (the whole open order queue by default).
+    
+    Orders are served in priority order against the current stock, using the real BOM
+    quantities. An order that can be fully supplied consumes its materials; an order that
+    cannot is reported short and consumes nothing, leaving the stock to later orders.
+    Returns unsaved Shortage records keyed by order id (only orders with shortages).
+    """
+    return _allocate_stock(db, _priority_order_ids(db, order_ids))
+
+def check_order_shortages(db: Session, order_id: str) -> List[Shortage]:
+    """Check for material shortages for an order"""
+    return check_shortages_batch(db, [order_id]).get(order_id, [])
+
+def save_shortages(db: Session, order_ids: List[str], shortages: Dict[str, List[Shortage]]) -> int:
+    """Replace the stored shortages of the given orders with one bulk delete and one bulk insert"""
+    order_ids = list(order_ids)
+    for start in range(0, len(order_ids), CHUNK_SIZE):
+        chunk = order_ids[start:start + CHUNK_SIZE]
+        existing = db.query(Shortage.short).filter(Shortage.order_id.in_(chunk)).all()
+        if existing:
+            db.query(Shortage).filter(Shortage.order_id.in_(chunk)).delete(synchronize_session=False)
+            dashboard_counters.record_rows(db, Shortage, [{"short": row.short} for row in existing], sign=-1)
+    
+    rows = [
+        {
+            "order_id": shortage.order_id,
+            "material_id": shortage.material_id,
+            "material_name": shortage.material_name,
+            "needed": shortage.needed,
+            "available": shortage.available,
+            "short": shortage.short
+        }
+        for order_shortages in shortages.values()
+        for shortage in order_shortages
+    ]
+    if rows:
+        db.execute(Shortage.__table__.insert(), rows)
+        dashboard_counters.record_rows(db, Shortage, rows)
+    db.commit()
+    return len(rows)
+
+def refresh_shortages(db: Session, order_ids: Optional[List[str]] = None) -> Tuple[List[str], Dict[str, List[Shortage]]]:
+    """Recompute and persist shortages for the given orders (the whole open queue by default).
+    
+    Returns the ids checked, in priority order, and the shortages found.
+    """
+    checked_ids = _priority_order_ids(db, order_ids)
+    shortages = _allocate_stock(db, checked_ids)
+    save_shortages(db, checked_ids, shortages)
+    return checked_ids, shortages
+
 def create_shortage(db: Session, shortage: ShortageCreate) -> Shortage:
     db_shortage = Shortage(**shortage.dict())
     db.add(db_shortage)
@@ -0,0 +1,83 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+Each list is ordered by a unique key - ``(id,)`` or ``(created_at, id)`` - and a page after a
+cursor is fetched with ``WHERE (key) > (:last_key) ORDER BY key LIMIT n``, which an index on the
+key serves in constant time however deep the page is. Cursors are opaque URL-safe tokens that
+hold the raw key values of the last row returned.
+"""
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import DateTime, String, tuple_, type_coerce
+from sqlalchemy.orm import Query
+from starlette.requests import Request
+from starlette.responses import Response
+from typing import List, Optional, Sequence
+
+class InvalidCursorError(ValueError):
+    pass
+
+class Page(list):
+    """A list of rows plus the cursor of the next page (None on the last page)"""
+
+    def __init__(self, rows=(), next_cursor: Optional[str] = None):
+        super().__init__(rows)
+        self.next_cursor = next_cursor
+
+def encode_cursor(values: Sequence) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> List:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise InvalidCursorError("Malformed cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursorError("Cursor does not match this listing")
+    return values
+
+def _raw_key(query: Query, column):
+    # SQLite stores datetimes as text in more than one format; compare the stored text itself
+    # so cursor values round-trip exactly. Other backends compare native timestamps.
+    if isinstance(column.type, DateTime):
+        if query.session.get_bind().dialect.name == "sqlite":
+            return type_coerce(column, String)
+    return column
+
+def _cursor_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _key_value(value, key):
+    if isinstance(key.type, DateTime) and isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return type_coerce(value, key.type)
+
+def paginate(query: Query, keys: Sequence, cursor: Optional[str] = None, skip: int = 0, limit: int = 100) -> Page:
+    """Fetch one page of ``query`` ordered by the unique ``keys``.
+
+    With a cursor the page starts right after it (keyset); without one, ``skip`` rows are
+    skipped as before. Either way the returned Page carries the cursor of the next page.
+    """
+    raw_keys = [_raw_key(query, key) for key in keys]
+    query = query.add_columns(*raw_keys).order_by(*raw_keys)
+    if cursor:
+        after = decode_cursor(cursor, len(raw_keys))
+        query = query.filter(tuple_(*raw_keys) > tuple_(*[_key_value(value, key) for value, key in zip(after, raw_keys)]))
+    elif skip:
+        query = query.offset(skip)
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([_cursor_value(value) for value in rows[-1][1:]])
+    return Page([row[0] for row in rows], next_cursor)
+
+def set_next_cursor(request: Request, response: Response, page: Page) -> Page:
+    """Expose the keyset cursor of the next page as X-Next-Cursor and a Link rel="next" header"""
+    if page.next_cursor:
+        next_url = request.url.remove_query_params("skip").include_query_params(cursor=page.next_cursor)
+        response.headers["X-Next-Cursor"] = page.next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return page
@@ -1,33 +1,36 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from models import Product, Material, product_materials
+from sqlalchemy import func, case, and_, bindparam
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional, Iterable
+from models import Product, Material, ProductMaterial
 from schemas import ProductCreate, ProductUpdate
+from services.pagination import Page, paginate
+from services import dashboard_counters, response_cache
+from services.bom_index import bom_index
 
-def get_products(db: Session, skip: int = 0, limit: int = 100) -> List[Product]:
-    return db.query(Product).offset(skip).limit(limit).all()
+# Maximum number of ids per IN (...) clause
+CHUNK_SIZE = 500
 
-def get_products_with_bom(db: Session, skip: int = 0, limit: int = 100) -> List[dict]:
-    """Get products with BOM data included"""
-    products = db.query(Product).offset(skip).limit(limit).all()
-    result = []
+def get_products(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> Page:
+    return paginate(db.query(Product), [Product.id], cursor=cursor, skip=skip, limit=limit)
+
+def get_products_with_bom(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> Page:
+    """Get products with BOM data included (one joined query, whatever the page size)"""
+    products = paginate(db.query(Product).options(
+        joinedload(Product.bom_items).joinedload(ProductMaterial.material)
+    ), [Product.id], cursor=cursor, skip=skip, limit=limit)
+    result = Page(next_cursor=products.next_cursor)
     
     for product in products:
-        # Get BOM data for this product
-        bom_data = []
-        for material in product.materials:
-            # Get the quantity required from the association table
-            association = db.query(product_materials).filter(
-                product_materials.c.product_id == product.id,
-                product_materials.c.material_id == material.id
-            ).first()
-            
-            if association:
-                bom_data.append({
-                    "materialName": material.name,
-                    "quantity": association.quantity,
-                    "materialId": material.id,
-                    "available": material.quantity
-                })
+        bom_data = [
+            {
+                "materialName": item.material.name,
+                "quantity": item.quantity,
+                "materialId": item.material.id,
+                "available": item.material.quantity
+            }
+            for item in product.bom_items
+            if item.material is not None
+        ]
         
         # Convert product to dict and add BOM data
         product_dict = {
@@ -51,6 +54,7 @@ def get_product(db: Session, product_id: int) -> Optional[Product]:
 def create_product(db: Session, product: ProductCreate) -> Product:
     db_product = Product(**product.dict())
     db.add(db_product)
+    response_cache.invalidate(db, response_cache.PRODUCTS)
     db.commit()
     db.refresh(db_product)
     return db_product
@@ -64,6 +68,8 @@ def update_product(db: Session, product_id: int, product_update: ProductUpdate)
     for field, value in update_data.items():
         setattr(db_product, field, value)
     
+    if db.is_modified(db_product):
+        response_cache.invalidate(db, response_cache.PRODUCTS)
     db.commit()
     db.refresh(db_product)
     return db_product
@@ -74,31 +80,73 @@ def delete_product(db: Session, product_id: int) -> bool:
         return False
     
     db.delete(db_product)
+    response_cache.invalidate(db, response_cache.PRODUCTS)
     db.commit()
     return True
 
+def _buildable_query(db: Session):
+    """Per product: current can_build and MIN(available // required) over its BOM (0 without one)"""
+    per_material = case(
+        (Material.quantity <= 0, 0),
+        else_=Material.quantity // ProductMaterial.quantity
+    )
+    return db.query(
+        Product.id,
+        Product.can_build,
+        func.coalesce(func.min(per_material), 0)
+    ).outerjoin(
+        ProductMaterial, and_(ProductMaterial.product_id == Product.id, ProductMaterial.quantity > 0)
+    ).outerjoin(
+        Material, Material.id == ProductMaterial.material_id
+    ).group_by(Product.id, Product.can_build)
+
 def calculate_can_build(db: Session, product_id: int) -> int:
     """Calculate how many units of a product can be built based on available materials"""
-    product = get_product(db, product_id)
-    if not product or not product.materials:
+    row = _buildable_query(db).filter(Product.id == product_id).first()
+    return int(row[2]) if row else 0
+
+def recalculate_can_build(db: Session, product_ids: Optional[Iterable[int]] = None) -> int:
+    """Recompute can_build for the given products (all when None) in the caller's transaction.
+
+    Buildable counts come from one grouped query per chunk of products and only changed rows
+    are written back, in a single executemany. Returns the number of products updated.
+    """
+    if product_ids is None:
+        rows = _buildable_query(db).all()
+    else:
+        product_ids = list(product_ids)
+        rows = []
+        for start in range(0, len(product_ids), CHUNK_SIZE):
+            chunk = product_ids[start:start + CHUNK_SIZE]
+            rows.extend(_buildable_query(db).filter(Product.id.in_(chunk)).all())
+
+    changed = [(product_id, old, int(new)) for product_id, old, new in rows if old != new]
+    if not changed:
         return 0
-    
-    # Get minimum quantity available for all required materials
-    min_quantity = float('inf')
-    for material in product.materials:
-        # Get the quantity required from the association table
-        association = db.query(product_materials).filter(
-            product_materials.c.product_id == product_id,
-            product_materials.c.material_id == material.id
-        ).first()
-        
-        if association:
-            required_quantity = association.quantity
-            available_quantity = material.quantity
-            can_build = available_quantity // required_quantity
-            min_quantity = min(min_quantity, can_build)
-    
-    return int(min_quantity) if min_quantity != float('inf') else 0
+
+    products = Product.__table__
+    db.execute(
+        products.update().where(products.c.id == bindparam("product_id")).values(can_build=bindparam("new_can_build")),
+        [{"product_id": product_id, "new_can_build": new} for product_id, _, new in changed]
+    )
+    dashboard_counters.record_changes(db, Product, [
+        ({"can_build": old}, {"can_build": new}) for _, old, new in changed
+    ])
+    response_cache.invalidate(db, response_cache.PRODUCTS)
+    return len(changed)
+
+def recalculate_can_build_for_materials(db: Session, material_ids: Iterable[int]) -> int:
+    """Recompute can_build only for the products whose BOM uses one of the given materials"""
+    product_ids = bom_index.products_for(db, material_ids)
+    if not product_ids:
+        return 0
+    return recalculate_can_build(db, product_ids)
+
+def recalculate_all_can_build(db: Session) -> int:
+    """Refresh can_build for the whole catalog in one transaction"""
+    updated = recalculate_can_build(db)
+    db.commit()
+    return updated
 
 def update_product_can_build(db: Session, product_id: int) -> Optional[Product]:
     """Update the can_build field for a product"""
@@ -107,6 +155,8 @@ def update_product_can_build(db: Session, product_id: int) -> Optional[Product]:
         return None
     
     db_product.can_build = calculate_can_build(db, product_id)
+    if db.is_modified(db_product):
+        response_cache.invalidate(db, response_cache.PRODUCTS)
     db.commit()
     db.refresh(db_product)
     return db_product
@@ -0,0 +1,295 @@
+"""
+Request-scoped SQL profiler and per-route metrics.
+
+``QueryProfilerMiddleware`` gives every HTTP request a ``RequestProfile`` in a context variable
+(threadpool calls and tasks started by the request inherit it). Class-level engine events record
+each statement executed for it on any engine (primary, replicas, the async engines' sync side):
+count, total DB time, the slowest statement, and rows fetched. Background work outside a request
+is not profiled.
+
+The totals go out as a ``Server-Timing`` header when the response starts and, once it has been
+sent, into per-route histograms rendered in Prometheus text format by ``/metrics``. A SELECT
+shape (the statement with IN lists and literals collapsed) repeated more than
+``QUERY_PROFILER_N_PLUS_ONE_THRESHOLD`` times in one request is flagged as an N+1 pattern: in the
+header, the ``tally_db_n_plus_one_total`` counter, and ``/health/queries``.
+"""
+import re
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from config import QUERY_PROFILER_ENABLED, QUERY_PROFILER_N_PLUS_ONE_THRESHOLD
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("query_profile", default=None)
+
+_IN_LIST = re.compile(r"\bIN\s*\([^()]*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"\bVALUES\s*(\([^()]*\)\s*,?\s*)+", re.IGNORECASE)
+_NUMBER = re.compile(r"\b\d+(\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+def statement_shape(statement: str) -> str:
+    """A statement with IN and VALUES lists and numeric literals collapsed, for spotting repeats"""
+    shape = _IN_LIST.sub("IN (?)", statement)
+    shape = _VALUES_LIST.sub("VALUES (?) ", shape)
+    shape = _NUMBER.sub("?", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.slowest_time = 0.0
+        self.slowest_statement: Optional[str] = None
+        self._texts = Counter()
+
+    def record(self, statement: str, elapsed: float):
+        self.statements += 1
+        self.db_time += elapsed
+        self._texts[statement] += 1
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_statement = statement
+
+    def repeated_shapes(self, threshold: int = QUERY_PROFILER_N_PLUS_ONE_THRESHOLD) -> Dict[str, int]:
+        """SELECT shapes executed more than ``threshold`` times (statements are only normalized here)"""
+        shapes = Counter()
+        for statement, count in self._texts.items():
+            if statement.lstrip()[:6].upper() == "SELECT":
+                shapes[statement_shape(statement)] += count
+        return {shape: count for shape, count in shapes.items() if count > threshold}
+
+    def server_timing(self) -> str:
+        entries = [
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.statements} statements, {self.rows} rows"',
+            f"db-slowest;dur={self.slowest_time * 1000:.2f}",
+            f"app;dur={(time.perf_counter() - self.started) * 1000:.2f}",
+        ]
+        repeated = self.repeated_shapes()
+        if repeated:
+            entries.append(f'n-plus-one;desc="{len(repeated)} shapes, up to {max(repeated.values())}x"')
+        return ", ".join(entries)
+
+class _CountingFetch:
+    """Wraps a result's fetch strategy to count the rows fetched into the request's profile"""
+
+    def __init__(self, strategy, profile: RequestProfile):
+        self._strategy = strategy
+        self._profile = profile
+
+    def fetchone(self, result, dbapi_cursor, hard_close=False):
+        row = self._strategy.fetchone(result, dbapi_cursor, hard_close)
+        if row is not None:
+            self._profile.rows += 1
+        return row
+
+    def fetchmany(self, result, dbapi_cursor, size=None):
+        rows = self._strategy.fetchmany(result, dbapi_cursor, size)
+        self._profile.rows += len(rows)
+        return rows
+
+    def fetchall(self, result, dbapi_cursor):
+        rows = self._strategy.fetchall(result, dbapi_cursor)
+        self._profile.rows += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._strategy, name)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault("query_profiler_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    starts = conn.info.get("query_profiler_start")
+    if profile is not None and starts:
+        profile.record(statement, time.perf_counter() - starts.pop())
+
+@event.listens_for(Engine, "handle_error")
+def _failed_cursor_execute(context):
+    # A statement that raises never reaches after_cursor_execute; record it and drop its start time
+    profile = _current_profile.get()
+    starts = context.connection.info.get("query_profiler_start") if context.connection is not None else None
+    if profile is not None and starts:
+        profile.record(context.statement or "", time.perf_counter() - starts.pop())
+
+@event.listens_for(Engine, "after_execute")
+def _count_rows(conn, clauseelement, multiparams, params, execution_options, result):
+    profile = _current_profile.get()
+    if profile is not None and result.returns_rows:
+        result.cursor_strategy = _CountingFetch(result.cursor_strategy, profile)
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total, rows = 0, []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            rows.append((f"{bound:g}", total))
+        rows.append(("+Inf", self.count))
+        return rows
+
+# name -> (help, buckets, value taken from a finished request)
+HISTOGRAMS = {
+    "tally_http_request_duration_seconds": (
+        "Time from receiving the request to sending the last of the response",
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+        lambda profile, duration: duration,
+    ),
+    "tally_db_statements_per_request": (
+        "SQL statements executed per request",
+        (0, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000),
+        lambda profile, duration: profile.statements,
+    ),
+    "tally_db_time_per_request_seconds": (
+        "Total time spent executing SQL per request",
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+        lambda profile, duration: profile.db_time,
+    ),
+    "tally_db_slowest_statement_seconds": (
+        "Slowest SQL statement of each request",
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+        lambda profile, duration: profile.slowest_time,
+    ),
+    "tally_db_rows_per_request": (
+        "Rows fetched from SQL results per request",
+        (0, 1, 10, 100, 1000, 10000, 100000),
+        lambda profile, duration: profile.rows,
+    ),
+}
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class RouteStats:
+    """What /health/queries shows for a route: most statements per request, slowest statement, N+1 shapes"""
+
+    def __init__(self):
+        self.requests = 0
+        self.n_plus_one_requests = 0
+        self.max_statements = 0
+        self.slowest_time = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.repeated_shapes: Dict[str, int] = {}
+
+class Metrics:
+    MAX_SHAPES_PER_ROUTE = 10
+
+    def __init__(self):
+        self.requests = Counter()
+        self.n_plus_one = Counter()
+        self.histograms = {name: defaultdict(lambda buckets=buckets: Histogram(buckets))
+                           for name, (_, buckets, _) in HISTOGRAMS.items()}
+        self.routes: Dict[Tuple[str, str], RouteStats] = defaultdict(RouteStats)
+
+    def observe(self, method: str, route: str, status: int, profile: RequestProfile):
+        key = (method, route)
+        duration = time.perf_counter() - profile.started
+        self.requests[(method, route, status)] += 1
+        for name, (_, _, value) in HISTOGRAMS.items():
+            self.histograms[name][key].observe(value(profile, duration))
+        stats = self.routes[key]
+        stats.requests += 1
+        stats.max_statements = max(stats.max_statements, profile.statements)
+        if profile.slowest_time > stats.slowest_time:
+            stats.slowest_time = profile.slowest_time
+            stats.slowest_statement = profile.slowest_statement
+        repeated = profile.repeated_shapes()
+        if repeated:
+            self.n_plus_one[key] += 1
+            stats.n_plus_one_requests += 1
+            for shape, count in repeated.items():
+                if shape in stats.repeated_shapes or len(stats.repeated_shapes) < self.MAX_SHAPES_PER_ROUTE:
+                    stats.repeated_shapes[shape] = max(count, stats.repeated_shapes.get(shape, 0))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP tally_http_requests_total Requests by route and status",
+            "# TYPE tally_http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f'tally_http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}')
+        lines += [
+            f"# HELP tally_db_n_plus_one_total Requests that repeated a SELECT shape more than {QUERY_PROFILER_N_PLUS_ONE_THRESHOLD} times",
+            "# TYPE tally_db_n_plus_one_total counter",
+        ]
+        for (method, route), count in sorted(self.n_plus_one.items()):
+            lines.append(f'tally_db_n_plus_one_total{{method="{method}",route="{_escape(route)}"}} {count}')
+        for name, (help_text, _, _) in HISTOGRAMS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for (method, route), histogram in sorted(self.histograms[name].items()):
+                labels = f'method="{method}",route="{_escape(route)}"'
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum:g}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def route_status(self) -> Dict[str, Any]:
+        return {
+            "n_plus_one_threshold": QUERY_PROFILER_N_PLUS_ONE_THRESHOLD,
+            "routes": {
+                f"{method} {route}": {
+                    "requests": stats.requests,
+                    "n_plus_one_requests": stats.n_plus_one_requests,
+                    "max_statements": stats.max_statements,
+                    "slowest_statement_ms": round(stats.slowest_time * 1000, 2),
+                    "slowest_statement": stats.slowest_statement,
+                    "repeated_shapes": stats.repeated_shapes,
+                }
+                for (method, route), stats in sorted(self.routes.items())
+            },
+        }
+
+metrics = Metrics()
+
+class QueryProfilerMiddleware:
+    """Profiles each HTTP request's SQL; adds Server-Timing and feeds the /metrics histograms"""
+
+    def __init__(self, app, enabled: bool = QUERY_PROFILER_ENABLED):
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", profile.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_profile.reset(token)
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = scope.get("route")
+            metrics.observe(scope["method"], getattr(route, "path", "unmatched"), status, profile)
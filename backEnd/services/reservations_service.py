@@ -0,0 +1,175 @@
+"""
+Material reservation: atomically moves an order's BOM requirements out of available stock.
+
+Each material is decremented with a conditional ``UPDATE materials SET quantity = quantity - :n
+WHERE id = :id AND quantity >= :n``. The database evaluates the check and the decrement as one
+step under the row's write lock (SQLite serializes writers; PostgreSQL re-checks the WHERE
+clause after waiting on a concurrent update), so concurrent workers can never reserve the same
+units twice. All lines of an order are reserved in one transaction, in material id order to
+avoid lock-order deadlocks, and a single failing line rolls the whole order back.
+"""
+from sqlalchemy import update, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import List, Optional, Dict, Any
+from models import Material, Order, OrderQueue, Reservation, SETTLED_QUEUE_STATUSES
+from services import orders_service, products_service, dashboard_counters, events, inventory_digest, response_cache
+
+class InsufficientStockError(Exception):
+    """Raised when an order cannot be reserved; ``shortages`` lists the missing materials"""
+
+    def __init__(self, order_id: str, shortages: List[Dict[str, Any]]):
+        super().__init__(f"Insufficient stock to reserve order {order_id}")
+        self.order_id = order_id
+        self.shortages = shortages
+
+def get_reservations(db: Session, order_id: str, status: Optional[str] = None) -> List[Reservation]:
+    query = db.query(Reservation).filter(Reservation.order_id == order_id)
+    if status is not None:
+        query = query.filter(Reservation.status == status)
+    return query.order_by(Reservation.material_id).all()
+
+def _adjust_stock(db: Session, material_id: int, delta: int, require_available: bool = False) -> Optional[tuple]:
+    """quantity += delta for one material; with require_available only if the result stays >= 0.
+
+    Returns (new quantity, required) or None when the condition failed.
+    """
+    materials = Material.__table__
+    stmt = update(materials).where(materials.c.id == material_id).values(quantity=materials.c.quantity + delta)
+    if require_available:
+        stmt = stmt.where(materials.c.quantity >= -delta)
+    if db.get_bind().dialect.update_returning:
+        return db.execute(stmt.returning(materials.c.quantity, materials.c.required)).first()
+    if db.execute(stmt).rowcount == 0:
+        return None
+    return db.execute(select(materials.c.quantity, materials.c.required).where(materials.c.id == material_id)).first()
+
+def _record_stock_changes(db: Session, changes: Dict[int, tuple]):
+    """Dashboard counters, inventory version, change events and can_build for Core stock updates: {material_id: (delta, (quantity, required))}"""
+    dashboard_counters.record_changes(db, Material, [
+        ({"quantity": quantity - delta, "required": required}, {"quantity": quantity, "required": required})
+        for delta, (quantity, required) in changes.values()
+    ])
+    inventory_digest.record_change(db)
+    # Reserved materials are BOM materials, whose stock the products list shows too
+    response_cache.invalidate(db, response_cache.MATERIALS, response_cache.PRODUCTS)
+    for material_id, (delta, (quantity, required)) in changes.items():
+        events.record_stock_change(db, material_id, quantity - delta, quantity, required)
+    products_service.recalculate_can_build_for_materials(db, list(changes))
+
+def reserve_order(db: Session, order_id: str) -> Optional[List[Reservation]]:
+    """Reserve every BOM line of an order in one transaction.
+
+    Returns the order's active reservations (existing ones if it is already reserved), None if
+    the order does not exist, and raises InsufficientStockError if any material is short.
+    """
+    if db.query(Order.id).filter(Order.id == order_id).first() is None:
+        return None
+
+    existing = get_reservations(db, order_id, status="Active")
+    if existing:
+        return existing
+
+    demand = orders_service.get_material_demand(db, [order_id]).get(order_id, {})
+    changes = {}
+    failed = []
+    for material_id in sorted(demand):
+        needed = demand[material_id]
+        if needed <= 0:
+            continue
+        result = _adjust_stock(db, material_id, -needed, require_available=True)
+        if result is None:
+            failed.append(material_id)
+        else:
+            changes[material_id] = (-needed, tuple(result))
+
+    if failed:
+        db.rollback()
+        available = dict(db.query(Material.id, Material.quantity).filter(Material.id.in_(failed)).all())
+        raise InsufficientStockError(order_id, [
+            {
+                "material_id": material_id,
+                "needed": demand[material_id],
+                "available": available.get(material_id, 0),
+                "short": demand[material_id] - max(available.get(material_id, 0), 0)
+            }
+            for material_id in failed
+        ])
+
+    reservations = [
+        Reservation(order_id=order_id, material_id=material_id, quantity=-delta, status="Active")
+        for material_id, (delta, _) in changes.items()
+    ]
+    db.add_all(reservations)
+    queue_item = db.query(OrderQueue).filter(OrderQueue.id == order_id).first()
+    if queue_item is not None:
+        queue_item.status = "Reserved"
+    try:
+        db.flush()
+    except IntegrityError:
+        # A concurrent request reserved this order first; undo our decrements and return theirs
+        db.rollback()
+        return get_reservations(db, order_id, status="Active")
+    if changes:
+        _record_stock_changes(db, changes)
+    db.commit()
+    return get_reservations(db, order_id, status="Active")
+
+def _release_reservations(db: Session, reservations: List[Reservation]) -> set:
+    """Return the stock of active reservations and mark them Released; caller commits.
+
+    Returns the ids of the reservations this call released.
+    """
+    reservation_table = Reservation.__table__
+    changes = {}
+    released_ids = set()
+    for reservation in reservations:
+        # Flip the status first so two concurrent releases cannot both return the stock
+        released = db.execute(
+            update(reservation_table)
+            .where(reservation_table.c.id == reservation.id, reservation_table.c.status == "Active")
+            .values(status="Released")
+        ).rowcount
+        if not released:
+            continue
+        released_ids.add(reservation.id)
+        result = _adjust_stock(db, reservation.material_id, reservation.quantity)
+        if result is not None:
+            changes[reservation.material_id] = (reservation.quantity, tuple(result))
+    if changes:
+        _record_stock_changes(db, changes)
+    return released_ids
+
+def release_order(db: Session, order_id: str) -> Optional[List[Reservation]]:
+    """Return an order's reserved stock and mark its reservations Released (None if none are active)"""
+    reservations = get_reservations(db, order_id, status="Active")
+    if not reservations:
+        return None
+
+    released_ids = _release_reservations(db, reservations)
+    queue_item = db.query(OrderQueue).filter(OrderQueue.id == order_id).first()
+    if queue_item is not None and queue_item.status == "Reserved":
+        queue_item.status = "Queued"
+    db.commit()
+    # Reloaded in one query: the commit expired them, and refreshing each one is an N+1
+    return [reservation for reservation in get_reservations(db, order_id) if reservation.id in released_ids]
+
+def settle_status_change(db: Session, order_id: str, status: str) -> int:
+    """Apply a queue status change to an order's active reservations: Completed consumes them and
+    any status that competes for stock again (Queued, Processing, Cancelled...) releases them;
+    caller commits. Returns how many reservations changed."""
+    if status == "Completed":
+        return consume_order(db, order_id)
+    if status not in SETTLED_QUEUE_STATUSES:
+        return release_all(db, order_id)
+    return 0
+
+def release_all(db: Session, order_id: str) -> int:
+    """Release an order's active reservations, returning their stock; caller commits"""
+    return len(_release_reservations(db, get_reservations(db, order_id, status="Active")))
+
+def consume_order(db: Session, order_id: str) -> int:
+    """Mark an order's active reservations Consumed (stock stays deducted); caller commits"""
+    return db.query(Reservation).filter(
+        Reservation.order_id == order_id, Reservation.status == "Active"
+    ).update({Reservation.status: "Consumed"}, synchronize_session=False)
@@ -0,0 +1,212 @@
+"""
+Response cache for the materials, products and integrations list endpoints.
+
+An entry is the JSON body of one list response with its strong ETag (a hash of the body) and
+next-page cursor, keyed by route, query parameters and the version of the dataset it was rendered
+from. The versions live in ``data_versions``: the service functions that change a dataset call
+``invalidate``, which bumps its version in the writer's own transaction. Every lookup reads the
+version in the request's session first, so once a write commits each worker process misses and
+re-renders on its next request; local entries of older versions are dropped when a newer one is
+seen. The products list embeds each BOM line's material name and stock, so material stock and
+name changes invalidate products too.
+
+A hit costs that one primary-key read instead of the list query and Pydantic serialization, and
+a request whose ``If-None-Match`` names the current ETag gets ``304 Not Modified`` without a body.
+Entries live in a per-process LRU bounded by entries, bytes and age, or with
+``RESPONSE_CACHE_REDIS_URL`` in a Redis-compatible server shared by the workers (its TTL is set
+per key; bound its size with ``maxmemory`` and ``allkeys-lru``). A Redis error counts as a miss.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+from pydantic import TypeAdapter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+from starlette.responses import Response
+from config import (
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_REDIS_URL,
+    RESPONSE_CACHE_TTL_SECONDS
+)
+from services import data_versions
+from services.pagination import Page, set_next_cursor
+from services.ttl_cache import TTLCache
+
+MATERIALS = "materials"
+PRODUCTS = "products"
+INTEGRATIONS = "integrations"
+DATASETS = (MATERIALS, PRODUCTS, INTEGRATIONS)
+
+# (dataset, version, path, sorted query string)
+CacheKey = Tuple[str, int, str, str]
+
+class CachedResponse:
+    def __init__(self, body: bytes, next_cursor: Optional[str], etag: Optional[str] = None):
+        self.body = body
+        self.next_cursor = next_cursor
+        self.etag = etag or f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses the weak comparison: W/ prefixes are ignored, * matches anything"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return any(candidate == "*" or candidate.removeprefix("W/") == etag for candidate in candidates)
+
+class LocalBackend:
+    name = "local"
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.entries = TTLCache(max_entries, ttl, max_bytes=max_bytes)
+        self._latest: Dict[str, int] = {}
+
+    def get(self, key: CacheKey) -> Optional[CachedResponse]:
+        return self.entries.get(key)
+
+    def set(self, key: CacheKey, entry: CachedResponse):
+        self.entries.set(key, entry, size=len(entry.body))
+
+    def saw_version(self, dataset: str, version: int):
+        if self._latest.get(dataset, -1) < version:
+            self._latest[dataset] = version
+            self.entries.remove_where(lambda key: key[0] == dataset and key[1] < version)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, **self.entries.stats()}
+
+class RedisBackend:
+    name = "redis"
+    PREFIX = "tally:response:"
+
+    def __init__(self, url: str, ttl: float):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.ttl = ttl
+        self.errors = 0
+        self._redis_error = redis.RedisError
+
+    def _name(self, key: CacheKey) -> str:
+        dataset, version, path, query = key
+        return f"{self.PREFIX}{dataset}:{version}:{path}?{query}"
+
+    def get(self, key: CacheKey) -> Optional[CachedResponse]:
+        try:
+            raw = self.client.get(self._name(key))
+        except self._redis_error:
+            self.errors += 1
+            return None
+        if raw is None:
+            return None
+        header, body = raw.split(b"\n", 1)
+        meta = json.loads(header)
+        return CachedResponse(body, meta["next_cursor"], meta["etag"])
+
+    def set(self, key: CacheKey, entry: CachedResponse):
+        header = json.dumps({"etag": entry.etag, "next_cursor": entry.next_cursor}).encode()
+        try:
+            self.client.set(self._name(key), header + b"\n" + entry.body, px=int(self.ttl * 1000))
+        except self._redis_error:
+            self.errors += 1
+
+    def saw_version(self, dataset: str, version: int):
+        # Keys of older versions are never read again and expire with their TTL
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "ttl_seconds": self.ttl, "errors": self.errors}
+
+class ResponseCache:
+    MATERIALS, PRODUCTS, INTEGRATIONS = MATERIALS, PRODUCTS, INTEGRATIONS
+
+    def __init__(self, enabled: bool = RESPONSE_CACHE_ENABLED, redis_url: str = RESPONSE_CACHE_REDIS_URL):
+        self.enabled = enabled
+        if redis_url:
+            self.backend = RedisBackend(redis_url, RESPONSE_CACHE_TTL_SECONDS)
+        else:
+            self.backend = LocalBackend(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL_SECONDS)
+        self.counters = {dataset: Counter() for dataset in DATASETS}
+        self._adapters: Dict[Any, TypeAdapter] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, dataset: str, outcome: str):
+        with self._lock:
+            self.counters[dataset][outcome] += 1
+
+    def _render(self, schema: Any, page: Page) -> bytes:
+        adapter = self._adapters.get(schema)
+        if adapter is None:
+            adapter = self._adapters[schema] = TypeAdapter(List[schema])
+        return adapter.dump_json(adapter.validate_python(page, from_attributes=True))
+
+    def respond(self, request: Request, db: Session, dataset: str, schema: Any, load: Callable[[], Page]) -> Response:
+        """The list response for this request: cached for the dataset's current version, or
+        loaded, serialized as a list of ``schema`` and stored; 304 when If-None-Match matches"""
+        version = data_versions.get_version(db, dataset)
+        key = (dataset, version, request.url.path, urlencode(sorted(request.query_params.multi_items())))
+        entry = None
+        if self.enabled:
+            self.backend.saw_version(dataset, version)
+            entry = self.backend.get(key)
+        result = "hit" if entry is not None else "miss"
+        self._count(dataset, result)
+        if entry is None:
+            page = load()
+            entry = CachedResponse(self._render(schema, page), page.next_cursor)
+            if self.enabled:
+                self.backend.set(key, entry)
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "X-Cache": result}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            self._count(dataset, "not_modified")
+            response = Response(status_code=304, headers=headers)
+        else:
+            response = Response(entry.body, media_type="application/json", headers=headers)
+        set_next_cursor(request, response, Page(next_cursor=entry.next_cursor))
+        return response
+
+    def status(self) -> Dict[str, Any]:
+        datasets = {}
+        for dataset, counter in self.counters.items():
+            lookups = counter["hit"] + counter["miss"]
+            datasets[dataset] = {
+                "hits": counter["hit"],
+                "misses": counter["miss"],
+                "hit_rate": round(counter["hit"] / lookups, 3) if lookups else None,
+                "not_modified": counter["not_modified"],
+            }
+        return {"enabled": self.enabled, "pid": os.getpid(), "datasets": datasets, "store": self.backend.stats()}
+
+    def render_metrics(self) -> str:
+        """Counters in the Prometheus text exposition format, appended to /metrics"""
+        lines = [
+            "# HELP tally_response_cache_lookups_total List responses served from the cache (hit) or rendered (miss)",
+            "# TYPE tally_response_cache_lookups_total counter",
+        ]
+        for dataset, counter in self.counters.items():
+            for result in ("hit", "miss"):
+                lines.append(f'tally_response_cache_lookups_total{{dataset="{dataset}",result="{result}"}} {counter[result]}')
+        lines += [
+            "# HELP tally_response_cache_not_modified_total List requests answered 304 Not Modified",
+            "# TYPE tally_response_cache_not_modified_total counter",
+        ]
+        for dataset, counter in self.counters.items():
+            lines.append(f'tally_response_cache_not_modified_total{{dataset="{dataset}"}} {counter["not_modified"]}')
+        return "\n".join(lines) + "\n"
+
+response_cache = ResponseCache()
+
+def invalidate(db: Session, *datasets: str):
+    """Bump the versions of the given datasets in the caller's transaction (once per transaction)"""
+    invalidated = db.info.setdefault("response_cache_invalidated", set())
+    for dataset in datasets:
+        if dataset not in invalidated:
+            data_versions.bump_version(db.connection(), dataset)
+            invalidated.add(dataset)
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_invalidations(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("response_cache_invalidated", None)
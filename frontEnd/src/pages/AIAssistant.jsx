@@ -86,26 +86,26 @@ function AIAssistant() {
     setChatInput("")
     setChatLoading(true)
 
+    const aiMessageId = Date.now() + 1
     try {
-      const response = await aiAPI.chat(chatInput)
-      
-      const aiMessage = {
-        id: Date.now() + 1,
-        type: "ai",
-        message: response.response,
-        timestamp: response.timestamp
-      }
-
-      setChatMessages(prev => [...prev, aiMessage])
+      // Show the answer as it streams in, starting with its first token
+      const appendToken = (token) => setChatMessages(prev => prev.some(message => message.id === aiMessageId)
+        ? prev.map(message => message.id === aiMessageId ? { ...message, message: message.message + token } : message)
+        : [...prev, { id: aiMessageId, type: "ai", message: token, timestamp: new Date().toISOString() }]
+      )
+      const response = await aiAPI.chatStream(chatInput, appendToken)
+      setChatMessages(prev => prev.map(message =>
+        message.id === aiMessageId ? { ...message, timestamp: response.timestamp } : message
+      ))
     } catch (err) {
       console.error('Error sending message:', err)
       const errorMessage = {
-        id: Date.now() + 1,
+        id: aiMessageId,
         type: "ai",
         message: "I apologize, but I'm having trouble processing your request right now. Please try again later.",
         timestamp: new Date().toISOString()
       }
-      setChatMessages(prev => [...prev, errorMessage])
+      setChatMessages(prev => [...prev.filter(message => message.id !== aiMessageId), errorMessage])
     } finally {
       setChatLoading(false)
     }
@@ -312,7 +312,7 @@ function AIAssistant() {
                   </div>
                 </div>
               ))}
-              {chatLoading && (
+              {chatLoading && chatMessages[chatMessages.length - 1]?.type === 'user' && (
                 <div className="flex justify-start">
                   <div className="bg-gray-100 p-3 rounded-lg">
                     <div className="flex items-center gap-2">
@@ -9,14 +9,32 @@ const Dashboard = () => {
 
   useEffect(() => {
     fetchDashboardData()
-    // Refresh data every 30 seconds
-    const interval = setInterval(fetchDashboardData, 30000)
-    return () => clearInterval(interval)
+    if (typeof EventSource === 'undefined') {
+      // No Server-Sent Events: fall back to polling
+      const interval = setInterval(() => fetchDashboardData(true), 30000)
+      return () => clearInterval(interval)
+    }
+    // Refetch once per burst of change events instead of polling
+    let timer = null
+    const source = api.dashboard.subscribe(() => {
+      clearTimeout(timer)
+      timer = setTimeout(() => fetchDashboardData(true), 500)
+    })
+    // The browser reconnects by itself; refetch what changed while the stream was down
+    let opened = false
+    source.onopen = () => {
+      if (opened) fetchDashboardData(true)
+      opened = true
+    }
+    return () => {
+      clearTimeout(timer)
+      source.close()
+    }
   }, [])
 
-  const fetchDashboardData = async () => {
+  const fetchDashboardData = async (background = false) => {
     try {
-      setLoading(true)
+      if (!background) setLoading(true)
       const [statsResponse, trendsResponse] = await Promise.all([
         api.dashboard.getStats(),
         api.dashboard.getTrends()
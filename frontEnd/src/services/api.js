@@ -4,6 +4,8 @@ const API_BASE_URL = 'http://localhost:8001/api';
 const apiRequest = async (endpoint, options = {}) => {
   const url = `${API_BASE_URL}${endpoint}`;
   const config = {
+    // Send the API's cookies, so reads right after a write see that write
+    credentials: 'include',
     headers: {
       'Content-Type': 'application/json',
       ...options.headers,
@@ -168,7 +170,39 @@ export const aiAPI = {
   chat: (message) => apiRequest('/ai/chat', {
     method: 'POST',
     body: JSON.stringify({ message })
-  })
+  }),
+
+  // Chat with AI, streamed: onToken(text) per chunk of the answer; resolves with the done event
+  chatStream: async (message, onToken) => {
+    const response = await fetch(`${API_BASE_URL}/ai/chat`, {
+      method: 'POST',
+      credentials: 'include',
+      headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+      body: JSON.stringify({ message, stream: true })
+    });
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) {
+        throw new Error('AI chat stream ended early');
+      }
+      buffer += decoder.decode(value, { stream: true });
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      for (const event of events) {
+        const type = event.match(/^event: (.*)$/m)?.[1];
+        const data = JSON.parse(event.match(/^data: (.*)$/m)?.[1] ?? 'null');
+        if (type === 'token') onToken(data.token);
+        else if (type === 'done') return data;
+        else if (type === 'error') throw new Error(data.detail);
+      }
+    }
+  }
 };
 
 // Health check
@@ -176,13 +210,28 @@ export const healthAPI = {
   check: () => apiRequest('/health')
 };
 
+// Change events pushed by /api/events ("resync": events were missed, refetch everything)
+export const EVENT_TYPES = [
+  'material.changed', 'material.deleted', 'materials.imported',
+  'order.created', 'orders.imported', 'queue.changed', 'alert', 'alerts.updated', 'resync'
+];
+
 // Dashboard API
 export const dashboardAPI = {
   // Get dashboard stats
   getStats: () => apiRequest('/dashboard/stats'),
   
   // Get dashboard trends
-  getTrends: () => apiRequest('/dashboard/trends')
+  getTrends: () => apiRequest('/dashboard/trends'),
+
+  // Subscribe to change events (Server-Sent Events); returns the EventSource, close() it when done
+  subscribe: (onEvent) => {
+    const source = new EventSource(`${API_BASE_URL}/events`, { withCredentials: true });
+    EVENT_TYPES.forEach((type) => {
+      source.addEventListener(type, (event) => onEvent(type, JSON.parse(event.data)));
+    });
+    return source;
+  }
 };
 
 // Default API export for convenience